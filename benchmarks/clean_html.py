@@ -0,0 +1,129 @@
+from typing import Callable, Dict, List, Optional
+
+import random
+import time
+from pathlib import Path
+
+import typer
+from bs4 import BeautifulSoup, Comment, FeatureNotFound
+from bs4.element import NavigableString
+
+from chatflock.web_research.page_analyzer import clean_html
+
+
+def legacy_clean_html(content: str) -> str:
+    # The implementation `clean_html` used before the single bottom-up pass, kept for comparison.
+    soup = BeautifulSoup(content, "html.parser")
+
+    for invisible_elem in soup(["style", "script", "meta", "[document]", "head", "title"]):
+        invisible_elem.extract()
+
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+    def tag_contains_text(tag):
+        if isinstance(tag, NavigableString):
+            return tag.strip() != ""
+        return any(tag_contains_text(child) for child in tag.children if not isinstance(child, Comment))
+
+    for tag in soup.find_all(True):
+        if not tag_contains_text(tag):
+            tag.decompose()
+        else:
+            href = tag.attrs.get("href")
+            tag.attrs = {}
+
+            if href is not None:
+                tag.attrs["href"] = href
+
+    return str(soup)
+
+
+def create_page(n_blocks: int, depth: int, seed: int = 0) -> str:
+    # Shaped like a modern web page: deeply nested layout wrappers, many empty decorative tags, scripts and comments.
+    rng = random.Random(seed)
+
+    blocks = []
+    for i in range(n_blocks):
+        inner = rng.choice(
+            [
+                f'<p class="text">Paragraph {i} with <a href="/link/{i}" class="link">a link</a> and some text.</p>',
+                f'<ul><li><span class="icon"></span>Item {i}</li><li><i class="icon"></i></li></ul>',
+                '<div class="spacer"><span></span><img src="/pixel.gif"></div>',
+                f"<!-- block {i} --><table><tr><td>Cell {i}</td><td> </td></tr></table>",
+            ]
+        )
+        nesting = rng.randint(1, depth)
+        blocks.append('<div class="wrapper">' * nesting + inner + "</div>" * nesting)
+
+    return (
+        "<!DOCTYPE html><html><head><title>Page</title><style>body { margin: 0; }</style>"
+        '<meta charset="utf-8"></head><body>'
+        + "<script>window.analytics = {};</script>"
+        + "\n".join(blocks)
+        + "</body></html>"
+    )
+
+
+def load_corpus(corpus_directory: Optional[Path], sizes: List[int], depth: int) -> Dict[str, str]:
+    # Saved pages (e.g. from a CachingPageRetriever's bodies directory) are used when given, synthetic ones otherwise.
+    if corpus_directory is not None:
+        return {
+            path.name: path.read_text(encoding="utf-8", errors="replace")
+            for path in sorted(corpus_directory.glob("*.html"))
+        }
+
+    return {f"synthetic_{size}": create_page(n_blocks=size, depth=depth, seed=size) for size in sizes}
+
+
+def benchmark(func: Callable[[str], str], page: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func(page)
+        best = min(best, time.perf_counter() - started_at)
+
+    return best
+
+
+def create_clean_with_parser(parser: str) -> Callable[[str], str]:
+    def clean(page: str) -> str:
+        return clean_html(page, parser=parser)
+
+    return clean
+
+
+def clean_html_benchmark(
+    corpus_directory: Optional[Path] = typer.Option(None),
+    sizes: List[int] = typer.Option([1000, 5000, 20000]),
+    depth: int = 30,
+    repeat: int = 3,
+) -> None:
+    implementations: Dict[str, Callable[[str], str]] = {
+        "legacy": legacy_clean_html,
+        "single_pass": clean_html,
+    }
+
+    # Faster parsers are only benchmarked when installed; their output may legitimately differ from html.parser's.
+    for parser in ["lxml", "html5lib"]:
+        try:
+            BeautifulSoup("", parser)
+        except FeatureNotFound:
+            continue
+
+        implementations[f"single_pass_{parser}"] = create_clean_with_parser(parser)
+
+    for page_name, page in load_corpus(corpus_directory, sizes=sizes, depth=depth).items():
+        expected = legacy_clean_html(page)
+
+        for name, func in implementations.items():
+            seconds = benchmark(func, page, repeat=repeat)
+            identical = func(page) == expected
+
+            print(
+                f"{page_name:<24} {len(page) / 1024:>8.0f}KB {name:<20} {seconds * 1000:>10.1f}ms identical={identical}"
+            )
+
+
+if __name__ == "__main__":
+    typer.run(clean_html_benchmark)
@@ -0,0 +1,105 @@
+from typing import Callable, Dict, List
+
+import json
+import re
+import time
+
+import typer
+
+from chatflock.utils import fix_invalid_json
+
+
+def legacy_fix_invalid_json(json_string: str) -> str:
+    # The regex-based implementation `fix_invalid_json` used before the tolerant parser, kept for comparison.
+    json_string = json_string[json_string.find("{") : json_string.rfind("}") + 1]
+
+    unquoted_key_pattern = r'(?<!")(\b\w+\b)(\s*:)(?!")'
+    unquoted_value_pattern = r'(:\s*)([^",\]\[}{]+)(?=[,}\]])'
+
+    json_string = re.sub(unquoted_key_pattern, r'"\1"\2', json_string)
+    json_string = re.sub(unquoted_value_pattern, r'\1"\2"', json_string)
+
+    string_field_pattern = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
+    fixed_json = ""
+    last_end = 0
+
+    for m in re.finditer(string_field_pattern, json_string):
+        start, end = m.span()
+        string_value = m.group(1).replace("\n", "\\n")
+        string_value = string_value.replace('"', '\\"')
+
+        fixed_json += json_string[last_end:start] + '"' + string_value + '"'
+        last_end = end
+
+    fixed_json += json_string[last_end:]
+
+    return fixed_json
+
+
+def create_code_payload(size: int) -> str:
+    # Tool arguments carrying a large piece of code, as sent to the code execution tool.
+    line = 'print("value: %d" % (x * 2))  # {"not": "json"}\n'
+    code = line * (size // len(line) + 1)
+
+    return json.dumps({"code": code[:size]})
+
+
+def create_raw_code_payload(size: int) -> str:
+    # The same, as models often write it: raw newlines and unescaped quotes inside the string.
+    line = 'print("value: %d" % (x * 2))  # {"not": "json"}\n'
+    code = line * (size // len(line) + 1)
+
+    return '{"code": "' + code[:size] + '"}'
+
+
+def create_records_payload(size: int) -> str:
+    # Many small string fields, with unquoted keys, raw newlines and a trailing comma.
+    record = '{id: 1, name: "item\nname", tags: ["a", "b",], active: True},'
+    records = record * (size // len(record) + 1)
+
+    return "{items: [" + records + "]}"
+
+
+def benchmark(func: Callable[[str], str], payload: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - started_at)
+
+    return best
+
+
+def is_valid(func: Callable[[str], str], payload: str) -> bool:
+    try:
+        json.loads(func(payload))
+    except ValueError:
+        return False
+
+    return True
+
+
+def json_repair_benchmark(sizes_mb: List[float] = typer.Option([0.25, 1.0, 4.0]), repeat: int = 3) -> None:
+    implementations: Dict[str, Callable[[str], str]] = {
+        "legacy": legacy_fix_invalid_json,
+        "tolerant": fix_invalid_json,
+    }
+    payload_factories = {
+        "code": create_code_payload,
+        "raw_code": create_raw_code_payload,
+        "records": create_records_payload,
+    }
+
+    for payload_name, create_payload in payload_factories.items():
+        for size_mb in sizes_mb:
+            payload = create_payload(int(size_mb * 1024 * 1024))
+
+            for name, func in implementations.items():
+                seconds = benchmark(func, payload, repeat=repeat)
+                valid = is_valid(func, payload)
+
+                print(f"{payload_name:<9} {size_mb:>6.2f}MB {name:<9} {seconds * 1000:>10.1f}ms valid={valid}")
+
+
+if __name__ == "__main__":
+    typer.run(json_repair_benchmark)
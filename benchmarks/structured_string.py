@@ -0,0 +1,115 @@
+from typing import Any, Callable, List, Optional
+
+import dataclasses
+import time
+
+import typer
+
+from chatflock.structured_string import Section, StructuredString
+
+
+@dataclasses.dataclass
+class LegacySection:
+    # The `Section` rendering used before rendered text was cached, kept for comparison.
+    name: str
+    text: Optional[str] = None
+    list: Optional[List[str]] = None
+    sub_sections: Optional[List["LegacySection"]] = None
+    list_item_prefix: Optional[str] = "-"
+    uppercase_name: bool = True
+
+    def to_text(self, level: int = 0) -> str:
+        result = f'{"#" * (level + 1)} {self.name.upper() if self.uppercase_name else self.name}'
+
+        if self.text is not None:
+            result += "\n" + self.text
+
+        if self.list is not None:
+            result += "\n" + "\n".join(
+                [
+                    f'{self.list_item_prefix if self.list_item_prefix else str(i + 1) + "."} {item}'
+                    for i, item in enumerate(self.list)
+                ]
+            )
+
+        if self.sub_sections is not None:
+            for sub_section in self.sub_sections:
+                result += "\n\n" + sub_section.to_text(level + 1)
+
+        return result
+
+
+def legacy_render(sections: List[LegacySection]) -> str:
+    result = ""
+    for section in sections:
+        result += section.to_text() + "\n\n"
+
+    return result
+
+
+def create_sections(section_type: type, n_queries: int, answer_length: int) -> List[Any]:
+    # Shaped like BSHR's prompts: one sub-section per query, holding the answer to the query.
+    answer = ("The answer to the query, with some details and a source. " * answer_length)[: answer_length * 60]
+
+    return [
+        section_type(name="Information Need", text="What is the best way to do something?"),
+        section_type(
+            name="Previous Queries & Answers",
+            sub_sections=[
+                section_type(name=f"Query #{i}", text=f"```markdown\n{answer}\n```", uppercase_name=False)
+                for i in range(n_queries)
+            ],
+        ),
+        section_type(name="Current Hypothesis", text="A hypothesis.", list=["A note."] * 20),
+    ]
+
+
+def benchmark(func: Callable[[], object], repeat: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        func()
+
+    return (time.perf_counter() - started_at) / repeat
+
+
+def structured_string_benchmark(n_queries: int = 500, answer_length: int = 20, repeat: int = 200) -> None:
+    legacy_sections = create_sections(LegacySection, n_queries=n_queries, answer_length=answer_length)
+    structured_string = StructuredString(
+        sections=create_sections(Section, n_queries=n_queries, answer_length=answer_length)
+    )
+
+    assert legacy_render(legacy_sections) == str(structured_string)
+
+    answers = structured_string["Previous Queries & Answers"].sub_sections or []
+
+    def mutate_and_render() -> str:
+        answers[len(answers) // 2].text = f"```markdown\n{time.perf_counter()}\n```"
+
+        return str(structured_string)
+
+    def fresh_render() -> str:
+        return str(
+            StructuredString(sections=create_sections(Section, n_queries=n_queries, answer_length=answer_length))
+        )
+
+    def legacy_fresh_render() -> str:
+        return legacy_render(create_sections(LegacySection, n_queries=n_queries, answer_length=answer_length))
+
+    results = {
+        "legacy render": benchmark(lambda: legacy_render(legacy_sections), repeat=repeat),
+        "unchanged render": benchmark(lambda: str(structured_string), repeat=repeat),
+        "render after one mutation": benchmark(mutate_and_render, repeat=repeat),
+        "legacy build & render": benchmark(legacy_fresh_render, repeat=repeat),
+        "build & render": benchmark(fresh_render, repeat=repeat),
+        "legacy lookup": benchmark(
+            lambda: [s for s in legacy_sections if s.name == "Current Hypothesis"][0], repeat=repeat
+        ),
+        "lookup": benchmark(lambda: structured_string["Current Hypothesis"], repeat=repeat),
+    }
+
+    for name, seconds in results.items():
+        print(f"{name:<26} {seconds * 1000:>10.3f}ms")
+
+
+if __name__ == "__main__":
+    typer.run(structured_string_benchmark)
@@ -1,98 +1,353 @@
-from typing import Any, Dict, Optional, Sequence, Type, TypeVar
+from typing import Any, Dict, Optional, Sequence, Tuple, Type, TypeVar
 
+import hashlib
 import json
+from functools import partial
 from json import JSONDecodeError
 
 from halo import Halo
 from langchain.chat_models.base import BaseChatModel
-from langchain.schema import BaseMessage, FunctionMessage
+from langchain.schema import BaseMessage, FunctionMessage, messages_to_dict
+from langchain.schema.messages import ToolMessage
 from langchain.tools import BaseTool
-from langchain.tools.render import format_tool_to_openai_function
 from pydantic import BaseModel
 
+from chatflock.caches import ToolErrorCallbackHandler, ToolResultCache
 from chatflock.errors import FunctionNotFoundError
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.schemas import default_schema_registry
 from chatflock.utils import fix_invalid_json
 
 
+def chat_model_messages_cache_key(
+    chat_model: BaseChatModel,
+    messages: Sequence[BaseMessage],
+    chat_model_args: Optional[Dict[str, Any]] = None,
+    tools: Optional[Sequence[BaseTool]] = None,
+) -> str:
+    key = json.dumps(
+        {
+            "chat_model": chat_model.dict(),
+            "chat_model_args": chat_model_args or {},
+            "messages": messages_to_dict(messages),
+            "tools": [default_schema_registry.get_tool_openai_function(tool) for tool in tools or []],
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
 def execute_chat_model_messages(
     chat_model: BaseChatModel,
     messages: Sequence[BaseMessage],
     chat_model_args: Optional[Dict[str, Any]] = None,
     tools: Optional[Sequence[BaseTool]] = None,
     spinner: Optional[Halo] = None,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
 ) -> str:
-    chat_model_args = chat_model_args or {}
+    response_cache = execution_options.response_cache
+    single_flight = execution_options.single_flight
+
+    if response_cache is None and single_flight is None:
+        return run_chat_model_messages(
+            chat_model=chat_model,
+            messages=messages,
+            chat_model_args=chat_model_args,
+            tools=tools,
+            spinner=spinner,
+            execution_options=execution_options,
+        )
+
+    # The whole function-calling loop is cached and coalesced as a unit, keyed on its inputs.
+    key = chat_model_messages_cache_key(
+        chat_model=chat_model, messages=messages, chat_model_args=chat_model_args, tools=tools
+    )
+
+    if response_cache is not None:
+        cached_result = response_cache.get(key)
+        if cached_result is not None:
+            return str(cached_result)
 
-    if "functions" in chat_model_args:
+    def execute() -> str:
+        result = run_chat_model_messages(
+            chat_model=chat_model,
+            messages=messages,
+            chat_model_args=chat_model_args,
+            tools=tools,
+            spinner=spinner,
+            execution_options=execution_options,
+        )
+
+        if response_cache is not None:
+            response_cache.set(key, result)
+
+        return result
+
+    if single_flight is not None:
+        return single_flight.do(key, execute)
+
+    return execute()
+
+
+def run_chat_model_messages(
+    chat_model: BaseChatModel,
+    messages: Sequence[BaseMessage],
+    chat_model_args: Optional[Dict[str, Any]] = None,
+    tools: Optional[Sequence[BaseTool]] = None,
+    spinner: Optional[Halo] = None,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> str:
+    chat_model_args = dict(chat_model_args or {})
+    tool_executor = execution_options.tool_executor
+    tool_result_cache = execution_options.tool_result_cache
+
+    if "functions" in chat_model_args or "tools" in chat_model_args:
         raise ValueError(
-            "The `functions` argument is reserved for the "
+            "The `functions` and `tools` arguments are reserved for the "
             "`execute_chat_model_messages` function. If you want to add more "
-            "functions use the `functions` argument to this method."
+            "functions use the `tools` argument to this method."
         )
 
     if tools is not None and len(tools) > 0:
-        chat_model_args["functions"] = [format_tool_to_openai_function(tool) for tool in tools]
+        if tool_executor is not None:
+            # Tool calls (unlike function calls) allow the model to request multiple calls in a single turn.
+            chat_model_args["tools"] = [default_schema_registry.get_tool_openai_tool(tool) for tool in tools]
+        else:
+            chat_model_args["functions"] = [default_schema_registry.get_tool_openai_function(tool) for tool in tools]
 
     function_map = {tool.name: tool for tool in tools or []}
 
     all_messages = list(messages).copy()
 
-    last_message = chat_model.predict_messages(all_messages, **chat_model_args)
+    last_message = predict_messages(
+        chat_model=chat_model,
+        messages=all_messages,
+        chat_model_args=chat_model_args,
+        execution_options=execution_options,
+    )
     function_call = last_message.additional_kwargs.get("function_call")
+    tool_calls = last_message.additional_kwargs.get("tool_calls")
 
-    while function_call is not None:
-        function_name = function_call["name"]
-        if function_name in function_map:
-            tool = function_map[function_name]
-            args = function_call["arguments"]
+    while function_call is not None or tool_calls:
+        if tool_calls:
+            for tool_call in tool_calls:
+                if tool_call["function"]["name"] not in function_map:
+                    raise FunctionNotFoundError(tool_call["function"]["name"])
 
             if spinner is not None:
-                if hasattr(tool, "progress_text"):
-                    progress_text = tool.progress_text
+                if len(tool_calls) == 1:
+                    spinner.start(get_tool_progress_text(function_map[tool_calls[0]["function"]["name"]]))
                 else:
-                    progress_text = f"Executing function `{function_name}`..."
-
-                spinner.start(progress_text)
-
-            try:
-                args = json.loads(args)
-                result = tool.run(args)
-            except JSONDecodeError as e:
-                # Try to fix the JSON manually before giving up
-                try:
-                    args = fix_invalid_json(args)
-                    args = json.loads(args)
-                    result = tool.run(args)
-                except JSONDecodeError as e:
-                    result = f"Error decoding args for function: {e}"
-            except Exception as e:
-                result = f"Error executing function: {e}"
-
-            all_messages.append(
-                FunctionMessage(
-                    name=function_name,
-                    content=f"The function execution returned:\n```{str(result).strip()}```" or "None",
+                    spinner.start(f"Executing {len(tool_calls)} functions concurrently...")
+
+            calls = [
+                (
+                    tool_call["function"]["name"],
+                    partial(
+                        execute_tool,
+                        tool=function_map[tool_call["function"]["name"]],
+                        args=tool_call["function"]["arguments"],
+                        tool_result_cache=tool_result_cache,
+                    ),
                 )
+                for tool_call in tool_calls
+            ]
+
+            if tool_executor is not None:
+                results = tool_executor.execute(calls)
+            else:
+                results = [func() for _, func in calls]
+
+            # All results are fed back to the model in a single follow-up request.
+            all_messages.append(last_message)
+            all_messages.extend(
+                ToolMessage(tool_call_id=tool_call["id"], content=format_tool_result(result))
+                for tool_call, result in zip(tool_calls, results)
             )
+        elif function_call is not None:
+            function_name = function_call["name"]
+            if function_name not in function_map:
+                raise FunctionNotFoundError(function_name)
 
-            last_message = chat_model.predict_messages(all_messages, **chat_model_args)
-            function_call = last_message.additional_kwargs.get("function_call")
-        else:
-            raise FunctionNotFoundError(function_name)
+            tool = function_map[function_name]
+
+            if spinner is not None:
+                spinner.start(get_tool_progress_text(tool))
+
+            result = execute_tool(tool=tool, args=function_call["arguments"], tool_result_cache=tool_result_cache)
+
+            all_messages.append(FunctionMessage(name=function_name, content=format_tool_result(result)))
+
+        last_message = predict_messages(
+            chat_model=chat_model,
+            messages=all_messages,
+            chat_model_args=chat_model_args,
+            execution_options=execution_options,
+        )
+        function_call = last_message.additional_kwargs.get("function_call")
+        tool_calls = last_message.additional_kwargs.get("tool_calls")
 
     return str(last_message.content)
 
 
+def predict_messages(
+    chat_model: BaseChatModel,
+    messages: Sequence[BaseMessage],
+    chat_model_args: Dict[str, Any],
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> BaseMessage:
+    rate_limiter = execution_options.rate_limiter
+    hedging_policy = execution_options.hedging_policy
+    batch_scheduler = execution_options.batch_scheduler
+
+    def send(model: BaseChatModel) -> BaseMessage:
+        if batch_scheduler is not None:
+            return batch_scheduler.predict_messages(
+                chat_model=model, messages=messages, chat_model_args=chat_model_args
+            )
+
+        return model.predict_messages(list(messages), **chat_model_args)
+
+    def predict(model: BaseChatModel) -> BaseMessage:
+        if rate_limiter is None:
+            return send(model)
+
+        with rate_limiter.limit(chat_model=model, messages=messages, priority=execution_options.rate_limit_priority):
+            return send(model)
+
+    if hedging_policy is not None:
+        return hedging_policy.execute(chat_model=chat_model, func=predict)
+
+    return predict(chat_model)
+
+
+def is_request_rejected_error(error: BaseException) -> bool:
+    # Whether the chat model rejected the request itself (e.g. an endpoint without function calling support), as
+    # opposed to a transient failure like a timeout, a dropped connection or a server error.
+    if type(error).__name__ in ("BadRequestError", "InvalidRequestError", "UnprocessableEntityError"):
+        return True
+
+    if getattr(error, "status_code", None) in (400, 422) or getattr(error, "http_status", None) in (400, 422):
+        return True
+
+    # Chat models that do not take the function calling arguments at all.
+    return isinstance(error, (TypeError, ValueError, NotImplementedError))
+
+
+def execute_chat_model_function_call(
+    chat_model: BaseChatModel,
+    messages: Sequence[BaseMessage],
+    function: Dict[str, Any],
+    chat_model_args: Optional[Dict[str, Any]] = None,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    # Forces the model to call the given function in a single round trip. Returns the parsed arguments (or None if the
+    # model did not call the function with valid arguments) and the text content of the response, for a local fallback.
+    chat_model_args = dict(chat_model_args or {})
+
+    if "functions" in chat_model_args or "tools" in chat_model_args:
+        raise ValueError(
+            "The `functions` and `tools` arguments are reserved for the `execute_chat_model_function_call` function."
+        )
+
+    chat_model_args["functions"] = [function]
+    chat_model_args["function_call"] = {"name": function["name"]}
+
+    def execute() -> str:
+        last_message = predict_messages(
+            chat_model=chat_model,
+            messages=messages,
+            chat_model_args=chat_model_args,
+            execution_options=execution_options,
+        )
+        function_call = last_message.additional_kwargs.get("function_call") or {}
+
+        return json.dumps({"arguments": function_call.get("arguments"), "content": str(last_message.content)})
+
+    response_cache = execution_options.response_cache
+    single_flight = execution_options.single_flight
+
+    if response_cache is None and single_flight is None:
+        result = execute()
+    else:
+        key = chat_model_messages_cache_key(chat_model=chat_model, messages=messages, chat_model_args=chat_model_args)
+
+        cached_result = response_cache.get(key) if response_cache is not None else None
+        if cached_result is not None:
+            result = str(cached_result)
+        else:
+
+            def execute_and_cache() -> str:
+                result = execute()
+                if response_cache is not None:
+                    response_cache.set(key, result)
+
+                return result
+
+            result = single_flight.do(key, execute_and_cache) if single_flight is not None else execute_and_cache()
+
+    response = json.loads(result)
+    content = response["content"]
+    arguments = response["arguments"]
+    if arguments is None:
+        return None, content
+
+    try:
+        parsed_arguments = json.loads(arguments)
+    except JSONDecodeError:
+        try:
+            parsed_arguments = json.loads(fix_invalid_json(arguments))
+        except JSONDecodeError:
+            return None, content
+
+    if not isinstance(parsed_arguments, dict):
+        return None, content
+
+    return parsed_arguments, content
+
+
+def get_tool_progress_text(tool: BaseTool) -> str:
+    if hasattr(tool, "progress_text"):
+        return str(tool.progress_text)
+
+    return f"Executing function `{tool.name}`..."
+
+
+def execute_tool(tool: BaseTool, args: str, tool_result_cache: Optional[ToolResultCache] = None) -> str:
+    try:
+        parsed_args = json.loads(args)
+    except JSONDecodeError:
+        # Try to fix the JSON manually before giving up
+        try:
+            parsed_args = json.loads(fix_invalid_json(args))
+        except JSONDecodeError as e:
+            return f"Error decoding args for function: {e}"
+
+    try:
+        if tool_result_cache is not None:
+            return tool_result_cache.run(
+                tool=tool,
+                args=parsed_args,
+                func=partial(tool.run, parsed_args, callbacks=[ToolErrorCallbackHandler()]),
+            )
+
+        return str(tool.run(parsed_args))
+    except Exception as e:
+        return f"Error executing function: {e}"
+
+
+def format_tool_result(result: str) -> str:
+    return f"The function execution returned:\n```{result.strip()}```"
+
+
 PydanticType = TypeVar("PydanticType", bound=Type[BaseModel])
 
 
 def pydantic_to_openai_function(
     pydantic_type: PydanticType, function_name: Optional[str] = None, function_description: Optional[str] = None
 ) -> Dict[str, Any]:
-    base_schema = pydantic_type.model_json_schema()
-    del base_schema["title"]
-    del base_schema["description"]
-
-    description = function_description if function_description is not None else (pydantic_type.__doc__ or "")
-
-    return {"name": function_name or pydantic_type.__name__, "description": description, "parameters": base_schema}
+    return default_schema_registry.get_openai_function(
+        pydantic_type, function_name=function_name, function_description=function_description
+    )
@@ -0,0 +1,17 @@
+from .base import Cache, CacheStats
+from .disk import DiskCache
+from .in_memory import InMemoryCache
+from .tiered import TieredCache
+from .tool_results import ToolErrorCallbackHandler, ToolResultCache, ToolResultCacheStats, skip_result_caching
+
+__all__ = [
+    "Cache",
+    "CacheStats",
+    "InMemoryCache",
+    "DiskCache",
+    "TieredCache",
+    "ToolResultCache",
+    "ToolResultCacheStats",
+    "ToolErrorCallbackHandler",
+    "skip_result_caching",
+]
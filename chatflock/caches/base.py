@@ -0,0 +1,66 @@
+from typing import Any, Optional
+
+import abc
+import dataclasses
+import threading
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.lookups
+        if lookups == 0:
+            return 0.0
+
+        return self.hits / lookups
+
+
+class Cache(abc.ABC):
+    # `None` is used to signal a cache miss, so it cannot be stored as a value.
+    stats: CacheStats
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.load(key)
+        self.stats.record(hit=value is not None)
+
+        return value
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Optional[Any]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError()
@@ -0,0 +1,141 @@
+from typing import Any, Optional
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .base import Cache
+
+
+class DiskCache(Cache):
+    # Every entry is stored in its own JSON file, named by the hash of its key. Writes go to a temporary file that is
+    # atomically renamed into place, so concurrent writers never block each other or leave partial entries behind.
+    # The file modification time doubles as the last access time for LRU eviction.
+
+    def __init__(
+        self,
+        directory: str,
+        default_ttl: Optional[float] = None,
+        max_size_bytes: Optional[int] = None,
+    ):
+        super().__init__()
+
+        if max_size_bytes is not None and max_size_bytes <= 0:
+            raise ValueError("Max size bytes must be None or greater than 0.")
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.default_ttl = default_ttl
+        self.max_size_bytes = max_size_bytes
+
+        self.lock = threading.Lock()
+        self.size_bytes = sum(path.stat().st_size for path in self.directory.glob("*.json"))
+
+    def path_for_key(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def load(self, key: str) -> Optional[Any]:
+        path = self.path_for_key(key)
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Guard against (very unlikely) hash collisions.
+        if entry.get("key") != key:
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        data = json.dumps({"key": key, "expires_at": expires_at, "value": value})
+        path = self.path_for_key(key)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            self.size_bytes += len(data.encode("utf-8")) - old_size
+
+        self.evict_if_needed()
+
+    def delete(self, key: str) -> None:
+        path = self.path_for_key(key)
+
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+
+        with self.lock:
+            self.size_bytes -= size
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.json"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+        with self.lock:
+            self.size_bytes = 0
+
+    def evict_if_needed(self) -> None:
+        if self.max_size_bytes is None or self.size_bytes <= self.max_size_bytes:
+            return
+
+        with self.lock:
+            entries = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            # Recompute from disk, as other processes may share the same directory.
+            self.size_bytes = sum(size for _, size, _ in entries)
+
+            # Evict least recently used entries until we are comfortably below the limit, so we don't end up
+            # scanning the directory on every write.
+            target_size = int(self.max_size_bytes * 0.9)
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if self.size_bytes <= target_size:
+                    break
+
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+                self.size_bytes -= size
@@ -0,0 +1,60 @@
+from typing import Any, Optional, Tuple
+
+import threading
+import time
+from collections import OrderedDict
+
+from .base import Cache
+
+
+class InMemoryCache(Cache):
+    def __init__(self, max_entries: Optional[int] = 1024, default_ttl: Optional[float] = None):
+        super().__init__()
+
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("Max entries must be None or greater than 0.")
+
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+
+        # Maps a key to a tuple of (expiration time, value). Ordered from least to most recently used.
+        self.entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+
+            if self.max_entries is not None:
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,40 @@
+from typing import Any, Optional, Sequence
+
+from .base import Cache
+
+
+class TieredCache(Cache):
+    def __init__(self, caches: Sequence[Cache]):
+        super().__init__()
+
+        if len(caches) == 0:
+            raise ValueError("Must provide at least one cache.")
+
+        # Ordered from the fastest (e.g. in-memory) to the slowest (e.g. on-disk) tier.
+        self.caches = caches
+
+    def load(self, key: str) -> Optional[Any]:
+        for i, cache in enumerate(self.caches):
+            value = cache.get(key)
+            if value is None:
+                continue
+
+            # Promote the value to the faster tiers that missed it.
+            for faster_cache in self.caches[:i]:
+                faster_cache.set(key, value)
+
+            return value
+
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        for cache in self.caches:
+            cache.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        for cache in self.caches:
+            cache.delete(key)
+
+    def clear(self) -> None:
+        for cache in self.caches:
+            cache.clear()
@@ -0,0 +1,113 @@
+from typing import Any, Callable, Dict, Optional
+
+import dataclasses
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.tools import BaseTool
+
+from .base import Cache
+from .in_memory import InMemoryCache
+
+
+@dataclasses.dataclass
+class ToolResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    time_saved_seconds: float = 0.0
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_hit(self, time_saved_seconds: float) -> None:
+        with self.lock:
+            self.hits += 1
+            self.time_saved_seconds += time_saved_seconds
+
+    def record_miss(self) -> None:
+        with self.lock:
+            self.misses += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+
+        return self.hits / lookups
+
+
+@dataclasses.dataclass
+class ToolResultCachingState:
+    skip: bool = False
+
+
+tool_result_caching_state: ContextVar[Optional[ToolResultCachingState]] = ContextVar(
+    "tool_result_caching_state", default=None
+)
+
+
+def skip_result_caching() -> None:
+    # Called by a cacheable tool while it runs, to keep its current result out of the cache (e.g. an error it reports
+    # as text instead of raising). Does nothing outside of `ToolResultCache.run`.
+    state = tool_result_caching_state.get()
+    if state is not None:
+        state.skip = True
+
+
+class ToolErrorCallbackHandler(BaseCallbackHandler):
+    # Errors handled by a tool's `handle_tool_error` are returned as a regular output, which LangChain only reports
+    # differently by its (red) color.
+    def on_tool_end(self, output: str, **kwargs: Any) -> None:
+        if kwargs.get("color") == "red":
+            skip_result_caching()
+
+
+class ToolResultCache:
+    # Tools opt in to caching by declaring a `cacheable` attribute (and optionally a `cache_ttl` in seconds),
+    # the same way they declare their `progress_text`. Results of errors handled by the tool (see
+    # `ToolErrorCallbackHandler`) and results the tool opted out of with `skip_result_caching` are not cached.
+
+    def __init__(self, cache: Optional[Cache] = None):
+        self.cache = cache if cache is not None else InMemoryCache()
+        self.stats = ToolResultCacheStats()
+
+    def is_cacheable(self, tool: BaseTool) -> bool:
+        return bool(getattr(tool, "cacheable", False))
+
+    def create_key(self, tool: BaseTool, args: Dict[str, Any]) -> str:
+        canonical_args = json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+        return f"{tool.name}:{canonical_args}"
+
+    def run(self, tool: BaseTool, args: Dict[str, Any], func: Callable[[], Any]) -> str:
+        if not self.is_cacheable(tool):
+            return str(func())
+
+        key = self.create_key(tool=tool, args=args)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats.record_hit(time_saved_seconds=cached["duration"])
+
+            return str(cached["result"])
+
+        self.stats.record_miss()
+
+        state = ToolResultCachingState()
+        token = tool_result_caching_state.set(state)
+        try:
+            started_at = time.monotonic()
+            result = str(func())
+            duration = time.monotonic() - started_at
+        finally:
+            tool_result_caching_state.reset(token)
+
+        # Errors the tool reported instead of raising would otherwise be replayed until the entry expires.
+        if state.skip:
+            return result
+
+        self.cache.set(key, {"result": result, "duration": duration}, ttl=getattr(tool, "cache_ttl", None))
+
+        return result
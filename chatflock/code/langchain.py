@@ -32,6 +32,9 @@ class CodeExecutionTool(BaseTool):
     args_schema: Type[pydantic_v1.BaseModel] = CodeExecutionToolArgs
     progress_text: str = "🐍 Executing code..."
     spinner: Optional[Halo] = None
+    # Code may depend on time, randomness or the network, so results are only reused when explicitly enabled.
+    cacheable: bool = False
+    cache_ttl: Optional[float] = None
 
     def _run(
         self,
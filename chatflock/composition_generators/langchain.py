@@ -1,5 +1,8 @@
 from typing import Any, Dict, List, Optional, Sequence
 
+import hashlib
+import json
+
 from halo import Halo
 from langchain.chat_models.base import BaseChatModel
 from langchain.schema import BaseMessage, HumanMessage, SystemMessage
@@ -7,7 +10,9 @@ from langchain.tools import BaseTool
 
 from chatflock.ai_utils import execute_chat_model_messages
 from chatflock.base import ActiveChatParticipant, Chat, ChatCompositionGenerator, GeneratedChatComposition
+from chatflock.caches import Cache
 from chatflock.composition_generators import CreateTeamCompositionForGoalOutputSchema
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
 from chatflock.parsing_utils import string_output_to_pydantic
 from chatflock.participants.langchain import LangChainBasedAIChatParticipant
 from chatflock.structured_string import Section, StructuredString
@@ -24,6 +29,8 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
         spinner: Optional[Halo] = None,
         n_output_parsing_tries: int = 3,
         generate_composition_extra_args: Optional[Dict[str, Any]] = None,
+        execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+        composition_cache: Optional[Cache] = None,
     ):
         self.chat_model = chat_model
         self.chat_model_args = chat_model_args or {}
@@ -33,6 +40,8 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
         self.spinner = spinner
         self.n_output_parsing_tries = n_output_parsing_tries
         self.generate_composition_extra_args = generate_composition_extra_args or {}
+        self.execution_options = execution_options
+        self.composition_cache = composition_cache
 
         self.participant_tool_names_to_tools = {tool.name: tool for tool in self.participant_available_tools or []}
 
@@ -52,7 +61,60 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
         if self.spinner is not None:
             self.spinner.start(text="The Chat Composition Generator is creating a team composition for the goal...")
 
-        # Ask the AI to select the next speaker.
+        output = None
+        if self.composition_cache is not None:
+            cache_key = self.create_composition_cache_key(
+                goal=goal, composition_suggestion=composition_suggestion, interaction_schema=interaction_schema
+            )
+
+            cached_output = self.composition_cache.get(cache_key)
+            if cached_output is not None:
+                output = CreateTeamCompositionForGoalOutputSchema.model_validate(cached_output)
+
+        if output is None:
+            output = self.generate_composition_output(
+                goal=goal, composition_suggestion=composition_suggestion, interaction_schema=interaction_schema
+            )
+
+            if self.composition_cache is not None:
+                self.composition_cache.set(cache_key, output.model_dump())
+
+        participants_to_add_names = [str(participant) for participant in output.team_composition]
+
+        if self.spinner is not None:
+            name = "The Chat Composition Generator"
+            if chat.name is not None:
+                name = f"{name} ({chat.name})"
+
+            if len(output.team_composition) == 0:
+                self.spinner.succeed(text=f"{name} has decided the existing team composition is satisfactory.")
+            else:
+                self.spinner.succeed(
+                    text=f"{name} has decided to add the following participants: "
+                    f'{", ".join(participants_to_add_names)}'
+                )
+
+        return self.create_composition_from_output(output=output, goal=goal, interaction_schema=interaction_schema)
+
+    def create_composition_cache_key(
+        self, goal: str, composition_suggestion: Optional[str] = None, interaction_schema: Optional[str] = None
+    ) -> str:
+        key = json.dumps(
+            {
+                "goal": goal,
+                "composition_suggestion": composition_suggestion,
+                "interaction_schema": interaction_schema,
+                "participant_available_tools": sorted(self.participant_tool_names_to_tools.keys()),
+                "fixed_team_members": [participant.detailed_str() for participant in self.fixed_team_members],
+            },
+            sort_keys=True,
+        )
+
+        return f"team_composition:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    def generate_composition_output(
+        self, goal: str, composition_suggestion: Optional[str] = None, interaction_schema: Optional[str] = None
+    ) -> CreateTeamCompositionForGoalOutputSchema:
         messages = [
             SystemMessage(content=self.create_compose_team_system_prompt()),
             HumanMessage(
@@ -67,30 +129,22 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
 
         result = self.execute_messages(messages=messages)
 
-        output = string_output_to_pydantic(
+        return string_output_to_pydantic(
             output=result,
             chat_model=self.chat_model,
             output_schema=CreateTeamCompositionForGoalOutputSchema,
             n_tries=self.n_output_parsing_tries,
             spinner=self.spinner,
             hide_message=False,
+            execution_options=self.execution_options,
         )
 
-        participants_to_add_names = [str(participant) for participant in output.team_composition]
-
-        if self.spinner is not None:
-            name = "The Chat Composition Generator"
-            if chat.name is not None:
-                name = f"{name} ({chat.name})"
-
-            if len(output.team_composition) == 0:
-                self.spinner.succeed(text=f"{name} has decided the existing team composition is satisfactory.")
-            else:
-                self.spinner.succeed(
-                    text=f"{name} has decided to add the following participants: "
-                    f'{", ".join(participants_to_add_names)}'
-                )
-
+    def create_composition_from_output(
+        self,
+        output: CreateTeamCompositionForGoalOutputSchema,
+        goal: str,
+        interaction_schema: Optional[str] = None,
+    ) -> GeneratedChatComposition:
         participants: Dict[str, ActiveChatParticipant] = {p.name: p for p in self.fixed_team_members}
 
         for participant in output.team_composition:
@@ -111,6 +165,7 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
                 chat_model=self.chat_model,
                 spinner=self.spinner,
                 chat_model_args=self.chat_model_args,
+                execution_options=self.execution_options,
                 other_prompt_sections=[
                     Section(
                         name="Chat Main Goal",
@@ -271,4 +326,5 @@ class LangChainBasedAIChatCompositionGenerator(ChatCompositionGenerator):
             tools=self.generator_tools,
             spinner=self.spinner,
             chat_model_args=self.chat_model_args,
+            execution_options=self.execution_options,
         )
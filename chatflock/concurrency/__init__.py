@@ -0,0 +1,20 @@
+from .batching import MicroBatchingStats, MicroBatchScheduler
+from .hedging import HedgingPolicy, HedgingStats, LatencyTracker
+from .rate_limiting import AdaptiveRateLimiter, ModelRateLimiterStats, ModelRateLimits, RequestPriority
+from .single_flight import SingleFlight, SingleFlightStats
+from .tool_calls import ToolCallsExecutor
+
+__all__ = [
+    "SingleFlight",
+    "SingleFlightStats",
+    "ToolCallsExecutor",
+    "AdaptiveRateLimiter",
+    "ModelRateLimits",
+    "ModelRateLimiterStats",
+    "RequestPriority",
+    "HedgingPolicy",
+    "HedgingStats",
+    "LatencyTracker",
+    "MicroBatchScheduler",
+    "MicroBatchingStats",
+]
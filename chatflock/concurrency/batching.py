@@ -0,0 +1,125 @@
+"""Micro-batching of chat model requests from concurrent chats.
+
+No provider-side batch endpoint is used. By default, a batch goes through `chat_model.batch`, which for most chat models
+(including ChatOpenAI) just sends the requests concurrently from a thread pool, so there is no cost or throughput
+benefit over sending them directly. It only helps when the backend batches concurrent requests itself (e.g. a local
+inference server with continuous batching), or with a `batch_predict` that calls a real batch endpoint. Otherwise the
+default `max_wait_ms` only adds latency to every request.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import dataclasses
+import json
+import threading
+from concurrent.futures import Future
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import BaseMessage
+
+BatchPredictFunction = Callable[
+    [BaseChatModel, List[List[BaseMessage]], Dict[str, Any]], Sequence[Union[BaseMessage, Exception]]
+]
+
+
+def default_batch_predict(
+    chat_model: BaseChatModel, messages_batch: List[List[BaseMessage]], chat_model_args: Dict[str, Any]
+) -> Sequence[Union[BaseMessage, Exception]]:
+    # Not a provider-side batch: unless the chat model overrides `batch`, the requests are sent concurrently.
+    return chat_model.batch(messages_batch, return_exceptions=True, **chat_model_args)  # type: ignore
+
+
+@dataclasses.dataclass
+class MicroBatchingStats:
+    requests: int = 0
+    batches: int = 0
+
+    @property
+    def average_batch_size(self) -> float:
+        if self.batches == 0:
+            return 0.0
+
+        return self.requests / self.batches
+
+
+class PendingBatch:
+    def __init__(self) -> None:
+        self.requests: List[Tuple[List[BaseMessage], "Future[BaseMessage]"]] = []
+        self.full = threading.Event()
+
+
+class MicroBatchScheduler:
+    # Collects requests from concurrent chats for a short while and sends them to the chat model as a single batch.
+    # The first request of a batch leads it: it waits for more requests (up to the max wait time or until the batch is
+    # full), sends the batch and routes each completion back to its caller. Requests are only batched together when
+    # they target the same chat model instance with the same arguments.
+
+    def __init__(
+        self,
+        max_wait_ms: float = 10,
+        max_batch_size: int = 16,
+        batch_predict: Optional[BatchPredictFunction] = None,
+    ):
+        if max_batch_size <= 0:
+            raise ValueError("Max batch size must be greater than 0.")
+
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.batch_predict = batch_predict or default_batch_predict
+
+        self.lock = threading.Lock()
+        self.pending_batches: Dict[Tuple[int, str], PendingBatch] = {}
+        self.stats = MicroBatchingStats()
+
+    def predict_messages(
+        self,
+        chat_model: BaseChatModel,
+        messages: Sequence[BaseMessage],
+        chat_model_args: Optional[Dict[str, Any]] = None,
+    ) -> BaseMessage:
+        chat_model_args = chat_model_args or {}
+        key = (id(chat_model), json.dumps(chat_model_args, sort_keys=True, default=str))
+        future: "Future[BaseMessage]" = Future()
+
+        with self.lock:
+            batch = self.pending_batches.get(key)
+            is_leader = batch is None
+            if batch is None:
+                batch = self.pending_batches[key] = PendingBatch()
+
+            batch.requests.append((list(messages), future))
+            self.stats.requests += 1
+
+            if len(batch.requests) >= self.max_batch_size:
+                del self.pending_batches[key]
+                batch.full.set()
+
+        if is_leader:
+            batch.full.wait(timeout=self.max_wait_ms / 1000)
+
+            with self.lock:
+                if self.pending_batches.get(key) is batch:
+                    del self.pending_batches[key]
+
+                self.stats.batches += 1
+
+            self.flush(chat_model=chat_model, batch=batch, chat_model_args=chat_model_args)
+
+        return future.result()
+
+    def flush(self, chat_model: BaseChatModel, batch: PendingBatch, chat_model_args: Dict[str, Any]) -> None:
+        try:
+            results = self.batch_predict(chat_model, [messages for messages, _ in batch.requests], chat_model_args)
+            if len(results) != len(batch.requests):
+                raise ValueError(f"Expected {len(batch.requests)} results from the batch, got {len(results)}.")
+        except Exception as e:
+            for _, future in batch.requests:
+                future.set_exception(e)
+
+            return
+
+        for (_, future), result in zip(batch.requests, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
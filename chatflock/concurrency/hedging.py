@@ -0,0 +1,157 @@
+from typing import Callable, Deque, Dict, Optional, TypeVar
+
+import dataclasses
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from langchain.chat_models.base import BaseChatModel
+
+from .rate_limiting import get_chat_model_name
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class HedgingStats:
+    requests: int = 0
+    hedged_requests: int = 0
+    hedge_wins: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        if self.requests == 0:
+            return 0.0
+
+        return self.hedged_requests / self.requests
+
+
+class LatencyTracker:
+    def __init__(self, window_size: int = 200):
+        self.window_size = window_size
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def record(self, model_name: str, latency: float) -> None:
+        with self.lock:
+            latencies = self.latencies.get(model_name)
+            if latencies is None:
+                latencies = self.latencies[model_name] = deque(maxlen=self.window_size)
+
+            latencies.append(latency)
+
+    def percentile(self, model_name: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        with self.lock:
+            latencies = sorted(self.latencies.get(model_name) or [])
+
+        if len(latencies) < max(1, min_samples):
+            return None
+
+        index = min(len(latencies) - 1, int(percentile * len(latencies)))
+
+        return latencies[index]
+
+
+class HedgingPolicy:
+    # If a request has not returned by the given latency percentile observed for its model, a duplicate request is
+    # sent (optionally to a fallback model) and the first response wins. Python threads cannot be interrupted, so the
+    # losing request is cancelled only if it has not started yet; otherwise its result is discarded.
+
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        min_samples: int = 20,
+        max_hedge_rate: float = 0.1,
+        fallback_chat_model: Optional[BaseChatModel] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+        max_workers: int = 16,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError("Percentile must be between 0 and 1.")
+
+        if not 0 <= max_hedge_rate <= 1:
+            raise ValueError("Max hedge rate must be between 0 and 1.")
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.fallback_chat_model = fallback_chat_model
+        self.latency_tracker = latency_tracker or LatencyTracker()
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatflock-hedging")
+        self.lock = threading.Lock()
+        self.stats = HedgingStats()
+
+    def submit(
+        self,
+        chat_model: BaseChatModel,
+        func: Callable[[BaseChatModel], T],
+        started: Optional[threading.Event] = None,
+    ) -> "Future[T]":
+        model_name = get_chat_model_name(chat_model)
+
+        def run() -> T:
+            if started is not None:
+                started.set()
+
+            started_at = time.monotonic()
+            result = func(chat_model)
+
+            # Latencies are recorded even for losing requests, so the tail of the distribution stays visible.
+            self.latency_tracker.record(model_name, time.monotonic() - started_at)
+
+            return result
+
+        return self.executor.submit(run)
+
+    def try_reserve_hedge(self) -> bool:
+        with self.lock:
+            if self.stats.hedged_requests + 1 > self.max_hedge_rate * self.stats.requests:
+                return False
+
+            self.stats.hedged_requests += 1
+
+            return True
+
+    def execute(self, chat_model: BaseChatModel, func: Callable[[BaseChatModel], T]) -> T:
+        with self.lock:
+            self.stats.requests += 1
+
+        hedge_delay = self.latency_tracker.percentile(
+            get_chat_model_name(chat_model), percentile=self.percentile, min_samples=self.min_samples
+        )
+
+        primary_started = threading.Event()
+        primary = self.submit(chat_model, func, started=primary_started)
+        if hedge_delay is None:
+            return primary.result()
+
+        # Time spent queued behind other requests in the pool does not count towards the hedge delay.
+        primary_started.wait()
+
+        done, _ = wait([primary], timeout=hedge_delay)
+        if len(done) > 0 or not self.try_reserve_hedge():
+            return primary.result()
+
+        hedge = self.submit(self.fallback_chat_model or chat_model, func)
+        pending = {primary, hedge}
+
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+
+            # If the first one to finish failed, give the other one a chance before giving up.
+            if len(succeeded) == 0 and len(pending) > 0:
+                continue
+
+            winner = succeeded[0] if len(succeeded) > 0 else next(iter(done))
+
+            for future in pending:
+                future.cancel()
+
+            if winner is hedge:
+                with self.lock:
+                    self.stats.hedge_wins += 1
+
+            return winner.result()
@@ -0,0 +1,254 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import dataclasses
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import BaseMessage
+
+
+class RequestPriority(IntEnum):
+    # Lower values are served first.
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclasses.dataclass
+class ModelRateLimits:
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    # Assumed size of a completion when estimating the tokens of a request up front.
+    expected_completion_tokens: int = 256
+    # How long to stop sending requests after the provider rate limited us.
+    rate_limited_cooldown_seconds: float = 2.0
+    # Requests slower than this multiple of the typical (exponentially weighted average) latency mean the provider is
+    # queueing us. None disables backing off on latency, leaving only rate limit errors.
+    latency_backoff_ratio: Optional[float] = 4.0
+    latency_smoothing: float = 0.1
+    # Latency is only trusted once the average has seen a few requests of different sizes.
+    min_latency_samples: int = 10
+
+
+@dataclasses.dataclass
+class ModelRateLimiterStats:
+    requests: int = 0
+    rate_limited_requests: int = 0
+    total_wait_seconds: float = 0.0
+    concurrency_limit: float = 0.0
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until_available(self, amount: float) -> float:
+        self.refill()
+
+        # Requests larger than the bucket would never fit; let them through once the bucket is full.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        self.refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ModelRateLimiter:
+    # Combines request and token buckets with an adaptive concurrency limit: the limit grows additively while requests
+    # succeed and is cut in half when the provider rate limits us (AIMD), so throughput stays near the quota without
+    # retry storms. Waiting requests are served strictly by priority and then in arrival order.
+
+    def __init__(self, limits: ModelRateLimits):
+        self.limits = limits
+
+        self.request_bucket = (
+            TokenBucket(capacity=limits.requests_per_minute, refill_per_second=limits.requests_per_minute / 60)
+            if limits.requests_per_minute is not None
+            else None
+        )
+        self.token_bucket = (
+            TokenBucket(capacity=limits.tokens_per_minute, refill_per_second=limits.tokens_per_minute / 60)
+            if limits.tokens_per_minute is not None
+            else None
+        )
+
+        self.concurrency_limit = float(limits.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.average_latency: Optional[float] = None
+        self.n_latency_samples = 0
+
+        self.condition = threading.Condition()
+        self.waiters: List[Tuple[int, int]] = []
+        self.counter = itertools.count()
+
+        self.stats = ModelRateLimiterStats(concurrency_limit=self.concurrency_limit)
+
+    def time_until_available(self, tokens: int) -> float:
+        wait = max(0.0, self.blocked_until - time.monotonic())
+
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.time_until_available(1))
+
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.time_until_available(tokens))
+
+        return wait
+
+    def acquire(self, tokens: int, priority: RequestPriority = RequestPriority.INTERACTIVE) -> None:
+        started_at = time.monotonic()
+
+        with self.condition:
+            ticket = (int(priority), next(self.counter))
+            heapq.heappush(self.waiters, ticket)
+
+            try:
+                while True:
+                    if self.waiters[0] == ticket and self.in_flight < max(1, int(self.concurrency_limit)):
+                        wait = self.time_until_available(tokens)
+                        if wait <= 0:
+                            break
+
+                        self.condition.wait(timeout=wait)
+                    else:
+                        self.condition.wait()
+            finally:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens)
+
+            self.in_flight += 1
+            self.stats.requests += 1
+            self.stats.total_wait_seconds += time.monotonic() - started_at
+
+    def release(self, latency: Optional[float] = None, rate_limited: bool = False) -> None:
+        with self.condition:
+            self.in_flight -= 1
+
+            if rate_limited:
+                self.stats.rate_limited_requests += 1
+                self.concurrency_limit = max(float(self.limits.min_concurrency), self.concurrency_limit / 2)
+                self.blocked_until = time.monotonic() + self.limits.rate_limited_cooldown_seconds
+            elif latency is not None:
+                # Latency far above the typical one means the provider is queueing us; back off gently. The average
+                # (unlike the minimum) follows the mix of short and long completions, so those alone never back off.
+                if (
+                    self.limits.latency_backoff_ratio is not None
+                    and self.average_latency is not None
+                    and self.n_latency_samples >= self.limits.min_latency_samples
+                    and latency > self.average_latency * self.limits.latency_backoff_ratio
+                ):
+                    self.concurrency_limit = max(float(self.limits.min_concurrency), self.concurrency_limit * 0.9)
+                else:
+                    self.concurrency_limit = min(
+                        float(self.limits.max_concurrency), self.concurrency_limit + 1 / self.concurrency_limit
+                    )
+
+                if self.average_latency is None:
+                    self.average_latency = latency
+                else:
+                    smoothing = self.limits.latency_smoothing
+                    self.average_latency = (1 - smoothing) * self.average_latency + smoothing * latency
+
+                self.n_latency_samples += 1
+
+            self.stats.concurrency_limit = self.concurrency_limit
+            self.condition.notify_all()
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    if type(error).__name__ == "RateLimitError":
+        return True
+
+    return getattr(error, "status_code", None) == 429 or getattr(error, "http_status", None) == 429
+
+
+def get_chat_model_name(chat_model: BaseChatModel) -> str:
+    model_name = getattr(chat_model, "model_name", None)
+    if model_name is not None:
+        return str(model_name)
+
+    return chat_model._llm_type
+
+
+def estimate_messages_tokens(chat_model: BaseChatModel, messages: Sequence[BaseMessage]) -> int:
+    try:
+        return chat_model.get_num_tokens_from_messages(list(messages))
+    except Exception:
+        # Rough approximation of ~4 characters per token.
+        return sum(len(str(message.content)) for message in messages) // 4
+
+
+class AdaptiveRateLimiter:
+    # Meant to be shared by all the participants, conductors, composition generators and parsers of a process.
+
+    def __init__(
+        self, limits: Optional[Dict[str, ModelRateLimits]] = None, default_limits: Optional[ModelRateLimits] = None
+    ):
+        self.limits = limits or {}
+        self.default_limits = default_limits or ModelRateLimits()
+
+        self.lock = threading.Lock()
+        self.model_limiters: Dict[str, ModelRateLimiter] = {}
+
+    def get_model_limiter(self, model_name: str) -> ModelRateLimiter:
+        with self.lock:
+            limiter = self.model_limiters.get(model_name)
+            if limiter is None:
+                limiter = ModelRateLimiter(limits=self.limits.get(model_name, self.default_limits))
+                self.model_limiters[model_name] = limiter
+
+            return limiter
+
+    @property
+    def stats(self) -> Dict[str, ModelRateLimiterStats]:
+        with self.lock:
+            return {model_name: limiter.stats for model_name, limiter in self.model_limiters.items()}
+
+    @contextmanager
+    def limit(
+        self,
+        chat_model: BaseChatModel,
+        messages: Sequence[BaseMessage],
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> Iterator[None]:
+        limiter = self.get_model_limiter(get_chat_model_name(chat_model))
+
+        max_tokens = getattr(chat_model, "max_tokens", None)
+        completion_tokens = max_tokens if isinstance(max_tokens, int) else limiter.limits.expected_completion_tokens
+        tokens = estimate_messages_tokens(chat_model, messages) + completion_tokens
+
+        limiter.acquire(tokens=tokens, priority=priority)
+
+        started_at = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            limiter.release(rate_limited=is_rate_limit_error(e))
+            raise
+
+        limiter.release(latency=time.monotonic() - started_at)
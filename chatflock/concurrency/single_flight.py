@@ -0,0 +1,50 @@
+from typing import Any, Callable, Dict, TypeVar
+
+import dataclasses
+import threading
+from concurrent.futures import Future
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class SingleFlightStats:
+    calls: int = 0
+    coalesced_calls: int = 0
+
+
+class SingleFlight:
+    # Makes sure only one execution of a function is in-flight for a given key at a time. Callers that arrive while
+    # an execution for the same key is in progress wait for it and share its result (or exception).
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, "Future[Any]"] = {}
+        self.stats = SingleFlightStats()
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.stats.coalesced_calls += 1
+                is_leader = False
+            else:
+                future = Future()
+                self.in_flight[key] = future
+                self.stats.calls += 1
+                is_leader = True
+
+        if not is_leader:
+            return future.result()  # type: ignore
+
+        try:
+            result = func()
+            future.set_result(result)
+
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
@@ -0,0 +1,66 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+ToolCall = Tuple[str, Callable[[], str]]
+
+
+class ToolCallsExecutor:
+    def __init__(
+        self,
+        max_workers: int = 4,
+        default_timeout: Optional[float] = None,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        tool_concurrency_limits: Optional[Dict[str, int]] = None,
+    ):
+        if max_workers <= 0:
+            raise ValueError("Max workers must be greater than 0.")
+
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.tool_semaphores = {
+            tool_name: threading.BoundedSemaphore(limit) for tool_name, limit in (tool_concurrency_limits or {}).items()
+        }
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatflock-tool")
+
+    def get_timeout(self, tool_name: str) -> Optional[float]:
+        return self.tool_timeouts.get(tool_name, self.default_timeout)
+
+    def run_limited(self, tool_name: str, func: Callable[[], str]) -> str:
+        semaphore = self.tool_semaphores.get(tool_name)
+        if semaphore is None:
+            return func()
+
+        with semaphore:
+            return func()
+
+    def execute(self, tool_calls: Sequence[ToolCall]) -> List[str]:
+        # Results are returned in the same order as the given tool calls.
+        started_at = time.monotonic()
+        futures: List["Future[str]"] = [
+            self.executor.submit(self.run_limited, tool_name, func) for tool_name, func in tool_calls
+        ]
+
+        results = []
+        for (tool_name, _), future in zip(tool_calls, futures):
+            timeout = self.get_timeout(tool_name)
+            remaining = None if timeout is None else max(0.0, started_at + timeout - time.monotonic())
+
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                # Threads cannot be interrupted; the tool keeps running in the background and its result is dropped.
+                future.cancel()
+                results.append(f"Error executing function: timed out after {timeout} seconds.")
+            except Exception as e:
+                results.append(f"Error executing function: {e}")
+
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
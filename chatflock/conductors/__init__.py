@@ -1,4 +1,34 @@
+from .decision_cache import SpeakerDecisionCache, classify_message
+from .history import ChatHistoryCompactor, CompactChatHistory
 from .langchain import LangChainBasedAIChatConductor
+from .pre_selection import (
+    AlternationPreSelector,
+    MentionPreSelector,
+    PredicatePreSelector,
+    SpeakerPreSelector,
+    SpeakerSelectionStats,
+    TerminationSentinelPreSelector,
+    default_speaker_pre_selectors,
+)
 from .round_robin import RoundRobinChatConductor
+from .state_machine import InteractionGraph, InteractionPhase, StateMachineChatConductor, compile_interaction_schema
 
-__all__ = ["RoundRobinChatConductor", "LangChainBasedAIChatConductor"]
+__all__ = [
+    "RoundRobinChatConductor",
+    "LangChainBasedAIChatConductor",
+    "StateMachineChatConductor",
+    "InteractionGraph",
+    "InteractionPhase",
+    "compile_interaction_schema",
+    "SpeakerPreSelector",
+    "TerminationSentinelPreSelector",
+    "MentionPreSelector",
+    "AlternationPreSelector",
+    "PredicatePreSelector",
+    "SpeakerSelectionStats",
+    "default_speaker_pre_selectors",
+    "ChatHistoryCompactor",
+    "CompactChatHistory",
+    "SpeakerDecisionCache",
+    "classify_message",
+]
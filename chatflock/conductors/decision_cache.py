@@ -0,0 +1,129 @@
+from typing import Any, Callable, Dict, Optional
+
+import hashlib
+import json
+import random
+import threading
+
+from chatflock.base import Chat, ChatMessage
+from chatflock.caches import Cache, CacheStats, InMemoryCache
+from chatflock.conductors.pre_selection import TERMINATE
+
+MessageClassifier = Callable[[ChatMessage], str]
+# Gets the chat, the interaction schema and the goal of the conductor.
+StateFingerprint = Callable[[Chat, Optional[str], Optional[str]], Dict[str, Any]]
+
+
+def classify_message(message: ChatMessage) -> str:
+    content = message.content.strip()
+
+    if len(content) == 0:
+        return "empty"
+
+    if content.endswith(TERMINATE):
+        return "termination"
+
+    if content.endswith("?"):
+        return "question"
+
+    return "statement"
+
+
+class SpeakerDecisionCache:
+    # Remembers the speaker the LLM selected for a conversation state, so recurring states (e.g. in templated
+    # workflows) are resolved without an LLM call. A decision is only served once it was observed `min_observations`
+    # times with an agreement of at least `min_agreement`, and a `resample_rate` fraction of lookups still goes to the
+    # LLM, so a decision that stopped being the right one loses its agreement. Share one instance between conductors,
+    # and back it with a DiskCache to persist the decisions.
+
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        last_k_senders: int = 3,
+        message_classifier: Optional[MessageClassifier] = None,
+        fingerprint: Optional[StateFingerprint] = None,
+        min_observations: int = 2,
+        min_agreement: float = 1.0,
+        resample_rate: float = 0.1,
+        ttl: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        if not 0 < min_agreement <= 1:
+            raise ValueError("Min agreement must be between 0 (exclusive) and 1.")
+
+        if not 0 <= resample_rate <= 1:
+            raise ValueError("Resample rate must be between 0 and 1.")
+
+        self.cache = cache or InMemoryCache()
+        self.last_k_senders = last_k_senders
+        self.message_classifier = message_classifier or classify_message
+        self.fingerprint = fingerprint or self.default_fingerprint
+        self.min_observations = max(1, min_observations)
+        self.min_agreement = min_agreement
+        self.resample_rate = resample_rate
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.stats = CacheStats()
+        self.n_resamples = 0
+
+    def default_fingerprint(self, chat: Chat, interaction_schema: Optional[str], goal: Optional[str]) -> Dict[str, Any]:
+        messages = chat.get_messages()
+
+        return {
+            "goal": goal,
+            "interaction_schema": interaction_schema,
+            "participants": sorted(participant.name for participant in chat.get_active_participants()),
+            "last_senders": [message.sender_name for message in messages[-self.last_k_senders :]]
+            if self.last_k_senders > 0
+            else [],
+            "last_message_class": self.message_classifier(messages[-1]) if len(messages) > 0 else None,
+        }
+
+    def create_key(self, chat: Chat, interaction_schema: Optional[str], goal: Optional[str]) -> str:
+        fingerprint = json.dumps(self.fingerprint(chat, interaction_schema, goal), sort_keys=True, default=str)
+
+        return f"speaker_decision:{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()}"
+
+    def get(self, chat: Chat, interaction_schema: Optional[str] = None, goal: Optional[str] = None) -> Optional[str]:
+        key = self.create_key(chat=chat, interaction_schema=interaction_schema, goal=goal)
+        votes: Dict[str, int] = self.cache.get(key) or {}
+
+        name = self.get_confident_decision(votes)
+        if name is not None and name != TERMINATE and not chat.has_active_participant_with_name(name):
+            name = None
+
+        # Served decisions are never recorded again, so some are re-observed (by the caller, through the LLM) instead.
+        if name is not None and self.resample_rate > 0:
+            with self.lock:
+                resample = self.random.random() < self.resample_rate
+
+            if resample:
+                self.n_resamples += 1
+                name = None
+
+        self.stats.record(hit=name is not None)
+
+        return name
+
+    def get_confident_decision(self, votes: Dict[str, int]) -> Optional[str]:
+        if len(votes) == 0:
+            return None
+
+        name, count = max(votes.items(), key=lambda item: item[1])
+        if count < self.min_observations or count / sum(votes.values()) < self.min_agreement:
+            return None
+
+        return name
+
+    def record(
+        self, chat: Chat, name: str, interaction_schema: Optional[str] = None, goal: Optional[str] = None
+    ) -> None:
+        key = self.create_key(chat=chat, interaction_schema=interaction_schema, goal=goal)
+
+        with self.lock:
+            votes: Dict[str, int] = dict(self.cache.load(key) or {})
+            votes[name] = votes.get(name, 0) + 1
+
+            self.cache.set(key, votes, ttl=self.ttl)
@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import dataclasses
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import HumanMessage, SystemMessage
+
+from chatflock.ai_utils import execute_chat_model_messages
+from chatflock.base import Chat, ChatMessage
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.structured_string import Section, StructuredString
+
+
+def estimate_text_tokens(text: str, chat_model: Optional[BaseChatModel] = None) -> int:
+    if chat_model is not None:
+        try:
+            return chat_model.get_num_tokens(text)
+        except Exception:
+            pass
+
+    # Rough approximation of ~4 characters per token.
+    return len(text) // 4 + 1
+
+
+def format_chat_message(message: ChatMessage, max_length: Optional[int] = None) -> str:
+    content = message.content
+    if max_length is not None and len(content) > max_length:
+        content = f"{content[:max_length].rstrip()}... (truncated)"
+
+    return f"- {message.sender_name}: {content}"
+
+
+@dataclasses.dataclass
+class CompactChatHistory:
+    summary: Optional[str]
+    messages: List[str]
+
+
+class ChatHistoryCompactor:
+    # Builds a compact view of the chat history for prompts that are sent every turn: the last few messages in full,
+    # older ones truncated, and (if a chat model is given) the oldest ones folded into a rolling summary. Summaries and
+    # formatted messages are cached across turns, so the summary is only updated once per `summary_chunk_size` messages.
+
+    def __init__(
+        self,
+        n_recent_messages: int = 6,
+        max_message_length: int = 300,
+        max_tokens: Optional[int] = None,
+        chat_model: Optional[BaseChatModel] = None,
+        chat_model_args: Optional[Dict[str, Any]] = None,
+        summary_chunk_size: int = 10,
+        execution_options: Optional[ExecutionOptions] = None,
+    ):
+        self.n_recent_messages = max(1, n_recent_messages)
+        self.max_message_length = max_message_length
+        self.max_tokens = max_tokens
+        self.chat_model = chat_model
+        self.chat_model_args = chat_model_args or {}
+        self.summary_chunk_size = max(1, summary_chunk_size)
+        # Summary calls go through the options of the conductor using the compactor, unless given here.
+        self.execution_options = execution_options
+
+        self.summary: Optional[str] = None
+        self.n_summarized_messages = 0
+        self.formatted_messages: Dict[Tuple[int, bool], Tuple[str, int]] = {}
+
+    def reset(self) -> None:
+        self.summary = None
+        self.n_summarized_messages = 0
+        self.formatted_messages = {}
+
+    def compact(
+        self, chat: Chat, execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS
+    ) -> CompactChatHistory:
+        messages = chat.get_messages()
+
+        # The chat was cleared (or is a different chat); start over.
+        if len(messages) < self.n_summarized_messages:
+            self.reset()
+
+        n_older_messages = max(0, len(messages) - self.n_recent_messages)
+
+        if self.chat_model is not None and n_older_messages - self.n_summarized_messages >= self.summary_chunk_size:
+            self.update_summary(
+                messages=messages[self.n_summarized_messages : n_older_messages],
+                execution_options=self.execution_options or execution_options,
+            )
+            self.n_summarized_messages = n_older_messages
+
+        older_messages = messages[self.n_summarized_messages : n_older_messages]
+        recent_messages = messages[n_older_messages:]
+
+        lines = [self.format_message(message, truncate=True) for message in older_messages] + [
+            self.format_message(message, truncate=False) for message in recent_messages
+        ]
+
+        if self.max_tokens is not None:
+            lines = self.fit_to_budget(lines=lines, n_recent=len(recent_messages))
+
+        return CompactChatHistory(summary=self.summary, messages=[text for text, _ in lines])
+
+    def format_message(self, message: ChatMessage, truncate: bool) -> Tuple[str, int]:
+        key = (message.id, truncate)
+
+        formatted = self.formatted_messages.get(key)
+        if formatted is None:
+            text = format_chat_message(message, max_length=self.max_message_length if truncate else None)
+            formatted = self.formatted_messages[key] = (text, estimate_text_tokens(text, chat_model=self.chat_model))
+
+        return formatted
+
+    def fit_to_budget(self, lines: List[Tuple[str, int]], n_recent: int) -> List[Tuple[str, int]]:
+        assert self.max_tokens is not None
+
+        budget = self.max_tokens
+        if self.summary is not None:
+            budget -= estimate_text_tokens(self.summary, chat_model=self.chat_model)
+
+        # Drop the oldest messages first, but always keep the most recent one.
+        n_omitted = 0
+        while len(lines) > 1 and sum(tokens for _, tokens in lines) > budget:
+            lines = lines[1:]
+            n_omitted += 1
+
+        if n_omitted > 0:
+            lines = [(f"- ({n_omitted} earlier messages omitted)", 0), *lines]
+
+        return lines
+
+    def update_summary(
+        self, messages: Sequence[ChatMessage], execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS
+    ) -> None:
+        assert self.chat_model is not None
+
+        system_message = StructuredString(
+            sections=[
+                Section(
+                    name="Mission",
+                    text="Update the summary of a group chat with its next messages. The summary is used to decide "
+                    "who should speak next, so keep who said what, decisions made, open questions and the current "
+                    "state of the conversation. Be concise.",
+                ),
+                Section(name="Output", text="Only the updated summary."),
+            ]
+        )
+        prompt = StructuredString(
+            sections=[
+                Section(name="Current Summary", text=self.summary or "No summary yet."),
+                Section(name="Next Messages", list=[format_chat_message(message) for message in messages]),
+            ]
+        )
+
+        self.summary = execute_chat_model_messages(
+            chat_model=self.chat_model,
+            messages=[SystemMessage(content=str(system_message)), HumanMessage(content=str(prompt))],
+            chat_model_args=self.chat_model_args,
+            execution_options=execution_options,
+        ).strip()
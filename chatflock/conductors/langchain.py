@@ -1,14 +1,55 @@
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, Type
+
+import re
+from functools import lru_cache
 
 from halo import Halo
 from langchain.chat_models.base import BaseChatModel
 from langchain.schema import AIMessage, BaseMessage, BaseRetriever, Document, HumanMessage, SystemMessage
 from langchain.tools import BaseTool
-
-from chatflock.ai_utils import execute_chat_model_messages
+from pydantic import BaseModel, Field, create_model
+
+from chatflock.ai_utils import (
+    execute_chat_model_function_call,
+    execute_chat_model_messages,
+    is_request_rejected_error,
+    pydantic_to_openai_function,
+)
 from chatflock.base import ActiveChatParticipant, Chat, ChatCompositionGenerator, ChatConductor, ChatMessage
+from chatflock.conductors.decision_cache import SpeakerDecisionCache
+from chatflock.conductors.history import ChatHistoryCompactor, format_chat_message
+from chatflock.conductors.pre_selection import (
+    TERMINATE,
+    SpeakerPreSelector,
+    SpeakerSelectionStats,
+    pre_select_next_speaker,
+)
 from chatflock.errors import ChatParticipantNotJoinedToChatError
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
 from chatflock.structured_string import Section, StructuredString
+from chatflock.utils import find_best_matching_name
+
+
+# The schemas are created once per set of names, so their function specs are served from the schema registry.
+@lru_cache(maxsize=128)
+def create_speaker_plan_schema(names: Tuple[str, ...], max_length: int) -> Type[BaseModel]:
+    return create_model(
+        "SpeakerPlan",
+        __doc__=f"Plan the next speakers, ending with {TERMINATE} if the chat should end.",
+        speakers=(
+            List[Literal[names]],  # type: ignore
+            Field(description="The names of the next speakers, in order.", max_length=max_length),
+        ),
+    )
+
+
+@lru_cache(maxsize=128)
+def create_name_selection_schema(names: Tuple[str, ...], kind: str) -> Type[BaseModel]:
+    return create_model(
+        "NameSelection",
+        __doc__=f"Select the next {kind}, or {TERMINATE} if the chat should end.",
+        name=(Literal[names], Field(description=f"The name of the next {kind}.")),  # type: ignore
+    )
 
 
 class LangChainBasedAIChatConductor(ChatConductor):
@@ -22,6 +63,12 @@ class LangChainBasedAIChatConductor(ChatConductor):
         spinner: Optional[Halo] = None,
         tools: Optional[List[BaseTool]] = None,
         chat_model_args: Optional[Dict[str, Any]] = None,
+        execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+        pre_selectors: Optional[Sequence[SpeakerPreSelector]] = None,
+        constrained_selection: bool = True,
+        lookahead_turns: int = 1,
+        history_compactor: Optional[ChatHistoryCompactor] = None,
+        decision_cache: Optional[SpeakerDecisionCache] = None,
     ):
         self.chat_model = chat_model
         self.chat_model_args = chat_model_args or {}
@@ -31,10 +78,77 @@ class LangChainBasedAIChatConductor(ChatConductor):
         self.composition_generator = composition_generator
         self.interaction_schema = interaction_schema
         self.spinner = spinner
+        self.execution_options = execution_options
+        self.pre_selectors = list(pre_selectors or [])
+        self.constrained_selection = constrained_selection
+        self.function_calling_supported = True
+        self.lookahead_turns = max(1, lookahead_turns)
+        self.history_compactor = history_compactor
+        self.decision_cache = decision_cache
+        self.selection_stats = SpeakerSelectionStats()
+        self.static_prompt_sections: Dict[int, List[Section]] = {}
+
+        self.planned_speaker_names: List[str] = []
+        self.n_messages_at_last_selection = 0
+        self.last_selected_speaker_name: Optional[str] = None
 
         self.composition_initialized = False
 
-    def create_next_speaker_system_prompt(self, chat: "Chat") -> str:
+    def get_static_prompt_sections(self, n_speakers: int) -> List[Section]:
+        # The instructions only depend on the number of speakers to select. They are built once and reused every
+        # turn, so their rendered text is cached by the sections.
+        sections = self.static_prompt_sections.get(n_speakers)
+        if sections is not None:
+            return sections
+
+        sections = [
+            Section(
+                name="Mission",
+                text="Select the next speaker in the conversation based on the previous messages in the "
+                "conversation and an optional INTERACTION SCHEMA. If it seems to you that the chat "
+                "should end instead of selecting a next speaker, terminate it.",
+            ),
+            Section(name="Rules", list=["You can only select one of the participants in the group chat."]),
+            Section(
+                name="Process",
+                list=[
+                    "Look at the last message in the conversation and determine who should speak next based on the "
+                    "INTERACTION SCHEMA, if provided.",
+                    "If you determine that the chat should end, you should return the "
+                    "string TERMINATE instead of a participant name. For example, when the goal has been achieved, "
+                    ", it is impossible to reach, or if the user asks to terminate the chat.",
+                ],
+            ),
+            Section(
+                name="Input",
+                list=[
+                    "Chat goal",
+                    "Currently active participants in the conversation",
+                    "Speaker interaction schema",
+                    "Previous messages from the conversation",
+                ],
+            ),
+            Section(
+                name="Output",
+                text="The name of the next speaker in the conversation. Or, TERMINATE if the chat should end, "
+                "instead.",
+            )
+            if n_speakers == 1
+            else Section(
+                name="Output",
+                text=f"An ordered plan of the names of the next {n_speakers} speakers (at most) in the "
+                "conversation, as long as the flow of the conversation is predictable. Put TERMINATE at the "
+                "point where the chat should end, if it should.",
+            ),
+            Section(name="Example Outputs", list=['"John"', '"TERMINATE"'])
+            if n_speakers == 1
+            else Section(name="Example Outputs", list=['"John, Jane, John"', '"John, TERMINATE"']),
+        ]
+        self.static_prompt_sections[n_speakers] = sections
+
+        return sections
+
+    def create_next_speaker_system_prompt(self, chat: "Chat", n_speakers: int = 1) -> str:
         chat_messages = chat.get_messages()
 
         if self.retriever is not None and len(chat_messages) > 0:
@@ -44,38 +158,7 @@ class LangChainBasedAIChatConductor(ChatConductor):
 
         system_message = StructuredString(
             sections=[
-                Section(
-                    name="Mission",
-                    text="Select the next speaker in the conversation based on the previous messages in the "
-                    "conversation and an optional INTERACTION SCHEMA. If it seems to you that the chat "
-                    "should end instead of selecting a next speaker, terminate it.",
-                ),
-                Section(name="Rules", list=["You can only select one of the participants in the group chat."]),
-                Section(
-                    name="Process",
-                    list=[
-                        "Look at the last message in the conversation and determine who should speak next based on the "
-                        "INTERACTION SCHEMA, if provided.",
-                        "If you determine that the chat should end, you should return the "
-                        "string TERMINATE instead of a participant name. For example, when the goal has been achieved, "
-                        ", it is impossible to reach, or if the user asks to terminate the chat.",
-                    ],
-                ),
-                Section(
-                    name="Input",
-                    list=[
-                        "Chat goal",
-                        "Currently active participants in the conversation",
-                        "Speaker interaction schema",
-                        "Previous messages from the conversation",
-                    ],
-                ),
-                Section(
-                    name="Output",
-                    text="The name of the next speaker in the conversation. Or, TERMINATE if the chat should end, "
-                    "instead.",
-                ),
-                Section(name="Example Outputs", list=['"John"', '"TERMINATE"']),
+                *self.get_static_prompt_sections(n_speakers=n_speakers),
                 Section(
                     name="Additional Context for Selection",
                     text="None"
@@ -93,10 +176,28 @@ class LangChainBasedAIChatConductor(ChatConductor):
 
         return str(system_message)
 
-    def create_next_speaker_first_human_prompt(self, chat: "Chat", goal: str) -> str:
-        messages = chat.get_messages()
-        messages_list = [f"- {message.sender_name}: {message.content}" for message in messages]
+    def create_chat_messages_sections(self, chat: "Chat") -> List[Section]:
+        summary = None
+        if self.history_compactor is not None:
+            history = self.history_compactor.compact(chat=chat, execution_options=self.execution_options)
+            summary, messages_list = history.summary, history.messages
+        else:
+            messages_list = [format_chat_message(message) for message in chat.get_messages()]
+
+        sections = [
+            Section(
+                name="Chat Messages",
+                text="No messages yet." if len(messages_list) == 0 else None,
+                list=messages_list if len(messages_list) > 0 else [],
+            )
+        ]
 
+        if summary is not None:
+            sections.insert(0, Section(name="Summary of Earlier Chat Messages", text=summary))
+
+        return sections
+
+    def create_next_speaker_first_human_prompt(self, chat: "Chat", goal: str) -> str:
         participants = chat.get_active_participants()
 
         prompt = StructuredString(
@@ -109,11 +210,7 @@ class LangChainBasedAIChatConductor(ChatConductor):
                     name="Interaction Schema",
                     text=self.interaction_schema or "Not provided. Use your best judgement.",
                 ),
-                Section(
-                    name="Chat Messages",
-                    text="No messages yet." if len(messages_list) == 0 else None,
-                    list=messages_list if len(messages_list) > 0 else [],
-                ),
+                *self.create_chat_messages_sections(chat=chat),
             ]
         )
 
@@ -148,6 +245,9 @@ class LangChainBasedAIChatConductor(ChatConductor):
 
             self.composition_initialized = True
 
+        if self.history_compactor is not None:
+            self.history_compactor.reset()
+
         super().prepare_chat(chat=chat, **kwargs)
 
     def select_next_speaker(self, chat: Chat) -> Optional[ActiveChatParticipant]:
@@ -161,27 +261,9 @@ class LangChainBasedAIChatConductor(ChatConductor):
             else:
                 self.spinner.start(text=f"The Chat Conductor ({chat.name}) is selecting the next speaker...")
 
-        # Ask the AI to select the next speaker.
-        messages = [
-            SystemMessage(content=self.create_next_speaker_system_prompt(chat=chat)),
-            HumanMessage(content=self.create_next_speaker_first_human_prompt(chat=chat, goal=self.goal)),
-        ]
+        next_speaker_name = self.select_next_speaker_name(chat=chat)
 
-        result = self.execute_messages(messages=messages)
-        next_speaker_name = result.strip()
-
-        while not chat.has_active_participant_with_name(next_speaker_name) and next_speaker_name != "TERMINATE":
-            messages.append(AIMessage(content=next_speaker_name))
-            messages.append(
-                HumanMessage(
-                    content=f'Speaker "{next_speaker_name}" is not a participant in the chat. Choose another one.'
-                )
-            )
-
-            result = self.execute_messages(messages=messages)
-            next_speaker_name = result.strip()
-
-        if next_speaker_name == "TERMINATE":
+        if next_speaker_name == TERMINATE:
             if self.spinner is not None:
                 if chat.name is None:
                     self.spinner.stop_and_persist(
@@ -210,6 +292,182 @@ class LangChainBasedAIChatConductor(ChatConductor):
 
         return next_speaker
 
+    def select_next_speaker_name(self, chat: Chat) -> str:
+        # Resolve the obvious cases locally, and only ask the AI when it's ambiguous.
+        next_speaker_name = pre_select_next_speaker(
+            chat=chat, pre_selectors=self.pre_selectors, stats=self.selection_stats
+        )
+        if next_speaker_name is not None:
+            self.planned_speaker_names = []
+        elif len(self.planned_speaker_names) > 0 and self.is_plan_valid(chat=chat):
+            self.selection_stats.pre_selections["Plan"] = self.selection_stats.pre_selections.get("Plan", 0) + 1
+            next_speaker_name = self.planned_speaker_names.pop(0)
+        else:
+            self.planned_speaker_names = []
+
+            if self.decision_cache is not None:
+                next_speaker_name = self.decision_cache.get(
+                    chat=chat, interaction_schema=self.interaction_schema, goal=self.goal
+                )
+
+            if next_speaker_name is not None:
+                self.selection_stats.pre_selections["DecisionCache"] = (
+                    self.selection_stats.pre_selections.get("DecisionCache", 0) + 1
+                )
+            else:
+                if self.lookahead_turns == 1:
+                    next_speaker_name = self.select_next_speaker_name_with_ai(chat=chat)
+                else:
+                    self.planned_speaker_names = self.plan_next_speaker_names_with_ai(chat=chat)
+                    next_speaker_name = self.planned_speaker_names.pop(0)
+
+                if self.decision_cache is not None:
+                    self.decision_cache.record(
+                        chat=chat, name=next_speaker_name, interaction_schema=self.interaction_schema, goal=self.goal
+                    )
+
+        self.n_messages_at_last_selection = len(chat.get_messages())
+        self.last_selected_speaker_name = next_speaker_name
+
+        return next_speaker_name
+
+    def is_plan_valid(self, chat: Chat) -> bool:
+        # The plan holds as long as the chat went exactly as expected since it was made.
+        next_speaker_name = self.planned_speaker_names[0]
+        if next_speaker_name != TERMINATE and not chat.has_active_participant_with_name(next_speaker_name):
+            return False
+
+        new_messages = chat.get_messages()[self.n_messages_at_last_selection :]
+        if len(new_messages) != 1 or new_messages[0].sender_name != self.last_selected_speaker_name:
+            return False
+
+        last_message = new_messages[0]
+        if TERMINATE in last_message.content:
+            return False
+
+        # Mentioning a participant other than the planned next speaker may redirect the conversation.
+        for participant in chat.get_active_participants():
+            if participant.name in (last_message.sender_name, next_speaker_name):
+                continue
+
+            if re.search(rf"(?<!\w){re.escape(participant.name)}(?!\w)", last_message.content) is not None:
+                return False
+
+        return True
+
+    def plan_next_speaker_names_with_ai(self, chat: Chat) -> List[str]:
+        self.selection_stats.llm_selections += 1
+
+        names = [participant.name for participant in chat.get_active_participants()] + [TERMINATE]
+        messages: List[BaseMessage] = [
+            SystemMessage(content=self.create_next_speaker_system_prompt(chat=chat, n_speakers=self.lookahead_turns)),
+            HumanMessage(content=self.create_next_speaker_first_human_prompt(chat=chat, goal=self.goal)),
+        ]
+
+        planned_names: List[str] = []
+
+        result: Optional[str] = None
+
+        if self.should_constrain_selection():
+            plan_schema = create_speaker_plan_schema(names=tuple(names), max_length=self.lookahead_turns)
+            response = self.execute_function_call(
+                messages=messages,
+                function=pydantic_to_openai_function(plan_schema, function_name="plan_next_speakers"),
+            )
+            if response is not None:
+                arguments, result = response
+                if arguments is not None and isinstance(arguments.get("speakers"), list):
+                    planned_names = [name for name in arguments["speakers"] if name in names]
+
+        if result is None:
+            result = self.execute_messages(messages=messages)
+
+        if len(planned_names) == 0:
+            matched_names = (find_best_matching_name(part, names) for part in re.split(r"[,\n]", result))
+            planned_names = [name for name in matched_names if name is not None]
+
+        if len(planned_names) == 0:
+            return [self.select_name_with_ai(messages=messages, names=names[:-1], kind="speaker")]
+
+        planned_names = planned_names[: self.lookahead_turns]
+        if TERMINATE in planned_names:
+            planned_names = planned_names[: planned_names.index(TERMINATE) + 1]
+
+        return planned_names
+
+    def select_next_speaker_name_with_ai(self, chat: Chat) -> str:
+        self.selection_stats.llm_selections += 1
+
+        messages = [
+            SystemMessage(content=self.create_next_speaker_system_prompt(chat=chat)),
+            HumanMessage(content=self.create_next_speaker_first_human_prompt(chat=chat, goal=self.goal)),
+        ]
+
+        return self.select_name_with_ai(
+            messages=messages,
+            names=[participant.name for participant in chat.get_active_participants()],
+            kind="speaker",
+        )
+
+    def select_name_with_ai(self, messages: List[BaseMessage], names: Sequence[str], kind: str) -> str:
+        names = [*names, TERMINATE]
+
+        result: Optional[str] = None
+
+        # Constrain the output to the valid names, so no corrective round trips are needed.
+        if self.should_constrain_selection():
+            selection_schema = create_name_selection_schema(names=tuple(names), kind=kind)
+            response = self.execute_function_call(
+                messages=messages,
+                function=pydantic_to_openai_function(selection_schema, function_name=f"select_next_{kind}"),
+            )
+            if response is not None:
+                arguments, result = response
+                if arguments is not None and arguments.get("name") in names:
+                    return str(arguments["name"])
+
+        if result is None:
+            result = self.execute_messages(messages=messages)
+
+        name = find_best_matching_name(result.strip(), names)
+
+        # Last resort, if the output could not be matched locally.
+        while name is None:
+            messages.append(AIMessage(content=result))
+            messages.append(
+                HumanMessage(content=f'"{result.strip()}" is not a valid {kind}. Choose one of: {", ".join(names)}.')
+            )
+
+            result = self.execute_messages(messages=messages)
+            name = find_best_matching_name(result.strip(), names)
+
+        return name
+
+    def should_constrain_selection(self) -> bool:
+        # Not possible when the conductor has tools of its own to call, or when the chat model rejected function calls.
+        return self.constrained_selection and self.function_calling_supported and not self.tools
+
+    def execute_function_call(
+        self, messages: Sequence[BaseMessage], function: Dict[str, Any]
+    ) -> Optional[Tuple[Optional[Dict[str, Any]], str]]:
+        # Returns None if the chat model (or its endpoint) rejects function calling, in which case the selection falls
+        # back to free text, for the rest of the chat as well. Transient failures (e.g. timeouts) are raised as usual.
+        try:
+            return execute_chat_model_function_call(
+                chat_model=self.chat_model,
+                messages=messages,
+                function=function,
+                chat_model_args=self.chat_model_args,
+                execution_options=self.execution_options,
+            )
+        except Exception as e:
+            if not is_request_rejected_error(e):
+                raise
+
+            self.function_calling_supported = False
+
+            return None
+
     def execute_messages(self, messages: Sequence[BaseMessage]) -> str:
         return execute_chat_model_messages(
             messages=messages,
@@ -217,6 +475,7 @@ class LangChainBasedAIChatConductor(ChatConductor):
             tools=self.tools,
             spinner=self.spinner,
             chat_model_args=self.chat_model_args,
+            execution_options=self.execution_options,
         )
 
     def get_relevant_docs(self, messages: Sequence[ChatMessage]) -> List[Document]:
@@ -0,0 +1,147 @@
+from typing import Callable, Dict, List, Optional, Sequence
+
+import abc
+import dataclasses
+import re
+
+from chatflock.base import Chat
+
+TERMINATE = "TERMINATE"
+
+
+class SpeakerPreSelector(abc.ABC):
+    # Resolves the next speaker locally when the answer is obvious. Returns the name of the next speaker, TERMINATE
+    # to end the chat, or None when undecided, in which case the next pre-selector (and finally the LLM) decides.
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    @abc.abstractmethod
+    def pre_select_next_speaker(self, chat: Chat) -> Optional[str]:
+        raise NotImplementedError()
+
+
+class TerminationSentinelPreSelector(SpeakerPreSelector):
+    def __init__(self, sentinel: str = TERMINATE):
+        self.sentinel = sentinel
+
+    def pre_select_next_speaker(self, chat: Chat) -> Optional[str]:
+        messages = chat.get_messages()
+        if len(messages) == 0:
+            return None
+
+        if messages[-1].content.strip().endswith(self.sentinel):
+            return TERMINATE
+
+        return None
+
+
+class MentionPreSelector(SpeakerPreSelector):
+    # Selects the participant the last message addresses with an @-mention (e.g. "@John, what do you think?").
+    # Messages mentioning more than one participant are left to the next pre-selector.
+
+    def pre_select_next_speaker(self, chat: Chat) -> Optional[str]:
+        messages = chat.get_messages()
+        if len(messages) == 0:
+            return None
+
+        last_message = messages[-1]
+        mentioned_names = set()
+
+        # Longer names first, so "@John Smith" is not taken for "@John".
+        participants = sorted(chat.get_active_participants(), key=lambda p: len(p.name), reverse=True)
+        content = last_message.content
+
+        for participant in participants:
+            if participant.name == last_message.sender_name:
+                continue
+
+            pattern = rf"@{re.escape(participant.name)}(?![\w-])"
+            if re.search(pattern, content, flags=re.IGNORECASE) is not None:
+                mentioned_names.add(participant.name)
+                content = re.sub(pattern, "", content, flags=re.IGNORECASE)
+
+        if len(mentioned_names) != 1:
+            return None
+
+        return next(iter(mentioned_names))
+
+
+class AlternationPreSelector(SpeakerPreSelector):
+    # With exactly two active participants, the one who did not send the last message speaks next. The chat then only
+    # ends through a termination sentinel, so combine it with a TerminationSentinelPreSelector.
+
+    def pre_select_next_speaker(self, chat: Chat) -> Optional[str]:
+        participants = chat.get_active_participants()
+        if len(participants) != 2:
+            return None
+
+        messages = chat.get_messages()
+        if len(messages) == 0:
+            return None
+
+        last_speaker_name = messages[-1].sender_name
+        other_participants = [p for p in participants if p.name != last_speaker_name]
+        if len(other_participants) != 1:
+            return None
+
+        return other_participants[0].name
+
+
+class PredicatePreSelector(SpeakerPreSelector):
+    def __init__(self, predicate: Callable[[Chat], Optional[str]], name: Optional[str] = None):
+        self.predicate = predicate
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        if self._name is not None:
+            return self._name
+
+        return str(getattr(self.predicate, "__name__", type(self).__name__))
+
+    def pre_select_next_speaker(self, chat: Chat) -> Optional[str]:
+        return self.predicate(chat)
+
+
+def default_speaker_pre_selectors() -> List[SpeakerPreSelector]:
+    return [TerminationSentinelPreSelector(), MentionPreSelector()]
+
+
+@dataclasses.dataclass
+class SpeakerSelectionStats:
+    llm_selections: int = 0
+    pre_selections: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    @property
+    def skipped_llm_calls(self) -> int:
+        return sum(self.pre_selections.values())
+
+    @property
+    def skip_rate(self) -> float:
+        selections = self.skipped_llm_calls + self.llm_selections
+        if selections == 0:
+            return 0.0
+
+        return self.skipped_llm_calls / selections
+
+
+def pre_select_next_speaker(
+    chat: Chat, pre_selectors: Sequence[SpeakerPreSelector], stats: Optional[SpeakerSelectionStats] = None
+) -> Optional[str]:
+    for pre_selector in pre_selectors:
+        next_speaker_name = pre_selector.pre_select_next_speaker(chat)
+        if next_speaker_name is None:
+            continue
+
+        # Ignore answers that would not be accepted from the LLM either.
+        if next_speaker_name != TERMINATE and not chat.has_active_participant_with_name(next_speaker_name):
+            continue
+
+        if stats is not None:
+            stats.pre_selections[pre_selector.name] = stats.pre_selections.get(pre_selector.name, 0) + 1
+
+        return next_speaker_name
+
+    return None
@@ -0,0 +1,278 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from halo import Halo
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field
+
+from chatflock.base import Chat
+from chatflock.conductors.langchain import LangChainBasedAIChatConductor
+from chatflock.conductors.pre_selection import TERMINATE, pre_select_next_speaker
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.structured_string import Section, StructuredString
+
+
+class InteractionPhase(BaseModel):
+    name: str = Field(description="Unique name of the phase.")
+    speaker: str = Field(
+        description="Name of the participant that speaks in this phase. Must be one of the chat participants."
+    )
+    description: str = Field(description="What the speaker should do in this phase.")
+    max_turns: int = Field(
+        default=1, description="How many consecutive messages the speaker sends before the phase can be left."
+    )
+    next_phases: List[str] = Field(
+        default_factory=list,
+        description="Names of the phases that may follow this one. Leave empty if the chat should end after this "
+        "phase.",
+    )
+    exit_condition: Optional[str] = Field(
+        default=None,
+        description="A condition that requires judgement to decide when to leave the phase or which of the next "
+        "phases to move to (e.g. 'the reviewer approved the code'). Leave empty if the next phase follows "
+        "unconditionally.",
+    )
+
+    @property
+    def needs_judgement(self) -> bool:
+        return self.exit_condition is not None or len(self.next_phases) > 1
+
+
+class InteractionGraph(BaseModel):
+    initial_phase: str = Field(description="Name of the phase the chat starts with.")
+    phases: List[InteractionPhase] = Field(description="All the phases of the interaction.")
+
+    def get_phase(self, name: str) -> Optional[InteractionPhase]:
+        for phase in self.phases:
+            if phase.name == name:
+                return phase
+
+        return None
+
+
+def normalize_interaction_graph(graph: InteractionGraph) -> Optional[InteractionGraph]:
+    if len(graph.phases) == 0:
+        return None
+
+    phase_names = {phase.name for phase in graph.phases}
+    phases = [
+        phase.model_copy(
+            update={
+                "max_turns": max(1, phase.max_turns),
+                "next_phases": [name for name in phase.next_phases if name in phase_names],
+            }
+        )
+        for phase in graph.phases
+    ]
+    initial_phase = graph.initial_phase if graph.initial_phase in phase_names else phases[0].name
+
+    return InteractionGraph(initial_phase=initial_phase, phases=phases)
+
+
+def compile_interaction_schema(
+    interaction_schema: str,
+    participant_names: Sequence[str],
+    chat_model: BaseChatModel,
+    spinner: Optional[Halo] = None,
+    n_tries: int = 3,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> Optional[InteractionGraph]:
+    # Imported here since the parsing utils run their own chats through the conductors package.
+    from chatflock.parsing_utils import string_output_to_pydantic
+
+    output = StructuredString(
+        sections=[
+            Section(
+                name="Instructions",
+                list=[
+                    "Convert the interaction schema into phases, each with a single speaker and the phases allowed "
+                    "to follow it.",
+                    "Speakers must be exact names of the chat participants.",
+                    "Only use an exit condition where moving on requires judgement.",
+                ],
+            ),
+            Section(name="Chat Participants", list=list(participant_names)),
+            Section(name="Interaction Schema", text=interaction_schema),
+        ]
+    )
+
+    graph = string_output_to_pydantic(
+        output=str(output),
+        chat_model=chat_model,
+        output_schema=InteractionGraph,
+        spinner=spinner,
+        n_tries=n_tries,
+        execution_options=execution_options,
+    )
+
+    return normalize_interaction_graph(graph)
+
+
+class StateMachineChatConductor(LangChainBasedAIChatConductor):
+    # Compiles the interaction schema once into a graph of phases and then walks it deterministically. The LLM is only
+    # consulted for transitions that need judgement (an exit condition or several possible next phases), and for
+    # phases whose speaker is not in the chat.
+
+    def __init__(
+        self,
+        chat_model: BaseChatModel,
+        interaction_graph: Optional[InteractionGraph] = None,
+        n_output_parsing_tries: int = 3,
+        **kwargs: Any,
+    ):
+        super().__init__(chat_model=chat_model, **kwargs)
+
+        self.interaction_graph = normalize_interaction_graph(interaction_graph) if interaction_graph else None
+        self.n_output_parsing_tries = n_output_parsing_tries
+
+        self.current_phase: Optional[InteractionPhase] = None
+        self.current_phase_turns = 0
+        self.n_processed_messages = 0
+
+    def prepare_chat(self, chat: "Chat", **kwargs: Any) -> None:
+        super().prepare_chat(chat=chat, **kwargs)
+
+        if self.interaction_graph is None and self.interaction_schema is not None:
+            self.interaction_graph = compile_interaction_schema(
+                interaction_schema=self.interaction_schema,
+                participant_names=[participant.name for participant in chat.get_active_participants()],
+                chat_model=self.chat_model,
+                spinner=self.spinner,
+                n_tries=self.n_output_parsing_tries,
+                execution_options=self.execution_options,
+            )
+
+        self.current_phase = None
+        self.current_phase_turns = 0
+        self.n_processed_messages = 0
+
+    def select_next_speaker_name(self, chat: Chat) -> str:
+        if self.interaction_graph is None:
+            return super().select_next_speaker_name(chat=chat)
+
+        next_speaker_name = pre_select_next_speaker(
+            chat=chat, pre_selectors=self.pre_selectors, stats=self.selection_stats
+        )
+        if next_speaker_name is not None:
+            return next_speaker_name
+
+        next_phase = self.select_next_phase(chat=chat)
+        if next_phase is None:
+            return TERMINATE
+
+        if not chat.has_active_participant_with_name(next_phase.speaker):
+            return self.select_next_speaker_name_with_ai(chat=chat)
+
+        return next_phase.speaker
+
+    def select_next_phase(self, chat: Chat) -> Optional[InteractionPhase]:
+        assert self.interaction_graph is not None
+
+        # Count the turns the current speaker took since the last selection.
+        messages = chat.get_messages()
+        new_messages = messages[self.n_processed_messages :]
+        self.n_processed_messages = len(messages)
+
+        if self.current_phase is None:
+            self.current_phase = self.interaction_graph.get_phase(self.interaction_graph.initial_phase)
+            self.current_phase_turns = 0
+
+        assert self.current_phase is not None
+
+        self.current_phase_turns += sum(
+            1 for message in new_messages if message.sender_name == self.current_phase.speaker
+        )
+
+        if self.current_phase_turns < self.current_phase.max_turns:
+            next_phase: Optional[InteractionPhase] = self.current_phase
+        elif self.current_phase.needs_judgement:
+            next_phase = self.select_next_phase_with_ai(chat=chat, phase=self.current_phase)
+        elif len(self.current_phase.next_phases) == 0:
+            next_phase = None
+        else:
+            next_phase = self.interaction_graph.get_phase(self.current_phase.next_phases[0])
+
+        if self.current_phase_turns < self.current_phase.max_turns or not self.current_phase.needs_judgement:
+            self.selection_stats.pre_selections["InteractionGraph"] = (
+                self.selection_stats.pre_selections.get("InteractionGraph", 0) + 1
+            )
+
+        if next_phase is not self.current_phase:
+            self.current_phase_turns = 0
+
+        self.current_phase = next_phase
+
+        return next_phase
+
+    def select_next_phase_with_ai(self, chat: Chat, phase: InteractionPhase) -> Optional[InteractionPhase]:
+        assert self.interaction_graph is not None
+
+        self.selection_stats.llm_selections += 1
+
+        candidate_phases: Dict[str, InteractionPhase] = {
+            name: next_phase
+            for name, next_phase in ((name, self.interaction_graph.get_phase(name)) for name in phase.next_phases)
+            if next_phase is not None
+        }
+        if phase.exit_condition is not None:
+            candidate_phases[phase.name] = phase
+
+        messages = [
+            SystemMessage(content=self.create_next_phase_system_prompt()),
+            HumanMessage(
+                content=self.create_next_phase_first_human_prompt(
+                    chat=chat, phase=phase, candidate_phases=list(candidate_phases.values())
+                )
+            ),
+        ]
+
+        next_phase_name = self.select_name_with_ai(messages=messages, names=list(candidate_phases.keys()), kind="phase")
+
+        if next_phase_name == TERMINATE:
+            return None
+
+        return candidate_phases[next_phase_name]
+
+    def create_next_phase_system_prompt(self) -> str:
+        system_message = StructuredString(
+            sections=[
+                Section(
+                    name="Mission",
+                    text="Decide which phase of the interaction the conversation should move to next, based on the "
+                    "previous messages and the exit condition of the current phase.",
+                ),
+                Section(
+                    name="Rules",
+                    list=[
+                        "You can only select one of the possible phases.",
+                        "If the current phase is one of the possible phases, select it to stay in it.",
+                        "If the chat should end instead, return the string TERMINATE. For example, when the goal has "
+                        "been achieved or it is impossible to reach.",
+                    ],
+                ),
+                Section(name="Output", text="The name of the next phase. Or, TERMINATE if the chat should end."),
+            ]
+        )
+
+        return str(system_message)
+
+    def create_next_phase_first_human_prompt(
+        self, chat: Chat, phase: InteractionPhase, candidate_phases: Sequence[InteractionPhase]
+    ) -> str:
+        prompt = StructuredString(
+            sections=[
+                Section(name="Goal", text=self.goal or "No explicit goal provided."),
+                Section(
+                    name="Current Phase",
+                    text=f"{phase.name} ({phase.speaker}): {phase.description}",
+                    sub_sections=[Section(name="Exit Condition", text=phase.exit_condition or "None")],
+                ),
+                Section(
+                    name="Possible Phases",
+                    list=[f"{p.name} ({p.speaker}): {p.description}" for p in candidate_phases],
+                ),
+                *self.create_chat_messages_sections(chat=chat),
+            ]
+        )
+
+        return str(prompt)
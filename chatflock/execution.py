@@ -0,0 +1,35 @@
+from typing import Any, Optional
+
+import dataclasses
+
+from chatflock.caches import Cache, ToolResultCache
+from chatflock.concurrency import (
+    AdaptiveRateLimiter,
+    HedgingPolicy,
+    MicroBatchScheduler,
+    RequestPriority,
+    SingleFlight,
+    ToolCallsExecutor,
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class ExecutionOptions:
+    # How chat model and tool calls are executed. Created once and passed as-is to participants, conductors,
+    # composition generators, parsers and web research, so every call a chat makes goes through the same caches and
+    # concurrency controls. All of them are optional and shareable between components.
+    response_cache: Optional[Cache] = None
+    single_flight: Optional[SingleFlight] = None
+    rate_limiter: Optional[AdaptiveRateLimiter] = None
+    rate_limit_priority: RequestPriority = RequestPriority.INTERACTIVE
+    hedging_policy: Optional[HedgingPolicy] = None
+    batch_scheduler: Optional[MicroBatchScheduler] = None
+    tool_executor: Optional[ToolCallsExecutor] = None
+    tool_result_cache: Optional[ToolResultCache] = None
+
+    def replace(self, **changes: Any) -> "ExecutionOptions":
+        # E.g. `options.replace(rate_limit_priority=RequestPriority.BACKGROUND)` for background work.
+        return dataclasses.replace(self, **changes)
+
+
+DEFAULT_EXECUTION_OPTIONS = ExecutionOptions()
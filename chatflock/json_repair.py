@@ -0,0 +1,440 @@
+from typing import Any, Dict, List, Optional
+
+import json
+import re
+
+# Object states
+OBJECT_KEY = 0  # Expecting a key or the end of the object
+OBJECT_COLON = 1  # After a key, expecting a colon
+OBJECT_VALUE = 2  # After a colon, expecting a value
+OBJECT_AFTER_VALUE = 3  # Expecting a comma or the end of the object
+
+# Array states
+ARRAY_VALUE = 4  # Expecting a value or the end of the array
+ARRAY_AFTER_VALUE = 5  # Expecting a comma or the end of the array
+
+WHITESPACE = " \t\r\n"
+
+# What may follow the closing quote of a string. Anything else means the quote is part of the string.
+STRING_END_LOOKAHEAD = 256
+KEY_STRING_END = re.compile(r"\s*(?::|\Z|[,}])")
+OBJECT_VALUE_STRING_END = re.compile(
+    r"""\s*(?:\Z|,\s*(?:\Z|}|"(?:[^"\\\n]|\\.)*"\s*:|'(?:[^'\\\n]|\\.)*'\s*:|[A-Za-z_$][\w$-]*\s*:)|}\s*(?:\Z|[,}\]`])|\n\s*["'])"""
+)
+ARRAY_VALUE_STRING_END = re.compile(r"\s*(?:\Z|,|]\s*(?:\Z|[,}\]`])|\n\s*[\"'])")
+CONTAINER_END = re.compile(r"\s*([}\]])")
+# A closing quote directly followed by the end of a container, per (quote, closing) pair.
+STRING_CONTAINER_END = {
+    (quote, closing): re.compile(re.escape(quote) + r"\s*" + re.escape(closing)) for quote in "\"'" for closing in "}]"
+}
+
+# Runs of characters (and valid escapes) that can be copied as-is into a JSON string.
+DOUBLE_QUOTED_STRING_CHUNK = re.compile(r'(?:[^"\\\x00-\x1f]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})+')
+SINGLE_QUOTED_STRING_CHUNK = re.compile(r"(?:[^'\"\\\x00-\x1f]+|\\[\"\\/bfnrt]|\\u[0-9a-fA-F]{4})+")
+UNQUOTED_KEY = re.compile(r"[^:{}\[\],\"'\r\n]*")
+UNQUOTED_VALUE = re.compile(r"[^,}\]\r\n]*")
+NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+CONTAINER_START = re.compile(r"[{\[]")
+HEX_DIGITS = re.compile(r"[0-9a-fA-F]{4}")
+
+JSON_DECODER = json.JSONDecoder()
+
+LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+CONTROL_CHARACTER_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+class TolerantJSONParser:
+    # A single-pass state machine that turns almost-JSON (as written by LLMs) into valid JSON: unquoted keys and
+    # values, single quotes, unescaped quotes, raw newlines and control characters inside strings, trailing or missing
+    # commas and truncated input. Text before the first object or array and after it ends is ignored.
+    #
+    # Input can be fed in chunks (e.g. while streaming a completion); `snapshot` returns the valid JSON for what was
+    # fed so far, and `finish` closes whatever is still open.
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.pos = 0
+        self.output: List[str] = []
+        self.stack: List[List[Any]] = []  # [closing character, state] per open container
+        self.pending_comma = False
+        self.started = False
+        self.done = False
+
+        self.string_quote: Optional[str] = None
+        self.string_is_key = False
+        self.last_closing_positions: Dict[str, int] = {}
+
+    def feed(self, chunk: str) -> None:
+        # Drop consumed input now and then, so memory stays proportional to the unconsumed part.
+        if self.pos > 0 and self.pos >= len(self.text) // 2:
+            self.text = self.text[self.pos :]
+            self.pos = 0
+
+        self.text += chunk
+        self.process(final=False)
+
+    def finish(self) -> str:
+        self.process(final=True)
+
+        self.output.append(self.closing_suffix())
+        self.stack = []
+        self.string_quote = None
+        self.done = True
+
+        return "".join(self.output)
+
+    def snapshot(self) -> str:
+        return "".join(self.output) + self.closing_suffix()
+
+    def closing_suffix(self) -> str:
+        if not self.started:
+            return ""
+
+        suffix = []
+        states = [state for _, state in self.stack]
+
+        if self.string_quote is not None:
+            suffix.append('"')
+            if len(states) > 0:
+                states[-1] = OBJECT_COLON if self.string_is_key else OBJECT_AFTER_VALUE
+
+        for (closing, _), state in reversed(list(zip(self.stack, states))):
+            if state == OBJECT_COLON:
+                suffix.append(":null")
+            elif state == OBJECT_VALUE:
+                suffix.append("null")
+
+            suffix.append(closing)
+
+        return "".join(suffix)
+
+    def process(self, final: bool) -> None:
+        text = self.text
+        self.last_closing_positions = {}
+
+        while self.pos < len(text) and not self.done:
+            if self.string_quote is not None:
+                if not self.consume_string(final=final):
+                    return
+
+                continue
+
+            c = text[self.pos]
+
+            if not self.started:
+                match = CONTAINER_START.search(text, self.pos)
+                if match is None:
+                    self.pos = len(text)
+                    return
+
+                self.pos = match.end()
+                self.open_container(match.group())
+                self.started = True
+                continue
+
+            if c in WHITESPACE:
+                self.pos += 1
+                continue
+
+            state = self.stack[-1][1]
+
+            if c in "}]":
+                self.close_container()
+                self.pos += 1
+            elif c == ",":
+                if state == OBJECT_VALUE:
+                    # A key without a value.
+                    self.output.append("null")
+                    self.stack[-1][1] = OBJECT_KEY
+                    self.pending_comma = True
+                elif state == OBJECT_AFTER_VALUE:
+                    self.stack[-1][1] = OBJECT_KEY
+                    self.pending_comma = True
+                elif state == ARRAY_AFTER_VALUE:
+                    self.stack[-1][1] = ARRAY_VALUE
+                    self.pending_comma = True
+
+                self.pos += 1
+            elif c == ":":
+                if state == OBJECT_COLON:
+                    self.output.append(":")
+                    self.stack[-1][1] = OBJECT_VALUE
+
+                self.pos += 1
+            elif not self.consume_token(c, final=final):
+                return
+
+    def consume_token(self, c: str, final: bool) -> bool:
+        state = self.stack[-1][1]
+
+        # A missing comma or colon before the token.
+        if state == OBJECT_AFTER_VALUE:
+            state = self.stack[-1][1] = OBJECT_KEY
+            self.pending_comma = True
+        elif state == ARRAY_AFTER_VALUE:
+            state = self.stack[-1][1] = ARRAY_VALUE
+            self.pending_comma = True
+        elif state == OBJECT_COLON:
+            self.output.append(":")
+            state = self.stack[-1][1] = OBJECT_VALUE
+
+        if state == OBJECT_KEY:
+            if c in "\"'":
+                self.emit_pending_comma()
+                self.start_string(c, is_key=True)
+                return True
+
+            match = UNQUOTED_KEY.match(self.text, self.pos)
+            assert match is not None
+
+            if match.end() == len(self.text) and not final:
+                return False
+
+            key = match.group().strip()
+            if len(key) == 0:
+                # Not something a key can start with (e.g. a stray bracket); skip it.
+                self.pos += 1
+                return True
+
+            self.emit_pending_comma()
+            self.output.append(json.dumps(key))
+            self.stack[-1][1] = OBJECT_COLON
+            self.pos = match.end()
+
+            return True
+
+        if c in "{[":
+            self.emit_pending_comma()
+            self.set_after_value()
+            self.open_container(c)
+            self.pos += 1
+        elif c in "\"'":
+            self.emit_pending_comma()
+            self.start_string(c, is_key=False)
+        else:
+            match = UNQUOTED_VALUE.match(self.text, self.pos)
+            assert match is not None
+
+            if match.end() == len(self.text) and not final:
+                return False
+
+            self.emit_pending_comma()
+            self.output.append(self.convert_unquoted_value(match.group().strip()))
+            self.set_after_value()
+            self.pos = match.end()
+
+        return True
+
+    def consume_string(self, final: bool) -> bool:
+        text = self.text
+        chunk_pattern = DOUBLE_QUOTED_STRING_CHUNK if self.string_quote == '"' else SINGLE_QUOTED_STRING_CHUNK
+
+        while True:
+            match = chunk_pattern.match(text, self.pos)
+            if match is not None:
+                self.output.append(match.group())
+                self.pos = match.end()
+
+            if self.pos >= len(text):
+                if final:
+                    self.end_string()
+
+                return final
+
+            c = text[self.pos]
+
+            if c == "\\":
+                if self.pos + 1 >= len(text) and not final:
+                    return False
+
+                escaped = text[self.pos + 1] if self.pos + 1 < len(text) else ""
+                if escaped == "u":
+                    if self.pos + 6 > len(text) and not final:
+                        return False
+
+                    if HEX_DIGITS.fullmatch(text, self.pos + 2, self.pos + 6) is not None:
+                        self.output.append(text[self.pos : self.pos + 6])
+                        self.pos += 6
+                    else:
+                        self.output.append("\\\\")
+                        self.pos += 1
+                elif escaped != "" and escaped in '"\\/bfnrt':
+                    self.output.append(text[self.pos : self.pos + 2])
+                    self.pos += 2
+                elif escaped == "'":
+                    self.output.append("'")
+                    self.pos += 2
+                else:
+                    # Not a valid escape; keep the backslash itself.
+                    self.output.append("\\\\")
+                    self.pos += 1
+            elif c < " ":
+                self.output.append(CONTROL_CHARACTER_ESCAPES.get(c, f"\\u{ord(c):04x}"))
+                self.pos += 1
+            elif c == self.string_quote:
+                # An unescaped quote only ends the string if what follows makes sense after a string.
+                is_string_end = self.is_string_end(self.pos + 1, final=final)
+                if is_string_end is None:
+                    return False
+
+                if is_string_end:
+                    self.pos += 1
+                    self.end_string()
+
+                    return True
+
+                self.output.append('\\"')
+                self.pos += 1
+            else:
+                # A double quote inside a single-quoted string.
+                self.output.append('\\"')
+                self.pos += 1
+
+    def is_string_end(self, pos: int, final: bool) -> Optional[bool]:
+        text = self.text
+
+        closing = self.stack[-1][0]
+
+        if self.string_is_key:
+            pattern = KEY_STRING_END
+        elif closing == "}":
+            pattern = OBJECT_VALUE_STRING_END
+        else:
+            pattern = ARRAY_VALUE_STRING_END
+
+        # While streaming, a match that runs into the end of the input is not conclusive yet.
+        match = pattern.match(text, pos)
+        if match is not None and (final or match.end() < len(text)):
+            return True
+
+        if not final and len(text) - pos < STRING_END_LOOKAHEAD:
+            return None
+
+        if self.string_is_key:
+            return False
+
+        # The top-level container may be followed by arbitrary text (e.g. the rest of a model's response), so there
+        # its end is only trusted if it is the last one in the input that directly follows a quote. Braces in trailing
+        # prose (e.g. "set {x} to 2") are not.
+        match = CONTAINER_END.match(text, pos)
+        if len(self.stack) == 1 and match is not None and match.group(1) == closing:
+            if not final:
+                return None
+
+            assert self.string_quote is not None
+
+            key = self.string_quote + closing
+            last_closing_pos = self.last_closing_positions.get(key)
+            if last_closing_pos is None:
+                last_closing_pos = -1
+                for string_end in STRING_CONTAINER_END[(self.string_quote, closing)].finditer(text):
+                    last_closing_pos = string_end.end() - 1
+
+                self.last_closing_positions[key] = last_closing_pos
+
+            return match.end() - 1 == last_closing_pos
+
+        return False
+
+    def start_string(self, quote: str, is_key: bool) -> None:
+        self.output.append('"')
+        self.string_quote = quote
+        self.string_is_key = is_key
+        self.pos += 1
+
+    def end_string(self) -> None:
+        self.output.append('"')
+        self.string_quote = None
+
+        if self.string_is_key:
+            self.stack[-1][1] = OBJECT_COLON
+        else:
+            self.set_after_value()
+
+    def open_container(self, c: str) -> None:
+        if c == "{":
+            self.output.append("{")
+            self.stack.append(["}", OBJECT_KEY])
+        else:
+            self.output.append("[")
+            self.stack.append(["]", ARRAY_VALUE])
+
+        self.pending_comma = False
+
+    def close_container(self) -> None:
+        closing, state = self.stack.pop()
+
+        if state == OBJECT_COLON:
+            self.output.append(":null")
+        elif state == OBJECT_VALUE:
+            self.output.append("null")
+
+        # Trailing commas are dropped by never emitting them.
+        self.pending_comma = False
+        self.output.append(closing)
+
+        if len(self.stack) == 0:
+            self.done = True
+
+    def set_after_value(self) -> None:
+        self.stack[-1][1] = OBJECT_AFTER_VALUE if self.stack[-1][0] == "}" else ARRAY_AFTER_VALUE
+
+    def emit_pending_comma(self) -> None:
+        if self.pending_comma:
+            self.output.append(",")
+            self.pending_comma = False
+
+    @staticmethod
+    def convert_unquoted_value(value: str) -> str:
+        if value in LITERALS:
+            return LITERALS[value]
+
+        if NUMBER.fullmatch(value) is not None:
+            return value
+
+        return json.dumps(value)
+
+
+def repair_json(text: str) -> str:
+    # Valid JSON (the common case) is validated by the much faster C parser and returned untouched, without any text
+    # around it. Only invalid JSON goes through the (much more lenient) state machine.
+    match = CONTAINER_START.search(text)
+    if match is not None:
+        try:
+            _, end = JSON_DECODER.raw_decode(text, match.start())
+            return text[match.start() : end]
+        except ValueError:
+            pass
+
+    parser = TolerantJSONParser()
+    parser.feed(text)
+
+    return parser.finish()
+
+
+def repair_complete_json(text: str) -> Optional[str]:
+    # Like `repair_json`, but only for text holding a structurally complete object or array followed by nothing but
+    # whitespace. Anything else (trailing prose, truncated input) is ambiguous, so it returns None rather than a guess.
+    match = CONTAINER_START.search(text)
+    if match is None:
+        return None
+
+    try:
+        _, end = JSON_DECODER.raw_decode(text, match.start())
+    except ValueError:
+        pass
+    else:
+        return text[match.start() : end] if text[end:].strip() == "" else None
+
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    parser.process(final=True)
+
+    if not parser.done or parser.text[parser.pos :].strip() != "":
+        return None
+
+    return "".join(parser.output)
+
+
+def loads_tolerant(text: str) -> Any:
+    return json.loads(repair_json(text))
@@ -1,17 +1,28 @@
-from typing import List, Optional, Sequence, Type
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+import re
+from functools import lru_cache
 
 from halo import Halo
 from langchain.chat_models.base import BaseChatModel
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, create_model
 
+from chatflock.ai_utils import execute_chat_model_function_call, pydantic_to_openai_function
 from chatflock.backing_stores import InMemoryChatDataBackingStore
 from chatflock.base import Chat, ChatMessage, TOutputSchema
 from chatflock.conductors import RoundRobinChatConductor
 from chatflock.errors import MessageCouldNotBeParsedError
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.json_repair import repair_complete_json
 from chatflock.participants.langchain import LangChainBasedAIChatParticipant
 from chatflock.participants.output_parser import JSONOutputParserChatParticipant
 from chatflock.renderers import NoChatRenderer
-from chatflock.structured_string import Section
-from chatflock.utils import pydantic_to_json_schema
+from chatflock.schemas import default_schema_registry
+from chatflock.structured_string import Section, StructuredString
+from chatflock.utils import json_string_to_pydantic
+
+CLOSING_CODE_FENCE = re.compile(r"\s*```\s*$")
 
 
 def string_output_to_pydantic(
@@ -21,6 +32,8 @@ def string_output_to_pydantic(
     spinner: Optional[Halo] = None,
     n_tries: int = 3,
     hide_message: bool = True,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+    use_fast_path: bool = True,
 ) -> TOutputSchema:
     return chat_messages_to_pydantic(
         chat_messages=[ChatMessage(id=1, sender_name="Unknown", content=output)],
@@ -29,9 +42,72 @@ def string_output_to_pydantic(
         spinner=spinner,
         n_tries=n_tries,
         hide_message=hide_message,
+        execution_options=execution_options,
+        use_fast_path=use_fast_path,
     )
 
 
+def strings_output_to_pydantic(
+    outputs: Sequence[str],
+    chat_model: BaseChatModel,
+    output_schema: Type[TOutputSchema],
+    spinner: Optional[Halo] = None,
+    n_tries: int = 3,
+    batch_size: int = 10,
+    hide_message: bool = True,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> List[TOutputSchema]:
+    # Parses many outputs with the same schema: outputs that already contain valid JSON are parsed locally, and the
+    # rest are extracted `batch_size` at a time in a single function call each. Only the items that failed validation
+    # are retried, and whatever is left after `n_tries` falls back to `string_output_to_pydantic` one by one.
+    results: Dict[int, TOutputSchema] = {}
+
+    for i, output in enumerate(outputs):
+        parsed_output = local_chat_messages_to_pydantic(
+            chat_messages=[ChatMessage(id=1, sender_name="Unknown", content=output)], output_schema=output_schema
+        )
+        if parsed_output is not None:
+            results[i] = parsed_output
+
+    batch_size = max(1, batch_size)
+    for _ in range(n_tries):
+        pending = [i for i in range(len(outputs)) if i not in results]
+        if len(pending) == 0:
+            break
+
+        try:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start : start + batch_size]
+
+                batch_results = function_call_strings_to_pydantic(
+                    outputs=[outputs[i] for i in batch],
+                    chat_model=chat_model,
+                    output_schema=output_schema,
+                    execution_options=execution_options,
+                )
+                results.update({batch[j]: result for j, result in batch_results.items()})
+        except Exception:
+            # E.g. the chat model does not support function calling.
+            break
+
+    for i, output in enumerate(outputs):
+        if i in results:
+            continue
+
+        results[i] = string_output_to_pydantic(
+            output=output,
+            chat_model=chat_model,
+            output_schema=output_schema,
+            spinner=spinner,
+            n_tries=n_tries,
+            hide_message=hide_message,
+            execution_options=execution_options,
+            use_fast_path=False,
+        )
+
+    return [results[i] for i in range(len(outputs))]
+
+
 def chat_messages_to_pydantic(
     chat_messages: Sequence[ChatMessage],
     chat_model: BaseChatModel,
@@ -39,7 +115,27 @@ def chat_messages_to_pydantic(
     spinner: Optional[Halo] = None,
     n_tries: int = 3,
     hide_message: bool = True,
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+    use_fast_path: bool = True,
 ) -> TOutputSchema:
+    chat_messages = remove_termination_from_last_message(chat_messages)
+
+    if use_fast_path:
+        # Try to parse JSON already present in the output, then a single function call, before resorting to the
+        # (multiple round trip) converter sub-chat.
+        output = local_chat_messages_to_pydantic(chat_messages=chat_messages, output_schema=output_schema)
+        if output is not None:
+            return output
+
+        output = function_call_chat_messages_to_pydantic(
+            chat_messages=chat_messages,
+            chat_model=chat_model,
+            output_schema=output_schema,
+            execution_options=execution_options,
+        )
+        if output is not None:
+            return output
+
     text_to_json_ai = LangChainBasedAIChatParticipant(
         chat_model=chat_model,
         name="Jason",
@@ -48,12 +144,34 @@ def chat_messages_to_pydantic(
         personal_mission="Your only purpose is to convert the previous chat messages (usually the last one)"
         "to a valid and logical JSON that follows the JSON SCHEMA provided. Your message should "
         "include only correct JSON. No fluff.",
-        other_prompt_sections=[Section(name="JSON SCHEMA", text=str(pydantic_to_json_schema(output_schema)))],
+        other_prompt_sections=[
+            Section(name="JSON SCHEMA", text=default_schema_registry.get_prompt_text(output_schema))
+        ],
         ignore_group_chat_environment=True,
+        include_current_time_in_prompt=False,
         spinner=spinner,
+        execution_options=execution_options,
     )
     json_parser = JSONOutputParserChatParticipant(output_schema=output_schema)
 
+    parser_chat = Chat(
+        backing_store=InMemoryChatDataBackingStore(messages=list(chat_messages)),
+        renderer=NoChatRenderer(),
+        initial_participants=[text_to_json_ai, json_parser],
+        hide_messages=hide_message,
+        max_total_messages=len(chat_messages) + 1 + (n_tries - 1) * 2,
+    )
+    conductor = RoundRobinChatConductor()
+
+    _ = conductor.initiate_dialog(chat=parser_chat)
+
+    if json_parser.output is None:
+        raise MessageCouldNotBeParsedError("An output could not be parsed from the chat messages.")
+
+    return json_parser.output
+
+
+def remove_termination_from_last_message(chat_messages: Sequence[ChatMessage]) -> Sequence[ChatMessage]:
     # Remove TERMINATE if present so the chat conductor doesn't end the chat prematurely
     if len(chat_messages) > 0:
         chat_messages = list(chat_messages).copy()
@@ -70,18 +188,151 @@ def chat_messages_to_pydantic(
         except ValueError:
             pass
 
-    parser_chat = Chat(
-        backing_store=InMemoryChatDataBackingStore(messages=list(chat_messages)),
-        renderer=NoChatRenderer(),
-        initial_participants=[text_to_json_ai, json_parser],
-        hide_messages=hide_message,
-        max_total_messages=len(chat_messages) + 1 + (n_tries - 1) * 2,
+    return chat_messages
+
+
+def local_chat_messages_to_pydantic(
+    chat_messages: Sequence[ChatMessage], output_schema: Type[TOutputSchema]
+) -> Optional[TOutputSchema]:
+    if len(chat_messages) == 0:
+        return None
+
+    content = chat_messages[-1].content
+    start = content.find("{")
+    if start == -1:
+        return None
+
+    # Only an output that ends with the JSON (and possibly its closing code fence) is parsed locally. Text after it
+    # could have been misread as part of the JSON, so it is left to the chat model.
+    json_string = repair_complete_json(CLOSING_CODE_FENCE.sub("", content[start:]))
+    if json_string is None:
+        return None
+
+    try:
+        return json_string_to_pydantic(json_string, output_schema)  # type: ignore
+    except Exception:
+        return None
+
+
+def function_call_chat_messages_to_pydantic(
+    chat_messages: Sequence[ChatMessage],
+    chat_model: BaseChatModel,
+    output_schema: Type[TOutputSchema],
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> Optional[TOutputSchema]:
+    if len(chat_messages) == 0:
+        return None
+
+    system_message = StructuredString(
+        sections=[
+            Section(
+                name="Mission",
+                text="Convert the chat messages (usually the last one) into the arguments of the given function, "
+                "logically and without making up information.",
+            )
+        ]
+    )
+    prompt = StructuredString(
+        sections=[
+            Section(
+                name="Chat Messages",
+                list=[f"{message.sender_name}: {message.content}" for message in chat_messages],
+            )
+        ]
     )
-    conductor = RoundRobinChatConductor()
 
-    _ = conductor.initiate_dialog(chat=parser_chat)
+    try:
+        arguments, content = execute_chat_model_function_call(
+            chat_model=chat_model,
+            messages=[SystemMessage(content=str(system_message)), HumanMessage(content=str(prompt))],
+            function=pydantic_to_openai_function(output_schema, function_name="output"),
+            execution_options=execution_options,
+        )
+    except Exception:
+        # E.g. the chat model does not support function calling.
+        return None
 
-    if json_parser.output is None:
-        raise MessageCouldNotBeParsedError("An output could not be parsed from the chat messages.")
+    # The model may have answered with plain JSON content instead of calling the function.
+    if arguments is None:
+        return local_chat_messages_to_pydantic(
+            chat_messages=[ChatMessage(id=1, sender_name="Unknown", content=content)], output_schema=output_schema
+        )
 
-    return json_parser.output
+    try:
+        return default_schema_registry.get_artifacts(output_schema).validate_python(arguments)  # type: ignore
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=128)
+def create_batch_output_schema(output_schema: Type[BaseModel]) -> Type[BaseModel]:
+    item_schema = create_model(
+        "BatchOutputItem",
+        index=(int, Field(description="The index of the text the output was extracted from.")),
+        output=(output_schema, Field(description="The output extracted from the text.")),
+    )
+
+    return create_model(
+        "BatchOutput",
+        __doc__="The outputs extracted from each of the given texts.",
+        items=(List[item_schema], Field(description="One output per text.")),  # type: ignore
+    )
+
+
+def function_call_strings_to_pydantic(
+    outputs: Sequence[str],
+    chat_model: BaseChatModel,
+    output_schema: Type[TOutputSchema],
+    execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+) -> Dict[int, TOutputSchema]:
+    # Returns the valid outputs by their index in `outputs`; invalid or missing items are left out.
+    system_message = StructuredString(
+        sections=[
+            Section(
+                name="Mission",
+                text="Convert each of the given texts into an output, logically and without making up information. "
+                "Return exactly one output per text, with the index of the text it was extracted from.",
+            )
+        ]
+    )
+    prompt = StructuredString(
+        sections=[
+            Section(
+                name="Texts",
+                sub_sections=[
+                    Section(name=f"Text {i}", text=f"```{output}```", uppercase_name=False)
+                    for i, output in enumerate(outputs)
+                ],
+            )
+        ]
+    )
+
+    arguments, _ = execute_chat_model_function_call(
+        chat_model=chat_model,
+        messages=[SystemMessage(content=str(system_message)), HumanMessage(content=str(prompt))],
+        function=pydantic_to_openai_function(create_batch_output_schema(output_schema), function_name="outputs"),
+        execution_options=execution_options,
+    )
+
+    items: Any = (arguments or {}).get("items")
+    if not isinstance(items, list):
+        return {}
+
+    validate = default_schema_registry.get_artifacts(output_schema).validate_python
+
+    results: Dict[int, TOutputSchema] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        index = item.get("index")
+        if not isinstance(index, int) or not 0 <= index < len(outputs) or index in results:
+            continue
+
+        # Each item is validated on its own, so a single invalid item does not fail the whole batch.
+        try:
+            results[index] = validate(item.get("output"))  # type: ignore
+        except Exception:
+            continue
+
+    return results
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from datetime import datetime
 
@@ -9,7 +9,8 @@ from langchain.tools import BaseTool
 
 from chatflock.ai_utils import execute_chat_model_messages
 from chatflock.base import ActiveChatParticipant, Chat, ChatMessage
-from chatflock.structured_string import Section, StructuredString
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.structured_string import Section, StructuredString, Truncation
 
 
 class LangChainBasedAIChatParticipant(ActiveChatParticipant):
@@ -30,6 +31,9 @@ class LangChainBasedAIChatParticipant(ActiveChatParticipant):
         spinner: Optional[Halo] = None,
         ignore_group_chat_environment: bool = False,
         include_timestamp_in_messages: bool = False,
+        include_current_time_in_prompt: bool = True,
+        execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+        max_system_prompt_tokens: Optional[int] = None,
         **kwargs: Any,
     ):
         super().__init__(name=name, symbol=symbol, **kwargs)
@@ -40,32 +44,28 @@ class LangChainBasedAIChatParticipant(ActiveChatParticipant):
         self.other_prompt_sections = other_prompt_sections or []
         self.ignore_group_chat_environment = ignore_group_chat_environment
         self.include_timestamp_in_messages = include_timestamp_in_messages
+        self.include_current_time_in_prompt = include_current_time_in_prompt
+        self.execution_options = execution_options
+        self.max_system_prompt_tokens = max_system_prompt_tokens
         self.retriever = retriever
         self.tools = tools
         self.spinner = spinner
         self.personal_mission = personal_mission
 
-    def create_system_message(self, chat: "Chat", relevant_docs: Sequence[Document]) -> str:
-        now = datetime.now()
-        pretty_datetime = now.strftime("%m-%d-%Y %H:%M:%S")
-
-        base_sections = [
-            Section(name="Current Time", text=pretty_datetime),
-            Section(name="Name", text=self.name),
-            Section(name="Role", text=self.role),
-            Section(name="Personal Mission", text=self.personal_mission),
-            Section(
-                name="Additional Context for Response",
-                text="None"
-                if len(relevant_docs) == 0
-                else "The following documents may be relevant for your response, only use "
-                "them for context for a better response, if applicable",
-                sub_sections=[
-                    Section(name=f"Document {i + 1}", text=f"```{doc.page_content}```")
-                    for i, doc in enumerate(relevant_docs)
-                ],
-            ),
-            Section(
+        self.static_prompt_sections: Optional[Tuple[Tuple[Any, ...], Dict[str, Section]]] = None
+
+    def get_static_prompt_sections(self) -> Dict[str, Section]:
+        # Sections that only depend on the participant itself. They are built once and reused every turn, so their
+        # rendered text is cached by the sections; only the sections that depend on the chat are built per turn.
+        key = (self.name, self.role, self.personal_mission, self.include_timestamp_in_messages)
+        if self.static_prompt_sections is not None and self.static_prompt_sections[0] == key:
+            return self.static_prompt_sections[1]
+
+        sections = {
+            "Name": Section(name="Name", text=self.name),
+            "Role": Section(name="Role", text=self.role),
+            "Personal Mission": Section(name="Personal Mission", text=self.personal_mission),
+            "Response Message Format": Section(
                 name="Response Message Format",
                 list=[
                     "Your response should be the message you want to send to the group chat as your own name, "
@@ -88,11 +88,95 @@ class LangChainBasedAIChatParticipant(ActiveChatParticipant):
                     ),
                 ],
             ),
+            "Guidelines": Section(
+                name="Guidelines",
+                list=[
+                    "Your personal mission is the most important thing to you. You should always prioritize it.",
+                    "If a chat goal is provided, you should still follow your personal mission but "
+                    "in a way that helps the group achieve the chat goal.",
+                    "If you are the only participant in the chat, you should act as if the chat is now "
+                    "a scratch pad for you to write down your thoughts, ideas, and work on your "
+                    "mission by yourself. "
+                    "In the messages do not refer to another entity, but rather to yourself "
+                    "(I instead of You); the messages should read and sound like "
+                    "your internal thoughts and should be succinct, unless they are concrete work "
+                    "(for example, implementing something, calculating things, etc.). "
+                    "You have all the time in the world to build your thoughts, ideas, and do the "
+                    "work needed. The chat is now your place to think and iterate on your mission and "
+                    " achieve it.",
+                ],
+            ),
+            "Rules": Section(
+                name="Rules",
+                list=[
+                    "You do not have to respond directly to the one who sent you a message. You can respond "
+                    "to anyone in the group chat.",
+                    "You cannot have private conversations with other participants. Everyone can see all "
+                    "messages sent by all other participants.",
+                ],
+            ),
+            "Previous Chat Messages": Section(
+                name="Previous Chat Messages",
+                list=[
+                    "Messages are prefixed by a timestamp and the sender's name (could also be everyone). ",
+                    "The prefix is for context only; it's not actually part of the message they sent. ",
+                    (
+                        'Example: "[TIMESTAMP] John: Hello, how are you?"'
+                        if self.include_timestamp_in_messages
+                        else 'Example: "John: Hello, how are you?"'
+                    ),
+                    "Some messages could have been sent by participants who are no longer a part of this "
+                    "conversation. Use their contents for context only; do not talk to them.",
+                    "In your response only include the message without the prefix.",
+                    "If you are the only participant in the chat, the previous chat messages are your "
+                    " memories or internal thoughts instead.",
+                ],
+            ),
+        }
+        self.static_prompt_sections = (key, sections)
+
+        return sections
+
+    def create_system_message(self, chat: "Chat", relevant_docs: Sequence[Document]) -> str:
+        static_sections = self.get_static_prompt_sections()
+        base_sections = []
+
+        # The current time changes on every call, which makes the prompt (and thus its response) uncacheable.
+        if self.include_current_time_in_prompt:
+            now = datetime.now()
+            pretty_datetime = now.strftime("%m-%d-%Y %H:%M:%S")
+
+            base_sections.append(Section(name="Current Time", text=pretty_datetime))
+
+        base_sections += [
+            static_sections["Name"],
+            static_sections["Role"],
+            static_sections["Personal Mission"],
+            Section(
+                name="Additional Context for Response",
+                text="None"
+                if len(relevant_docs) == 0
+                else "The following documents may be relevant for your response, only use "
+                "them for context for a better response, if applicable",
+                # Over the prompt budget, the least relevant documents are trimmed first.
+                sub_sections=[
+                    Section(
+                        name=f"Document {i + 1}",
+                        text=f"```{doc.page_content}```",
+                        priority=-i,
+                        truncation=Truncation.HEAD,
+                    )
+                    for i, doc in enumerate(relevant_docs)
+                ],
+            ),
+            static_sections["Response Message Format"],
         ]
 
         active_participants = chat.get_active_participants()
         if self.ignore_group_chat_environment:
-            system_message = StructuredString(sections=[*base_sections, *self.other_prompt_sections])
+            system_message = StructuredString(
+                sections=[*base_sections, *self.other_prompt_sections], max_tokens=self.max_system_prompt_tokens
+            )
         else:
             system_message = StructuredString(
                 sections=[
@@ -110,55 +194,14 @@ class LangChainBasedAIChatParticipant(ActiveChatParticipant):
                                     ]
                                 ),
                             ),
-                            Section(
-                                name="Guidelines",
-                                list=[
-                                    "Your personal mission is the most important thing to you. You should always "
-                                    "prioritize it.",
-                                    "If a chat goal is provided, you should still follow your personal mission but "
-                                    "in a way that helps the group achieve the chat goal.",
-                                    "If you are the only participant in the chat, you should act as if the chat is now "
-                                    "a scratch pad for you to write down your thoughts, ideas, and work on your "
-                                    "mission by yourself. "
-                                    "In the messages do not refer to another entity, but rather to yourself "
-                                    "(I instead of You); the messages should read and sound like "
-                                    "your internal thoughts and should be succinct, unless they are concrete work "
-                                    "(for example, implementing something, calculating things, etc.). "
-                                    "You have all the time in the world to build your thoughts, ideas, and do the "
-                                    "work needed. The chat is now your place to think and iterate on your mission and "
-                                    " achieve it.",
-                                ],
-                            ),
-                            Section(
-                                name="Rules",
-                                list=[
-                                    "You do not have to respond directly to the one who sent you a message. You can respond "
-                                    "to anyone in the group chat.",
-                                    "You cannot have private conversations with other participants. Everyone can see all "
-                                    "messages sent by all other participants.",
-                                ],
-                            ),
-                            Section(
-                                name="Previous Chat Messages",
-                                list=[
-                                    "Messages are prefixed by a timestamp and the sender's name (could also be everyone). ",
-                                    "The prefix is for context only; it's not actually part of the message they sent. ",
-                                    (
-                                        'Example: "[TIMESTAMP] John: Hello, how are you?"'
-                                        if self.include_timestamp_in_messages
-                                        else 'Example: "John: Hello, how are you?"'
-                                    ),
-                                    "Some messages could have been sent by participants who are no longer a part of this "
-                                    "conversation. Use their contents for context only; do not talk to them.",
-                                    "In your response only include the message without the prefix.",
-                                    "If you are the only participant in the chat, the previous chat messages are your "
-                                    " memories or internal thoughts instead.",
-                                ],
-                            ),
+                            static_sections["Guidelines"],
+                            static_sections["Rules"],
+                            static_sections["Previous Chat Messages"],
                         ],
                     ),
                     *self.other_prompt_sections,
-                ]
+                ],
+                max_tokens=self.max_system_prompt_tokens,
             )
 
         return str(system_message)
@@ -233,6 +276,7 @@ class LangChainBasedAIChatParticipant(ActiveChatParticipant):
             tools=self.tools,
             spinner=self.spinner,
             chat_model_args=self.chat_model_args,
+            execution_options=self.execution_options,
         )
 
     def __str__(self) -> str:
@@ -0,0 +1,137 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Type
+
+import dataclasses
+import threading
+from collections import OrderedDict
+
+from langchain.tools import BaseTool
+from langchain.tools.render import format_tool_to_openai_function
+from pydantic import BaseModel
+
+from chatflock.caches import CacheStats
+
+
+@dataclasses.dataclass(frozen=True)
+class SchemaArtifacts:
+    json_schema: Dict[str, Any]
+    # The schema as it is rendered into prompts.
+    prompt_text: str
+    validate_json: Callable[[str], BaseModel]
+    validate_python: Callable[[Any], BaseModel]
+
+
+class SchemaRegistry:
+    # Computes the artifacts derived from an output schema or a tool (JSON schema, prompt text, OpenAI function spec
+    # and validators) once per type, so preparing them on the hot path is a dictionary lookup. Returned artifacts are
+    # shared between callers and must be treated as read-only.
+
+    def __init__(self, max_entries: Optional[int] = 1024):
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("Max entries must be None or greater than 0.")
+
+        self.max_entries = max_entries
+
+        # Ordered from least to most recently used, so dynamically created models do not accumulate forever.
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats.record(hit=True)
+
+                return self.entries[key]
+
+        self.stats.record(hit=False)
+
+        # Computed outside the lock; a concurrent duplicate computation yields an equal value.
+        value = create()
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            if self.max_entries is not None:
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        return value
+
+    def get_artifacts(self, pydantic_model: Type[BaseModel]) -> SchemaArtifacts:
+        return self.get_or_create(("artifacts", pydantic_model), lambda: create_schema_artifacts(pydantic_model))  # type: ignore
+
+    def get_json_schema(self, pydantic_model: Type[BaseModel]) -> Dict[str, Any]:
+        return self.get_artifacts(pydantic_model).json_schema
+
+    def get_prompt_text(self, pydantic_model: Type[BaseModel]) -> str:
+        return self.get_artifacts(pydantic_model).prompt_text
+
+    def get_openai_function(
+        self,
+        pydantic_model: Type[BaseModel],
+        function_name: Optional[str] = None,
+        function_description: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        def create() -> Dict[str, Any]:
+            parameters = dict(self.get_json_schema(pydantic_model))
+            parameters.pop("title", None)
+            parameters.pop("description", None)
+
+            description = function_description if function_description is not None else (pydantic_model.__doc__ or "")
+
+            return {
+                "name": function_name or pydantic_model.__name__,
+                "description": description,
+                "parameters": parameters,
+            }
+
+        return self.get_or_create(("function", pydantic_model, function_name, function_description), create)  # type: ignore
+
+    def get_tool_openai_function(self, tool: BaseTool) -> Dict[str, Any]:
+        # The rendered function only depends on these, so equivalent tool instances share an entry.
+        key = ("tool_function", tool.name, tool.description, tool.args_schema)
+
+        return self.get_or_create(key, lambda: dict(format_tool_to_openai_function(tool)))  # type: ignore
+
+    def get_tool_openai_tool(self, tool: BaseTool) -> Dict[str, Any]:
+        key = ("tool", tool.name, tool.description, tool.args_schema)
+
+        return self.get_or_create(  # type: ignore
+            key, lambda: {"type": "function", "function": self.get_tool_openai_function(tool)}
+        )
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+        self.stats.reset()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def create_schema_artifacts(pydantic_model: Type[BaseModel]) -> SchemaArtifacts:
+    json_schema: Dict[str, Any]
+    validate_json: Callable[[str], BaseModel]
+    validate_python: Callable[[Any], BaseModel]
+
+    if hasattr(pydantic_model, "model_json_schema"):
+        json_schema = pydantic_model.model_json_schema()
+        validate_json = pydantic_model.model_validate_json
+        validate_python = pydantic_model.model_validate
+    else:
+        json_schema = pydantic_model.schema()
+        validate_json = pydantic_model.parse_raw
+        validate_python = pydantic_model.parse_obj
+
+    return SchemaArtifacts(
+        json_schema=json_schema,
+        prompt_text=str(json_schema),
+        validate_json=validate_json,
+        validate_python=validate_python,
+    )
+
+
+default_schema_registry = SchemaRegistry()
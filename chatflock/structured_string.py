@@ -1,6 +1,25 @@
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import dataclasses
+from enum import Enum
+
+# Gets the text of a section (without its heading) and a token budget, returns a shorter text.
+Summarizer = Callable[[str, int], str]
+TokenCounter = Callable[[str], int]
+
+
+class Truncation(Enum):
+    # How a section is shortened when a structured string is rendered over its token budget.
+    DROP = "drop"
+    # Keep the beginning (head) or the end (tail) of the section.
+    HEAD = "head"
+    TAIL = "tail"
+    SUMMARIZE = "summarize"
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough approximation of ~4 characters per token.
+    return len(text) // 4 + 1
 
 
 @dataclasses.dataclass
@@ -11,41 +30,137 @@ class Section:
     sub_sections: Optional[List["Section"]] = None
     list_item_prefix: Optional[str] = "-"
     uppercase_name: bool = True
+    # Sections without a priority are always rendered in full. Over budget, the lowest priorities are trimmed first.
+    priority: Optional[int] = None
+    truncation: Truncation = Truncation.DROP
+    summarizer: Optional[Summarizer] = None
+
+    def __post_init__(self) -> None:
+        if self.truncation == Truncation.SUMMARIZE and self.summarizer is None:
+            raise ValueError("A summarizer is required to summarize a section.")
+
+        # Sections are rendered every turn but rarely change. The rendered text is cached per level and reused until
+        # the section or one of its sub-sections changes, either by assignment or by in-place mutation of its lists.
+        self._state: Optional[Tuple[Any, ...]] = None
+        self._version = 0
+        self._rendered: Dict[int, Tuple[int, str]] = {}
+
+    def refresh(self) -> int:
+        # Returns a version that changes whenever the rendered text of this section (or any sub-section) may change.
+        # Unchanged sub-trees are only compared, never re-rendered, so a mutation only re-renders its ancestors.
+        sub_sections = tuple(self.sub_sections) if self.sub_sections is not None else None
+
+        state = (
+            self.name,
+            self.text,
+            tuple(self.list) if self.list is not None else None,
+            sub_sections,
+            tuple(sub_section.refresh() for sub_section in sub_sections) if sub_sections is not None else None,
+            self.list_item_prefix,
+            self.uppercase_name,
+        )
+        if state != self._state:
+            self._state = state
+            self._version += 1
+
+        return self._version
 
     def to_text(self, level: int = 0) -> str:
-        result = f'{"#" * (level + 1)} {self.name.upper() if self.uppercase_name else self.name}'
+        self.refresh()
+
+        return self.render(level)
+
+    def render(self, level: int) -> str:
+        # Assumes the section was refreshed.
+        rendered = self._rendered.get(level)
+        if rendered is not None and rendered[0] == self._version:
+            return rendered[1]
+
+        text = self.render_with(
+            level, sub_section_texts=[sub_section.render(level + 1) for sub_section in self.sub_sections or []]
+        )
+        self._rendered[level] = (self._version, text)
+
+        return text
+
+    def render_heading(self, level: int) -> str:
+        return f'{"#" * (level + 1)} {self.name.upper() if self.uppercase_name else self.name}'
+
+    def render_with(self, level: int, sub_section_texts: List[str]) -> str:
+        parts = [self.render_heading(level)]
 
         if self.text is not None:
-            result += "\n" + self.text
+            parts.append(self.text)
 
         if self.list is not None:
-            result += "\n" + "\n".join(
-                [
-                    f'{self.list_item_prefix if self.list_item_prefix else str(i + 1) + "."} {item}'
-                    for i, item in enumerate(self.list)
-                ]
+            parts.append(
+                "\n".join(
+                    [
+                        f'{self.list_item_prefix if self.list_item_prefix else str(i + 1) + "."} {item}'
+                        for i, item in enumerate(self.list)
+                    ]
+                )
             )
 
-        if self.sub_sections is not None:
-            for sub_section in self.sub_sections:
-                result += "\n\n" + sub_section.to_text(level + 1)
+        return "\n\n".join(["\n".join(parts), *sub_section_texts])
+
+    def truncate(self, text: str, level: int, max_tokens: int, count_tokens: TokenCounter) -> Optional[str]:
+        # Shortens the rendered text of this section to about `max_tokens`, or returns None to drop it.
+        heading = self.render_heading(level)
+        body = text[len(heading) + 1 :]
+
+        body_tokens = count_tokens(body)
+        max_body_tokens = max_tokens - count_tokens(heading)
+        if self.truncation == Truncation.DROP or max_body_tokens <= 0 or body_tokens == 0:
+            return None
+
+        if self.truncation == Truncation.SUMMARIZE:
+            assert self.summarizer is not None
 
-        return result
+            return f"{heading}\n{self.summarizer(body, max_body_tokens)}"
+
+        # Token counts are roughly proportional to the length of the text.
+        n_chars = max(0, len(body) * max_body_tokens // body_tokens - len("... (truncated)") - 1)
+        if self.truncation == Truncation.HEAD:
+            return f"{heading}\n{body[:n_chars].rstrip()}\n... (truncated)"
+
+        return f"{heading}\n(truncated) ...\n{body[len(body) - n_chars:].lstrip()}"
 
 
 @dataclasses.dataclass
 class StructuredString:
     sections: List[Section]
+    # Over budget, sections with a priority are trimmed (lowest priority first) until the text fits.
+    max_tokens: Optional[int] = None
+    count_tokens: TokenCounter = estimate_tokens
+
+    def __post_init__(self) -> None:
+        self._indexed_names: Optional[Tuple[str, ...]] = None
+        self._index: Dict[str, int] = {}
+        self._state: Optional[Tuple[Any, ...]] = None
+        self._rendered = ""
+
+    def index_of(self, name: str) -> Optional[int]:
+        # The index of the first section with the given name. Rebuilt only when the section names change.
+        names = tuple(section.name for section in self.sections)
+        if names != self._indexed_names:
+            self._index = {}
+            for i, section_name in enumerate(names):
+                self._index.setdefault(section_name, i)
+
+            self._indexed_names = names
+
+        return self._index.get(name)
 
     def __getitem__(self, item: str) -> Section:
         if not isinstance(item, str):
             raise TypeError(f"Item must be of type str, not {type(item)}.")
 
-        relevant_sections = [section for section in self.sections if section.name == item]
-        if len(relevant_sections) == 0:
+        index = self.index_of(item)
+        if index is None:
             raise KeyError(f"No section with name {item} exists.")
 
-        return relevant_sections[0]
+        return self.sections[index]
 
     def __setitem__(self, key: str, value: Section) -> None:
         if not isinstance(key, str):
@@ -54,21 +169,105 @@ class StructuredString:
         if not isinstance(value, Section):
             raise TypeError(f"Value must be of type Section, not {type(value)}.")
 
-        try:
-            section = self[key]
-
-            # Remove old section and replace with new one, in the same place
-            self.sections.insert(self.sections.index(section), value)
-            self.sections.remove(section)
-        except KeyError:
+        # Replace the old section with the new one, in the same place
+        index = self.index_of(key)
+        if index is not None:
+            self.sections[index] = value
+        else:
             self.sections.append(value)
 
     def __str__(self) -> str:
-        result = ""
+        sections = tuple(self.sections)
+        state = (sections, tuple(section.refresh() for section in sections))
+
+        if state != self._state:
+            self._rendered = "".join([section.render(0) + "\n\n" for section in sections])
+            self._state = state
+
+        if self.max_tokens is not None and self.count_tokens(self._rendered) > self.max_tokens:
+            return self.render_within_budget(max_tokens=self.max_tokens)
+
+        return self._rendered
+
+    def render_within_budget(self, max_tokens: int) -> str:
+        # Assumes the sections were refreshed. Trimmed sections are overridden with their new text (or None when
+        # dropped), and only their ancestors are rendered again.
+        candidates: List[Tuple[Section, int, List[Section]]] = []
+
+        def collect(section: Section, level: int, ancestors: List[Section]) -> None:
+            if section.priority is not None:
+                candidates.append((section, level, ancestors))
+
+            for sub_section in section.sub_sections or []:
+                collect(sub_section, level + 1, [*ancestors, section])
+
         for section in self.sections:
-            result += section.to_text() + "\n\n"
+            collect(section, 0, [])
+
+        # The lowest priorities first, and the largest sections first among equal priorities, to trim as few as possible.
+        candidates.sort(key=lambda candidate: (candidate[0].priority, -len(candidate[0].render(candidate[1]))))
+
+        overrides: Dict[int, Optional[str]] = {}
+        affected: Set[int] = set()
+
+        def render(section: Section, level: int) -> Optional[str]:
+            if id(section) in overrides:
+                return overrides[id(section)]
+
+            if id(section) not in affected:
+                return section.render(level)
+
+            sub_section_texts = [render(sub_section, level + 1) for sub_section in section.sub_sections or []]
+
+            return section.render_with(
+                level, sub_section_texts=[text for text in sub_section_texts if text is not None]
+            )
+
+        def render_all() -> str:
+            texts = [render(section, 0) for section in self.sections]
+
+            return "".join([text + "\n\n" for text in texts if text is not None])
+
+        text = self._rendered
+        n_tokens = self.count_tokens(text)
+
+        remaining_candidates = iter(candidates)
+        while n_tokens > max_tokens:
+            # The token count is updated incrementally while trimming, and recounted once the estimate fits.
+            estimated_n_tokens = n_tokens
+            for section, level, ancestors in remaining_candidates:
+                # Already removed (or shortened) as part of an ancestor.
+                if any(id(ancestor) in overrides for ancestor in ancestors):
+                    continue
+
+                section_text = render(section, level)
+                if section_text is None:
+                    continue
+
+                section_n_tokens = self.count_tokens(section_text)
+                new_section_text = section.truncate(
+                    section_text,
+                    level=level,
+                    max_tokens=section_n_tokens - (estimated_n_tokens - max_tokens),
+                    count_tokens=self.count_tokens,
+                )
+                overrides[id(section)] = new_section_text
+                affected.update(id(ancestor) for ancestor in ancestors)
+
+                estimated_n_tokens -= section_n_tokens
+                if new_section_text is not None:
+                    estimated_n_tokens += self.count_tokens(new_section_text)
+
+                if estimated_n_tokens <= max_tokens:
+                    break
+            else:
+                # Nothing left to trim; the must-keep sections alone are over budget.
+                return render_all()
+
+            text = render_all()
+            n_tokens = self.count_tokens(text)
 
-        return result
+        return text
 
     def __repr__(self) -> str:
         return self.__str__()
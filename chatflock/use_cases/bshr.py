@@ -23,7 +23,7 @@ from chatflock.participants.langchain import LangChainBasedAIChatParticipant
 from chatflock.participants.user import UserChatParticipant
 from chatflock.renderers import TerminalChatRenderer
 from chatflock.sequencial_process import SequentialProcess, Step
-from chatflock.structured_string import Section, StructuredString
+from chatflock.structured_string import Section, StructuredString, Truncation
 from chatflock.use_cases.request_response import get_response
 from chatflock.web_research import WebSearch
 from chatflock.web_research.web_research import WebResearchTool
@@ -80,6 +80,26 @@ class SatisficationCheckResult(BaseModel):
     is_satisficed: bool = Field(description="Whether or not the information need has been satisficed.")
 
 
+def create_previous_queries_and_answers_section(state: BHSRState) -> Section:
+    answers_to_queries = state.answers_to_queries or {}
+
+    # Over the prompt budget, the answers to the oldest queries are trimmed first.
+    return Section(
+        name="Previous Queries & Answers",
+        text="None" if len(answers_to_queries) == 0 else None,
+        sub_sections=[
+            Section(
+                name=query,
+                text=f"```markdown\n{answer}\n```",
+                uppercase_name=False,
+                priority=i,
+                truncation=Truncation.HEAD,
+            )
+            for i, (query, answer) in enumerate(answers_to_queries.items())
+        ],
+    )
+
+
 def generate_queries(
     state: BHSRState,
     chat_model: BaseChatModel,
@@ -87,6 +107,7 @@ def generate_queries(
     max_queries: int = 10,
     shared_sections: Optional[List[Section]] = None,
     web_search_tool: Optional[BaseTool] = None,
+    max_prompt_tokens: Optional[int] = None,
     spinner: Optional[Halo] = None,
 ) -> None:
     if state.queries_to_run is not None and len(state.queries_to_run) > 0:
@@ -182,19 +203,11 @@ def generate_queries(
                 StructuredString(
                     sections=[
                         Section(name="Information Need", text=state.information_need),
-                        Section(
-                            name="Previous Queries & Answers",
-                            text="None"
-                            if state.answers_to_queries is None or len(state.answers_to_queries) == 0
-                            else None,
-                            sub_sections=[
-                                Section(name=query, text=f"```markdown\n{answer}\n```", uppercase_name=False)
-                                for query, answer in (state.answers_to_queries or {}).items()
-                            ],
-                        ),
+                        create_previous_queries_and_answers_section(state),
                         Section(name="Current Hypothesis", text=str(state.current_hypothesis)),
                         Section(name="Feedback for Current Hypothesis From The User", text=str(state.feedback)),
-                    ]
+                    ],
+                    max_tokens=max_prompt_tokens,
                 )
             ),
             from_participant=user,
@@ -243,6 +256,7 @@ def generate_hypothesis(
     state: BHSRState,
     chat_model: BaseChatModel,
     shared_sections: Optional[List[Section]] = None,
+    max_prompt_tokens: Optional[int] = None,
     spinner: Optional[Halo] = None,
 ) -> None:
     hypothesis_generator = LangChainBasedAIChatParticipant(
@@ -271,17 +285,11 @@ def generate_hypothesis(
             StructuredString(
                 sections=[
                     Section(name="Information Need", text=state.information_need),
-                    Section(
-                        name="Previous Queries & Answers",
-                        text="None" if state.answers_to_queries is None or len(state.answers_to_queries) == 0 else None,
-                        sub_sections=[
-                            Section(name=query, text=f"```markdown\n{answer}\n```", uppercase_name=False)
-                            for query, answer in (state.answers_to_queries or {}).items()
-                        ],
-                    ),
+                    create_previous_queries_and_answers_section(state),
                     Section(name="Previous Hypothesis", text=str(state.current_hypothesis)),
                     Section(name="Feedback", text=str(state.feedback)),
-                ]
+                ],
+                max_tokens=max_prompt_tokens,
             )
         ),
         answerer=hypothesis_generator,
@@ -298,6 +306,7 @@ def check_satisficing(
     state: BHSRState,
     chat_model: BaseChatModel,
     shared_sections: Optional[List[Section]] = None,
+    max_prompt_tokens: Optional[int] = None,
     spinner: Optional[Halo] = None,
 ) -> None:
     satisficing_checker = LangChainBasedAIChatParticipant(
@@ -325,17 +334,11 @@ def check_satisficing(
             StructuredString(
                 sections=[
                     Section(name="Information Need", text=state.information_need),
-                    Section(
-                        name="Previous Queries & Answers",
-                        text="None" if state.answers_to_queries is None or len(state.answers_to_queries) == 0 else None,
-                        sub_sections=[
-                            Section(name=query, text=f"```markdown\n{answer}\n```", uppercase_name=False)
-                            for query, answer in (state.answers_to_queries or {}).items()
-                        ],
-                    ),
+                    create_previous_queries_and_answers_section(state),
                     Section(name="Previous Hypothesis", text=str(state.current_hypothesis)),
                     Section(name="Proposed New Hypothesis", text=str(state.proposed_hypothesis)),
-                ]
+                ],
+                max_tokens=max_prompt_tokens,
             )
         ),
         answerer=satisficing_checker,
@@ -356,6 +359,7 @@ def brainstorm_search_hypothesize_refine(
     initial_state: Optional[BHSRState] = None,
     n_search_results: int = 3,
     state_file: Optional[str] = None,
+    max_prompt_tokens: Optional[int] = None,
     spinner: Optional[Halo] = None,
 ) -> BHSRState:
     shared_sections = [Section(name="Current Date (YYYY-MM-DD)", text=datetime.datetime.utcnow().strftime("%Y-%m-%d"))]
@@ -376,6 +380,7 @@ def brainstorm_search_hypothesize_refine(
                     interactive_user=initial_state.information_need is None,
                     shared_sections=shared_sections,
                     web_search_tool=web_search_tool,
+                    max_prompt_tokens=max_prompt_tokens,
                     spinner=spinner,
                 ),
                 on_step_start=lambda _: spinner.start("Generating queries...") if spinner is not None else None,
@@ -390,7 +395,11 @@ def brainstorm_search_hypothesize_refine(
             Step(
                 name="Hypothesis Generation",
                 func=partial(
-                    generate_hypothesis, chat_model=chat_model, shared_sections=shared_sections, spinner=spinner
+                    generate_hypothesis,
+                    chat_model=chat_model,
+                    shared_sections=shared_sections,
+                    max_prompt_tokens=max_prompt_tokens,
+                    spinner=spinner,
                 ),
                 on_step_start=lambda _: spinner.start("Generating hypothesis...") if spinner is not None else None,
                 on_step_completed=lambda _: spinner.succeed("Hypothesis generated.") if spinner is not None else None,
@@ -398,7 +407,11 @@ def brainstorm_search_hypothesize_refine(
             Step(
                 name="Satificing Check",
                 func=partial(
-                    check_satisficing, chat_model=chat_model, shared_sections=shared_sections, spinner=spinner
+                    check_satisficing,
+                    chat_model=chat_model,
+                    shared_sections=shared_sections,
+                    max_prompt_tokens=max_prompt_tokens,
+                    spinner=spinner,
                 ),
                 on_step_start=lambda _: spinner.start("Checking satisfication condition...")
                 if spinner is not None
@@ -421,6 +434,7 @@ def run_brainstorm_search_hypothesize_refine_loop(
     initial_state: Optional[BHSRState] = None,
     state_file: Optional[str] = None,
     confirm_satisficed: bool = False,
+    max_prompt_tokens: Optional[int] = None,
     spinner: Optional[Halo] = None,
 ) -> str:
     loaded_state = load_state(state_file)
@@ -446,6 +460,7 @@ def run_brainstorm_search_hypothesize_refine_loop(
             chat_model=chat_model,
             n_search_results=n_search_results,
             state_file=state_file,
+            max_prompt_tokens=max_prompt_tokens,
             spinner=spinner,
         )
 
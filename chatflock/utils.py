@@ -1,57 +1,55 @@
-from typing import Any, Dict, Type
+from typing import Any, Dict, Optional, Sequence, Type
 
+import difflib
 import re
 
 from pydantic import BaseModel
 
+from chatflock.json_repair import repair_json
+from chatflock.schemas import default_schema_registry
 
-def fix_invalid_json(json_string: str, only_cut: bool = False) -> str:
-    # Cut anything before the first { and after the last }
-    json_string = json_string[json_string.find("{") : json_string.rfind("}") + 1]
 
+def fix_invalid_json(json_string: str, only_cut: bool = False) -> str:
     if only_cut:
-        return json_string
+        # Cut anything before the first { and after the last }
+        return json_string[json_string.find("{") : json_string.rfind("}") + 1]
 
-    # Regular expression patterns
-    unquoted_key_pattern = r'(?<!")(\b\w+\b)(\s*:)(?!")'
-    unquoted_value_pattern = r'(:\s*)([^",\]\[}{]+)(?=[,}\]])'
+    start = json_string.find("{")
+    if start == -1:
+        return ""
 
-    # Fix unquoted keys
-    json_string = re.sub(unquoted_key_pattern, r'"\1"\2', json_string)
+    return repair_json(json_string[start:])
 
-    # Fix unquoted values by capturing until the next comma, closing brace, or bracket
-    json_string = re.sub(unquoted_value_pattern, r'\1"\2"', json_string)
 
-    # Handle string values with newlines and potential code
-    string_field_pattern = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
-    fixed_json = ""
-    last_end = 0
+def pydantic_to_json_schema(pydantic_model: Type[BaseModel]) -> Dict[str, Any]:
+    return default_schema_registry.get_json_schema(pydantic_model)
 
-    for m in re.finditer(string_field_pattern, json_string):
-        start, end = m.span()
-        string_value = m.group(1).replace("\n", "\\n")  # Fix newlines
 
-        # Additional handling for strings that might contain code
-        # Escaping quotes within the string value
-        string_value = string_value.replace('"', '\\"')
+def json_string_to_pydantic(json_string: str, pydantic_model: Type[BaseModel]) -> BaseModel:
+    return default_schema_registry.get_artifacts(pydantic_model).validate_json(json_string)
 
-        fixed_json += json_string[last_end:start] + '"' + string_value + '"'
-        last_end = end
 
-    fixed_json += json_string[last_end:]  # Add the remaining portion of the original string
+def find_best_matching_name(text: str, names: Sequence[str], cutoff: float = 0.7) -> Optional[str]:
+    # Local fallback for free-text model outputs that should have been one of the names, e.g. '"john"', '@John.',
+    # '👤 John (Engineer)' or 'The next speaker is John'.
+    if text in names:
+        return text
 
-    return fixed_json
+    cleaned_text = re.sub(r"\s*\([^)]*\)\s*$", "", text.strip())
+    cleaned_text = re.sub(r"^[^\w]+|[^\w]+$", "", cleaned_text)
 
+    lower_names = {name.lower(): name for name in names}
+    if cleaned_text.lower() in lower_names:
+        return lower_names[cleaned_text.lower()]
 
-def pydantic_to_json_schema(pydantic_model: Type[BaseModel]) -> Dict[str, Any]:
-    try:
-        return pydantic_model.model_json_schema()
-    except AttributeError:
-        return pydantic_model.schema()
+    mentioned_names = [
+        name for name in names if re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text, flags=re.IGNORECASE) is not None
+    ]
+    if len(mentioned_names) == 1:
+        return mentioned_names[0]
 
+    close_matches = difflib.get_close_matches(cleaned_text.lower(), list(lower_names.keys()), n=1, cutoff=cutoff)
+    if len(close_matches) > 0:
+        return lower_names[close_matches[0]]
 
-def json_string_to_pydantic(json_string: str, pydantic_model: Type[BaseModel]) -> BaseModel:
-    try:
-        return pydantic_model.model_validate_json(json_string)
-    except AttributeError:
-        return pydantic_model.parse_raw(json_string)
+    return None
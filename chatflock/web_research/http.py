@@ -0,0 +1,48 @@
+from typing import Dict, Optional
+
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+default_session: Optional[requests.Session] = None
+default_session_lock = threading.Lock()
+
+
+def create_session(
+    pool_connections: int = 16,
+    pool_maxsize: int = 8,
+    pool_block: bool = False,
+    headers: Optional[Dict[str, str]] = None,
+    store_cookies: bool = True,
+) -> requests.Session:
+    # A session keeps connections alive and reuses them for requests to the same host, saving a TCP and TLS handshake
+    # per request. `pool_connections` is the number of hosts to keep pools for, and `pool_maxsize` the number of
+    # connections kept per host (with `pool_block`, also the maximum number of concurrent connections to a host).
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive", **(headers or {})})
+
+    if not store_cookies:
+        # Cookies set by responses are dropped instead of being sent along with later requests.
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    return session
+
+
+def get_default_session() -> requests.Session:
+    # Shared by all retrievers and search results providers that were not given a session of their own. It is used from
+    # many threads and for unrelated hosts, so it keeps no cookies; a component that needs them should be given a
+    # session of its own.
+    global default_session
+
+    with default_session_lock:
+        if default_session is None:
+            default_session = create_session(store_cookies=False)
+
+        return default_session
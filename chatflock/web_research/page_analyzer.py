@@ -1,45 +1,66 @@
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar, Union
 
 import abc
+from concurrent.futures import ThreadPoolExecutor
 
 from bs4 import BeautifulSoup, Comment, NavigableString
 from halo import Halo
 from langchain.chat_models.base import BaseChatModel
+from langchain.schema import Document
 from langchain.text_splitter import TextSplitter
 from pydantic import BaseModel
+from tenacity import RetryError
 
-from chatflock.parsing_utils import string_output_to_pydantic
-from chatflock.structured_string import Section, StructuredString
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
+from chatflock.parsing_utils import string_output_to_pydantic, strings_output_to_pydantic
+from chatflock.structured_string import Section, StructuredString, Truncation
 
 from ..participants.langchain import LangChainBasedAIChatParticipant
 from ..use_cases.request_response import get_response
 from .errors import NonTransientHTTPError, TransientHTTPError
 from .page_retrievers import PageRetriever
 
+T = TypeVar("T")
 
-def clean_html(content):
-    # Parse the HTML content
-    soup = BeautifulSoup(content, "html.parser")
+
+def clean_html(content: str, parser: str = "html.parser") -> str:
+    # Other parsers (e.g. "lxml", if installed) are much faster than the pure-Python default, but may repair invalid
+    # markup differently and so produce a slightly different (still clean) output.
+    soup = BeautifulSoup(content, parser)
 
     # Remove non-visible tags
     for invisible_elem in soup(["style", "script", "meta", "[document]", "head", "title"]):
         invisible_elem.extract()
 
     # Remove comment nodes
-    for comment in soup.findAll(text=lambda text: isinstance(text, Comment)):
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
         comment.extract()
 
-    # Function to check if a tag contains text
-    def tag_contains_text(tag):
-        if isinstance(tag, NavigableString):
-            return tag.strip() != ""
-        return any(tag_contains_text(child) for child in tag.children if not isinstance(child, Comment))
-
-    # Remove tags that don't contain text or don't have children that contain text
-    for tag in soup.find_all(True):
-        if not tag_contains_text(tag):
-            tag.decompose()
-        else:
+    # Whether each tag contains text, computed bottom-up in a single pass: in reverse document order, every tag comes
+    # after all of its descendants.
+    tags = soup.find_all(True)
+    tags_with_text: Set[int] = set()
+    for tag in reversed(tags):
+        for child in tag.children:
+            if isinstance(child, Comment):
+                continue
+
+            if (isinstance(child, NavigableString) and child.strip() != "") or id(child) in tags_with_text:
+                tags_with_text.add(id(tag))
+                break
+
+    # Remove tags that don't contain text or don't have children that contain text. Only the top-most of those need
+    # removing, their descendants go along with them.
+    empty_tags = [
+        tag
+        for tag in tags
+        if id(tag) not in tags_with_text and (tag.parent is soup or id(tag.parent) in tags_with_text)
+    ]
+    for tag in empty_tags:
+        tag.decompose()
+
+    for tag in tags:
+        if id(tag) in tags_with_text:
             # Strip all attributes from tags that contain text, expect hrefs on links
             href = tag.attrs.get("href")
             tag.attrs = {}
@@ -50,6 +71,17 @@ def clean_html(content):
     return str(soup)
 
 
+def map_pages(fn: Callable[[str, str], T], pages: Sequence[Tuple[str, str]], max_concurrency: int = 1) -> List[T]:
+    # Applies `fn` to every (url, title) page, up to `max_concurrency` pages at a time, keeping the order of the pages.
+    if max_concurrency <= 1 or len(pages) <= 1:
+        return [fn(url, title) for url, title in pages]
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_concurrency, len(pages)), thread_name_prefix="chatflock-page"
+    ) as executor:
+        return list(executor.map(lambda page: fn(*page), pages))
+
+
 class PageQueryAnalysisResult(BaseModel):
     answer: str
 
@@ -59,6 +91,38 @@ class PageQueryAnalyzer(abc.ABC):
     def analyze(self, url: str, title: str, query: str, spinner: Optional[Halo] = None) -> PageQueryAnalysisResult:
         raise NotImplementedError()
 
+    @property
+    def thread_safe(self) -> bool:
+        # Whether pages can be analyzed from several threads at once.
+        return False
+
+    def analyze_many(
+        self,
+        pages: Sequence[Tuple[str, str]],
+        query: str,
+        spinner: Optional[Halo] = None,
+        max_concurrency: int = 1,
+    ) -> List[PageQueryAnalysisResult]:
+        # Analyzes (url, title) pages for the same query, up to `max_concurrency` pages at a time if the analyzer is
+        # thread safe. Results are in the same order as the pages, and a page that could not be read does not fail the
+        # others. Override to share work (e.g. requests) between pages.
+        if not self.thread_safe:
+            max_concurrency = 1
+
+        return map_pages(
+            lambda url, title: self.analyze_page(
+                url=url, title=title, query=query, spinner=spinner if max_concurrency <= 1 else None
+            ),
+            pages,
+            max_concurrency=max_concurrency,
+        )
+
+    def analyze_page(self, url: str, title: str, query: str, spinner: Optional[Halo] = None) -> PageQueryAnalysisResult:
+        try:
+            return self.analyze(url=url, title=title, query=query, spinner=spinner)
+        except (RetryError, TransientHTTPError, NonTransientHTTPError):
+            return PageQueryAnalysisResult(answer="Unable to answer query because the page could not be read.")
+
 
 class OpenAIChatPageQueryAnalyzer(PageQueryAnalyzer):
     def __init__(
@@ -67,90 +131,38 @@ class OpenAIChatPageQueryAnalyzer(PageQueryAnalyzer):
         page_retriever: PageRetriever,
         text_splitter: TextSplitter,
         use_first_split_only: bool = True,
+        execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+        max_prompt_tokens: Optional[int] = None,
     ):
         self.chat_model = chat_model
         self.page_retriever = page_retriever
         self.text_splitter = text_splitter
         self.use_first_split_only = use_first_split_only
+        self.execution_options = execution_options
+        self.max_prompt_tokens = max_prompt_tokens
+        self.query_answerer: Optional[LangChainBasedAIChatParticipant] = None
+
+    @property
+    def thread_safe(self) -> bool:
+        return self.page_retriever.thread_safe
 
     def analyze(self, url: str, title: str, query: str, spinner: Optional[Halo] = None) -> PageQueryAnalysisResult:
         try:
-            html = self.page_retriever.retrieve_html(url)
+            docs = self.retrieve_documents(url)
         except (NonTransientHTTPError, TransientHTTPError) as e:
             return PageQueryAnalysisResult(
                 answer=f"The query could not be answered because an error occurred while retrieving the page: {e}"
             )
-        finally:
-            self.page_retriever.close()
-
-        cleaned_html = clean_html(html)
-
-        docs = self.text_splitter.create_documents([cleaned_html])
 
         answer = "No answer yet."
         for i, doc in enumerate(docs):
-            text = doc.page_content
-
-            query_answerer = LangChainBasedAIChatParticipant(
-                name="Web Page Query Answerer",
-                role="Web Page Query Answerer",
-                personal_mission="Answer queries based on provided (partial) web page content from the web.",
-                chat_model=self.chat_model,
-                other_prompt_sections=[
-                    Section(
-                        name="Crafting a Query Answer",
-                        sub_sections=[
-                            Section(
-                                name="Process",
-                                list=[
-                                    "Analyze the query and the given content",
-                                    "If context is provided, use it to answer the query.",
-                                    "Summarize the answer in a comprehensive, yet succinct way.",
-                                ],
-                                list_item_prefix=None,
-                            ),
-                            Section(
-                                name="Guidelines",
-                                list=[
-                                    "If the answer is not found in the page content, it's insufficent, or not relevant "
-                                    "to the query at all, state it clearly.",
-                                    "Do not fabricate information. Stick to provided content.",
-                                    "Provide context for the next call (e.g., if a paragraph was cut short, include "
-                                    "relevant header information, section, etc. for continuity). Assume the content is "
-                                    "partial content from the page. Be very detailed in the context.",
-                                    "If unable to answer but found important information, include it in the context "
-                                    "for the next call.",
-                                    "Pay attention to the details of the query and make sure the answer is suitable "
-                                    "for the intent of the query.",
-                                    "A potential answer might have been provided. This means you thought you found "
-                                    "the answer in a previous partial text for the same page. You should double-check "
-                                    "that and provide an alternative revised answer if you think it's wrong, "
-                                    "or repeat it if you think it's right or cannot be validated using the current "
-                                    "text.",
-                                ],
-                            ),
-                        ],
-                    )
-                ],
-            )
-
-            final_answer, _ = get_response(
-                query=str(
-                    StructuredString(
-                        sections=[
-                            Section(name="Query", text=query),
-                            Section(name="Url", text=url),
-                            Section(name="Title", text=title),
-                            Section(name="Previous Answer", text=answer),
-                            Section(name="Page Content", text=f"```{text}```"),
-                        ]
-                    )
-                ),
-                answerer=query_answerer,
-            )
+            final_answer = self.answer_query(url=url, title=title, query=query, text=doc.page_content, answer=answer)
 
             result = string_output_to_pydantic(
-                output=final_answer, chat_model=self.chat_model, output_schema=PageQueryAnalysisResult
+                output=final_answer,
+                chat_model=self.chat_model,
+                output_schema=PageQueryAnalysisResult,
+                execution_options=self.execution_options,
             )
             answer = result.answer
 
@@ -160,3 +172,132 @@ class OpenAIChatPageQueryAnalyzer(PageQueryAnalyzer):
         return PageQueryAnalysisResult(
             answer=answer,
         )
+
+    def analyze_many(
+        self,
+        pages: Sequence[Tuple[str, str]],
+        query: str,
+        spinner: Optional[Halo] = None,
+        max_concurrency: int = 1,
+    ) -> List[PageQueryAnalysisResult]:
+        if not self.use_first_split_only:
+            # Every split builds on the answer parsed from the previous one, so there is nothing to batch.
+            return super().analyze_many(pages=pages, query=query, spinner=spinner, max_concurrency=max_concurrency)
+
+        page_answers = map_pages(
+            lambda url, title: self.answer_first_split(url=url, title=title, query=query),
+            pages,
+            max_concurrency=max_concurrency if self.thread_safe else 1,
+        )
+
+        results = {i: answer for i, answer in enumerate(page_answers) if isinstance(answer, PageQueryAnalysisResult)}
+        final_answers = {i: answer for i, answer in enumerate(page_answers) if isinstance(answer, str)}
+
+        # The answers of all pages are parsed together, in a single request per batch.
+        indices = list(final_answers.keys())
+        parsed_results = strings_output_to_pydantic(
+            outputs=[final_answers[i] for i in indices],
+            chat_model=self.chat_model,
+            output_schema=PageQueryAnalysisResult,
+            spinner=spinner,
+            execution_options=self.execution_options,
+        )
+        results.update(zip(indices, parsed_results))
+
+        return [results[i] for i in range(len(pages))]
+
+    def answer_first_split(self, url: str, title: str, query: str) -> Union[str, PageQueryAnalysisResult]:
+        # The unparsed answer for the first split of the page, or the final result if there is nothing to parse.
+        try:
+            docs = self.retrieve_documents(url)
+        except (NonTransientHTTPError, TransientHTTPError) as e:
+            return PageQueryAnalysisResult(
+                answer=f"The query could not be answered because an error occurred while retrieving the page: {e}"
+            )
+        except RetryError:
+            return PageQueryAnalysisResult(answer="Unable to answer query because the page could not be read.")
+
+        if len(docs) == 0:
+            return PageQueryAnalysisResult(answer="No answer yet.")
+
+        return self.answer_query(url=url, title=title, query=query, text=docs[0].page_content, answer="No answer yet.")
+
+    def retrieve_documents(self, url: str) -> List[Document]:
+        # The page retriever is kept open between pages; its owner closes it when done.
+        cleaned_html = self.page_retriever.retrieve_cleaned_html(url, clean=clean_html)
+
+        return self.text_splitter.create_documents([cleaned_html])
+
+    def answer_query(self, url: str, title: str, query: str, text: str, answer: str) -> str:
+        final_answer, _ = get_response(
+            query=str(
+                StructuredString(
+                    sections=[
+                        Section(name="Query", text=query),
+                        Section(name="Url", text=url),
+                        Section(name="Title", text=title),
+                        Section(name="Previous Answer", text=answer),
+                        # Only the page content is trimmed to fit the prompt budget, keeping its beginning.
+                        Section(name="Page Content", text=f"```{text}```", priority=0, truncation=Truncation.HEAD),
+                    ],
+                    max_tokens=self.max_prompt_tokens,
+                )
+            ),
+            answerer=self.get_query_answerer(),
+        )
+
+        return final_answer
+
+    def get_query_answerer(self) -> LangChainBasedAIChatParticipant:
+        # The answerer keeps no state between chats, so a single one serves every page and its static prompt
+        # sections are only rendered once.
+        if self.query_answerer is None:
+            self.query_answerer = self.create_query_answerer()
+
+        return self.query_answerer
+
+    def create_query_answerer(self) -> LangChainBasedAIChatParticipant:
+        return LangChainBasedAIChatParticipant(
+            name="Web Page Query Answerer",
+            role="Web Page Query Answerer",
+            personal_mission="Answer queries based on provided (partial) web page content from the web.",
+            chat_model=self.chat_model,
+            include_current_time_in_prompt=self.execution_options.response_cache is None,
+            execution_options=self.execution_options,
+            other_prompt_sections=[
+                Section(
+                    name="Crafting a Query Answer",
+                    sub_sections=[
+                        Section(
+                            name="Process",
+                            list=[
+                                "Analyze the query and the given content",
+                                "If context is provided, use it to answer the query.",
+                                "Summarize the answer in a comprehensive, yet succinct way.",
+                            ],
+                            list_item_prefix=None,
+                        ),
+                        Section(
+                            name="Guidelines",
+                            list=[
+                                "If the answer is not found in the page content, it's insufficent, or not relevant "
+                                "to the query at all, state it clearly.",
+                                "Do not fabricate information. Stick to provided content.",
+                                "Provide context for the next call (e.g., if a paragraph was cut short, include "
+                                "relevant header information, section, etc. for continuity). Assume the content is "
+                                "partial content from the page. Be very detailed in the context.",
+                                "If unable to answer but found important information, include it in the context "
+                                "for the next call.",
+                                "Pay attention to the details of the query and make sure the answer is suitable "
+                                "for the intent of the query.",
+                                "A potential answer might have been provided. This means you thought you found "
+                                "the answer in a previous partial text for the same page. You should double-check "
+                                "that and provide an alternative revised answer if you think it's wrong, "
+                                "or repeat it if you think it's right or cannot be validated using the current "
+                                "text.",
+                            ],
+                        ),
+                    ],
+                )
+            ],
+        )
@@ -1,4 +1,5 @@
-from .base import PageRetriever
+from .base import PageRetriever, RetrievedPage
+from .caching import CachingPageRetriever
 from .fallback import RetrieverWithFallback
 from .requests_retriever import SimpleRequestsPageRetriever
 from .scraper_api_retriever import ScraperAPIPageRetriever
@@ -6,6 +7,8 @@ from .selenium_retriever import SeleniumPageRetriever
 
 __all__ = [
     "PageRetriever",
+    "RetrievedPage",
+    "CachingPageRetriever",
     "RetrieverWithFallback",
     "SimpleRequestsPageRetriever",
     "ScraperAPIPageRetriever",
@@ -0,0 +1,115 @@
+from typing import Any, Dict, Optional
+
+import asyncio
+import threading
+
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed, wait_random
+
+from ..errors import NonTransientHTTPError, TransientHTTPError
+from .base import PageRetriever
+
+try:
+    import aiohttp
+except ModuleNotFoundError as e:
+    raise ImportError(
+        "aiohttp is not installed. "
+        "Please install it to use the AIOHTTPPageRetriever. "
+        "You can do this by running `pip install aiohttp`."
+    ) from e
+
+
+class AIOHTTPPageRetriever(PageRetriever):
+    # Fetches pages on an event loop of its own, running in a background thread. Pages requested from any thread (e.g.
+    # by a concurrent web search) share one connection pool, with a limit on connections per host, and connections to
+    # repeat hosts are kept alive.
+    default_timeout: int = 10
+
+    def __init__(
+        self,
+        limit: int = 64,
+        limit_per_host: int = 8,
+        keepalive_timeout: float = 30.0,
+        timeout: float = default_timeout,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.headers = headers or {}
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.lock = threading.Lock()
+
+    @property
+    def thread_safe(self) -> bool:
+        return True
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(
+                    target=self.loop.run_forever, name="chatflock-aiohttp-retriever", daemon=True
+                )
+                self.loop_thread.start()
+
+            return self.loop
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Only called from the retriever's loop, which the session is bound to.
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+            )
+
+        return self.session
+
+    @retry(
+        retry=retry_if_exception_type(TransientHTTPError),
+        wait=wait_fixed(2) + wait_random(0, 2),
+        stop=stop_after_attempt(3),
+    )
+    async def fetch_html(self, url: str, **kwargs: Any) -> str:
+        try:
+            async with self.get_session().get(url, **kwargs) as r:
+                text = await r.text(errors="replace")
+        except asyncio.TimeoutError:
+            raise TransientHTTPError(408, "Timeout while waiting for the page to load.")
+
+        if r.status < 300:
+            return text
+
+        if r.status >= 500:
+            raise TransientHTTPError(r.status, text)
+
+        raise NonTransientHTTPError(r.status, text)
+
+    def retrieve_html(self, url: str, **kwargs: Any) -> str:
+        return asyncio.run_coroutine_threadsafe(self.fetch_html(url, **kwargs), self.get_loop()).result()
+
+    def close(self) -> None:
+        # Closes the connection pool and stops the loop. Both are created again if more pages are retrieved.
+        with self.lock:
+            loop, loop_thread = self.loop, self.loop_thread
+            self.loop = self.loop_thread = None
+
+        if loop is None or loop_thread is None:
+            return
+
+        async def close_session() -> None:
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+
+        asyncio.run_coroutine_threadsafe(close_session(), loop).result()
+
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
@@ -1,11 +1,35 @@
-from typing import Any
+from typing import Any, Callable, Dict, Optional
 
 import abc
+import dataclasses
+
+
+@dataclasses.dataclass
+class RetrievedPage:
+    html: str
+    # 304 when a conditional request found the page unchanged (in which case the html is empty).
+    status_code: int = 200
+    headers: Dict[str, str] = dataclasses.field(default_factory=dict)
 
 
 class PageRetriever(abc.ABC):
+    @property
+    def thread_safe(self) -> bool:
+        # Whether pages can be retrieved from several threads at once (e.g. by a concurrent web search). Retrievers
+        # that share a single resource, like a browser, are not.
+        return False
+
     def retrieve_html(self, url: str, **kwargs: Any) -> str:
         raise NotImplementedError()
 
+    def retrieve_page(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> RetrievedPage:
+        # Retrievers that can send request headers (e.g. for conditional requests) and expose the response headers
+        # override this. Others ignore the headers.
+        return RetrievedPage(html=self.retrieve_html(url, **kwargs))
+
+    def retrieve_cleaned_html(self, url: str, clean: Callable[[str], str], **kwargs: Any) -> str:
+        # Overridden by retrievers that can reuse the cleaned form of a page (e.g. from a cache).
+        return clean(self.retrieve_html(url, **kwargs))
+
     def close(self) -> None:
         pass
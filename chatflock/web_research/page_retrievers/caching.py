@@ -0,0 +1,432 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import email.utils
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from tenacity import RetryError
+
+from chatflock.caches import CacheStats
+
+from ..errors import NonTransientHTTPError, TransientHTTPError
+from .base import PageRetriever
+
+
+def parse_ttl(headers: Dict[str, str], default_ttl: Optional[float]) -> Optional[float]:
+    # Returns how long a response may be served from the cache without revalidation. None means it must not be stored.
+    lower_headers = {name.lower(): value for name, value in headers.items()}
+    cache_control = lower_headers.get("cache-control", "").lower()
+
+    if "no-store" in cache_control:
+        return None
+
+    if "no-cache" in cache_control:
+        return 0.0
+
+    max_age = re.search(r"(?:^|[,\s])s-maxage\s*=\s*(\d+)", cache_control) or re.search(
+        r"(?:^|[,\s])max-age\s*=\s*(\d+)", cache_control
+    )
+    if max_age is not None:
+        return float(max_age.group(1))
+
+    expires = lower_headers.get("expires")
+    if expires is not None:
+        try:
+            expires_at = email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+        return max(0.0, expires_at - time.time())
+
+    return default_ttl if default_ttl is not None else 0.0
+
+
+class CachingPageRetriever(PageRetriever):
+    # Caches the pages retrieved by another retriever on disk, so repeat research skips the network (and, for cleaned
+    # pages, the parsing) entirely. Bodies are stored once per content hash and referenced from an index of urls.
+    # Responses are fresh for as long as their Cache-Control / Expires headers allow (or `default_ttl` without those),
+    # and stale ones are revalidated with If-None-Match / If-Modified-Since when the retriever exposes headers (see
+    # `PageRetriever.retrieve_page`). The least recently used urls are evicted beyond `max_size_bytes`.
+    # Body sizes and references are tracked in memory (the bodies directory is only scanned on load), and the index is
+    # written at most once every `save_interval` seconds, and on `flush` / `close`. File I/O happens outside the lock.
+
+    def __init__(
+        self,
+        retriever: PageRetriever,
+        directory: str,
+        default_ttl: Optional[float] = 24 * 60 * 60,
+        respect_cache_control: bool = True,
+        max_size_bytes: Optional[int] = 512 * 1024 * 1024,
+        cache_cleaned_html: bool = True,
+        serve_stale_on_error: bool = True,
+        save_interval: float = 5.0,
+    ):
+        if max_size_bytes is not None and max_size_bytes <= 0:
+            raise ValueError("Max size bytes must be None or greater than 0.")
+
+        if save_interval < 0:
+            raise ValueError("Save interval must be greater than or equal to 0.")
+
+        self.retriever = retriever
+        self.directory = Path(directory)
+        self.bodies_directory = self.directory / "bodies"
+        self.bodies_directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.json"
+        self.default_ttl = default_ttl
+        self.respect_cache_control = respect_cache_control
+        self.max_size_bytes = max_size_bytes
+        self.cache_cleaned_html = cache_cleaned_html
+        self.serve_stale_on_error = serve_stale_on_error
+        self.save_interval = save_interval
+
+        self.lock = threading.RLock()
+        # Serializes index writes, so an older snapshot never replaces a newer one. Never acquired with `lock` held.
+        self.save_lock = threading.Lock()
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.body_sizes: Dict[str, int] = {}
+        self.body_references: Dict[str, int] = {}
+        self.size_bytes = 0
+        self.index_dirty = False
+        self.last_saved_at = 0.0
+        self.stats = CacheStats()
+        self.n_revalidations = 0
+
+        self.load_index()
+
+    @property
+    def thread_safe(self) -> bool:
+        # The cache itself is guarded by a lock.
+        return self.retriever.thread_safe
+
+    def load_index(self) -> None:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+
+        # The only scan of the bodies directory; sizes are tracked from here on.
+        sizes_on_disk = {}
+        for path in self.bodies_directory.glob("*.html"):
+            try:
+                sizes_on_disk[path.stem] = path.stat().st_size
+            except FileNotFoundError:
+                continue
+
+        with self.lock:
+            for url, entry in index.items():
+                # Drop entries whose bodies are gone (e.g. deleted by hand).
+                if not isinstance(entry, dict) or entry.get("body") not in sizes_on_disk:
+                    self.index_dirty = True
+                    continue
+
+                cleaned = entry.get("cleaned", {})
+                entry["cleaned"] = {cleaner: body for cleaner, body in cleaned.items() if body in sizes_on_disk}
+                if len(entry["cleaned"]) != len(cleaned):
+                    self.index_dirty = True
+
+                self.index[url] = entry
+                for body_hash in self.entry_bodies(entry):
+                    self.reference_body(body_hash, sizes_on_disk[body_hash])
+
+            # Bodies that are no longer referenced (e.g. left behind by a crash before the index was saved).
+            deletions = [body_hash for body_hash in sizes_on_disk if body_hash not in self.body_references]
+            deletions += self.evict_if_needed()
+
+        self.delete_bodies(deletions)
+        self.save_index_if_due()
+
+    def save_index(self) -> None:
+        with self.save_lock:
+            with self.lock:
+                if not self.index_dirty:
+                    return
+
+                data = json.dumps(self.index)
+                self.index_dirty = False
+                self.last_saved_at = time.monotonic()
+
+            # Written to a temporary file that is atomically renamed into place, so readers never see a partial index.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(data)
+
+                os.replace(tmp_path, self.index_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+                with self.lock:
+                    self.index_dirty = True
+                raise
+
+    def save_index_if_due(self) -> None:
+        with self.lock:
+            due = self.index_dirty and time.monotonic() - self.last_saved_at >= self.save_interval
+
+        if due:
+            self.save_index()
+
+    def flush(self) -> None:
+        self.save_index()
+
+    def body_path(self, body_hash: str) -> Path:
+        return self.bodies_directory / f"{body_hash}.html"
+
+    def read_body(self, body_hash: str) -> Optional[str]:
+        try:
+            return self.body_path(body_hash).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def write_body(self, content: str) -> Tuple[str, int]:
+        # Returns the hash and size of the body. It is only kept once referenced from the index (see `reference_body`).
+        data = content.encode("utf-8")
+        body_hash = hashlib.sha256(data).hexdigest()
+        path = self.body_path(body_hash)
+
+        # Content-addressed, so an existing body never needs to be rewritten.
+        if not path.exists():
+            fd, tmp_path = tempfile.mkstemp(dir=self.bodies_directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        return body_hash, len(data)
+
+    def delete_bodies(self, body_hashes: List[str]) -> None:
+        # Called without the lock. A body deleted while being written again for another url only causes a miss later.
+        for body_hash in body_hashes:
+            self.body_path(body_hash).unlink(missing_ok=True)
+
+    def entry_bodies(self, entry: Dict[str, Any]) -> List[str]:
+        return [entry["body"], *entry.get("cleaned", {}).values()]
+
+    def reference_body(self, body_hash: str, size: int) -> None:
+        # Assumes the lock is held. Bodies are shared between urls with the same content.
+        if body_hash not in self.body_references:
+            self.body_references[body_hash] = 0
+            self.body_sizes[body_hash] = size
+            self.size_bytes += size
+
+        self.body_references[body_hash] += 1
+
+    def release_bodies(self, body_hashes: List[str]) -> List[str]:
+        # Assumes the lock is held. Returns the bodies that are no longer referenced, to be deleted without the lock.
+        deletions = []
+        for body_hash in body_hashes:
+            if body_hash not in self.body_references:
+                continue
+
+            references = self.body_references[body_hash] - 1
+            if references > 0:
+                self.body_references[body_hash] = references
+                continue
+
+            self.body_references.pop(body_hash, None)
+            self.size_bytes -= self.body_sizes.pop(body_hash, 0)
+            deletions.append(body_hash)
+
+        return deletions
+
+    def retrieve_html(self, url: str, **kwargs: Any) -> str:
+        html, _ = self.get_page(url, **kwargs)
+
+        return html
+
+    def retrieve_cleaned_html(self, url: str, clean: Callable[[str], str], **kwargs: Any) -> str:
+        html, entry = self.get_page(url, **kwargs)
+        if entry is None or not self.cache_cleaned_html:
+            return clean(html)
+
+        cleaner = f"{clean.__module__}.{getattr(clean, '__qualname__', repr(clean))}"
+
+        cleaned_hash = entry.get("cleaned", {}).get(cleaner)
+        cleaned_html = self.read_body(cleaned_hash) if cleaned_hash is not None else None
+        if cleaned_html is not None:
+            return cleaned_html
+
+        cleaned_html = clean(html)
+        cleaned_hash, size = self.write_body(cleaned_html)
+
+        with self.lock:
+            current_entry = self.index.get(url)
+            # Only attach it if the page was not replaced in the meantime.
+            if current_entry is not None and current_entry["body"] == entry["body"]:
+                cleaned = current_entry.setdefault("cleaned", {})
+                self.reference_body(cleaned_hash, size)
+                deletions = self.release_bodies([cleaned[cleaner]]) if cleaner in cleaned else []
+                cleaned[cleaner] = cleaned_hash
+                self.index_dirty = True
+
+                deletions += self.evict_if_needed()
+            elif cleaned_hash not in self.body_references:
+                deletions = [cleaned_hash]
+            else:
+                deletions = []
+
+        self.delete_bodies(deletions)
+        self.save_index_if_due()
+
+        return cleaned_html
+
+    def get_page(self, url: str, **kwargs: Any) -> Tuple[str, Optional[Dict[str, Any]]]:
+        # Returns the html of the url and its index entry (None if the page is not cached), after retrieving or
+        # revalidating the page if needed.
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is not None:
+                entry = dict(entry)
+
+        if entry is not None and entry["expires_at"] > time.time():
+            html = self.read_body(entry["body"])
+            if html is not None:
+                with self.lock:
+                    if url in self.index:
+                        # Persisted with the next save, so the LRU order survives restarts.
+                        self.index[url]["accessed_at"] = time.time()
+                        self.index_dirty = True
+
+                self.stats.record(hit=True)
+                self.save_index_if_due()
+
+                return html, entry
+
+        self.stats.record(hit=False)
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag") is not None:
+                headers["If-None-Match"] = entry["etag"]
+
+            if entry.get("last_modified") is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            page = self.retriever.retrieve_page(url, headers=headers or None, **kwargs)
+        except (TransientHTTPError, NonTransientHTTPError, RetryError, requests.RequestException):
+            # HTTP errors, retries that gave up and connection errors or timeouts.
+            html = self.read_body(entry["body"]) if entry is not None and self.serve_stale_on_error else None
+            if html is None:
+                raise
+
+            return html, entry
+
+        if page.status_code == 304 and entry is not None:
+            html = self.read_body(entry["body"])
+            if html is not None:
+                with self.lock:
+                    self.n_revalidations += 1
+
+                return html, self.update_entry(url=url, entry=entry, headers=page.headers)
+
+            # The body is gone; retrieve the page again, unconditionally.
+            page = self.retriever.retrieve_page(url, **kwargs)
+
+        return page.html, self.update_entry(url=url, entry=None, headers=page.headers, html=page.html)
+
+    def update_entry(
+        self, url: str, entry: Optional[Dict[str, Any]], headers: Dict[str, str], html: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        # Returns the new entry, or None when the response must not be stored. Without `html` (a revalidation), the
+        # current entry of the url is refreshed, keeping its body and cleaned forms.
+        ttl = parse_ttl(headers, default_ttl=self.default_ttl) if self.respect_cache_control else self.default_ttl
+
+        body = self.write_body(html) if html is not None and ttl is not None else None
+
+        with self.lock:
+            old_entry = self.index.get(url)
+            if html is None and (old_entry is None or entry is None or old_entry["body"] != entry["body"]):
+                # The page was replaced or evicted while it was being revalidated.
+                return None if entry is None else dict(entry)
+
+            deletions = []
+            if ttl is None:
+                new_entry = None
+                if old_entry is not None:
+                    del self.index[url]
+                    deletions = self.release_bodies(self.entry_bodies(old_entry))
+            else:
+                lower_headers = {name.lower(): value for name, value in headers.items()}
+
+                now = time.time()
+                new_entry = dict(old_entry) if body is None and old_entry is not None else {}
+                new_entry.update(
+                    {
+                        "expires_at": now + ttl,
+                        "accessed_at": now,
+                        "etag": lower_headers.get("etag", new_entry.get("etag")),
+                        "last_modified": lower_headers.get("last-modified", new_entry.get("last_modified")),
+                    }
+                )
+
+                if body is not None:
+                    body_hash, size = body
+                    new_entry["body"] = body_hash
+                    new_entry["cleaned"] = {}
+
+                    # Referenced before the old bodies are released, so a body shared with the old entry is kept.
+                    self.reference_body(body_hash, size)
+                    if old_entry is not None:
+                        deletions = self.release_bodies(self.entry_bodies(old_entry))
+
+                self.index[url] = new_entry
+
+            self.index_dirty = True
+            deletions += self.evict_if_needed()
+
+        self.delete_bodies(deletions)
+        self.save_index_if_due()
+
+        return dict(new_entry) if new_entry is not None else None
+
+    def evict_if_needed(self) -> List[str]:
+        # Assumes the lock is held. Returns the bodies to delete.
+        if self.max_size_bytes is None or self.size_bytes <= self.max_size_bytes:
+            return []
+
+        # Evict least recently used urls until we are comfortably below the limit, so we don't sort the index on
+        # every write.
+        target_size = int(self.max_size_bytes * 0.9)
+        deletions = []
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1].get("accessed_at", 0)):
+            if self.size_bytes <= target_size:
+                break
+
+            del self.index[url]
+            deletions += self.release_bodies(self.entry_bodies(entry))
+
+        self.index_dirty = True
+
+        return deletions
+
+    def clear(self) -> None:
+        with self.lock:
+            self.index = {}
+            self.body_sizes = {}
+            self.body_references = {}
+            self.size_bytes = 0
+            self.index_dirty = True
+
+        self.save_index()
+
+        for path in self.bodies_directory.glob("*.html"):
+            path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self.save_index()
+        self.retriever.close()
@@ -1,6 +1,6 @@
-from typing import Any, Sequence
+from typing import Any, Dict, Optional, Sequence
 
-from .base import PageRetriever
+from .base import PageRetriever, RetrievedPage
 
 
 class RetrieverWithFallback(PageRetriever):
@@ -10,13 +10,24 @@ class RetrieverWithFallback(PageRetriever):
 
         self.retrievers = retrievers
 
+    @property
+    def thread_safe(self) -> bool:
+        return all(retriever.thread_safe for retriever in self.retrievers)
+
     def retrieve_html(self, url: str, **kwargs: Any) -> str:
+        return self.retrieve_page(url, **kwargs).html
+
+    def retrieve_page(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> RetrievedPage:
         last_error = None
 
         for retriever in self.retrievers:
             try:
-                return retriever.retrieve_html(url, **kwargs)
+                return retriever.retrieve_page(url, headers=headers, **kwargs)
             except Exception as e:
                 last_error = e
 
         raise last_error or Exception("No retriever was able to retrieve the page.")
+
+    def close(self) -> None:
+        for retriever in self.retrievers:
+            retriever.close()
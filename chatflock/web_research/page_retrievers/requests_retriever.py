@@ -1,28 +1,43 @@
-from typing import Any
+from typing import Any, Dict, Optional
 
 import requests
 from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed, wait_random
 
 from ..errors import NonTransientHTTPError, TransientHTTPError
-from .base import PageRetriever
+from ..http import get_default_session
+from .base import PageRetriever, RetrievedPage
 
 
 class SimpleRequestsPageRetriever(PageRetriever):
     default_timeout: int = 10
 
+    def __init__(self, session: Optional[requests.Session] = None):
+        # Connections are pooled and kept alive by the session; the default session is shared process-wide.
+        self.session = session
+
+    @property
+    def thread_safe(self) -> bool:
+        return True
+
+    def retrieve_html(self, url: str, **kwargs: Any) -> str:
+        return self.retrieve_page(url, **kwargs).html
+
     @retry(
         retry=retry_if_exception_type(TransientHTTPError),
         wait=wait_fixed(2) + wait_random(0, 2),
         stop=stop_after_attempt(3),
     )
-    def retrieve_html(self, url: str, **kwargs: Any) -> str:
+    def retrieve_page(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> RetrievedPage:
         default_kwargs = {"timeout": self.default_timeout}
 
-        r = requests.get(
-            url, **{**default_kwargs, **kwargs}
+        r = (self.session or get_default_session()).get(
+            url, headers=headers, **{**default_kwargs, **kwargs}
         )  # nosec - Dealt with timeouts already in the previous line
+        if r.status_code == 304:
+            return RetrievedPage(html="", status_code=r.status_code, headers=dict(r.headers))
+
         if r.status_code < 300:
-            return r.text
+            return RetrievedPage(html=r.text, status_code=r.status_code, headers=dict(r.headers))
 
         if r.status_code >= 500:
             raise TransientHTTPError(r.status_code, r.text)
@@ -1,13 +1,18 @@
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 import os
 
+import requests
+
+from .base import RetrievedPage
 from .requests_retriever import SimpleRequestsPageRetriever
 
 
 class ScraperAPIPageRetriever(SimpleRequestsPageRetriever):
-    def __init__(self, api_key: Optional[str] = None, render_js: bool = False):
-        super().__init__()
+    def __init__(
+        self, api_key: Optional[str] = None, render_js: bool = False, session: Optional[requests.Session] = None
+    ):
+        super().__init__(session=session)
 
         if api_key is None:
             if "SCRAPERAPI_API_KEY" not in os.environ:
@@ -18,5 +23,7 @@ class ScraperAPIPageRetriever(SimpleRequestsPageRetriever):
         self.api_key = api_key
         self.render_js = render_js
 
-    def retrieve_html(self, url: str, **kwargs: Any) -> str:
-        return super().retrieve_html(url, params={"api_key": self.api_key, "url": url, "render": self.render_js})
+    def retrieve_page(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> RetrievedPage:
+        return super().retrieve_page(
+            url, headers=headers, params={"api_key": self.api_key, "url": url, "render": self.render_js}
+        )
@@ -202,3 +202,7 @@ class SeleniumPageRetriever(PageRetriever):
 
         if self.service:
             self.service.stop()
+
+        # A new browser is started if more pages are retrieved.
+        self.driver = None
+        self.service = None
@@ -1,14 +1,20 @@
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import abc
+import hashlib
 import json
 import os
+import re
+import unicodedata
 
 import requests
 from pydantic import BaseModel
 from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed, wait_random
 
+from chatflock.caches import Cache, CacheStats, InMemoryCache
+from chatflock.concurrency import SingleFlight
 from chatflock.web_research.errors import NonTransientHTTPError, TransientHTTPError
+from chatflock.web_research.http import get_default_session
 
 
 class OrganicSearchResult(BaseModel):
@@ -28,13 +34,27 @@ class SearchResultsProvider(abc.ABC):
     def search(self, query: str, n_results: int = 3) -> SearchResults:
         raise NotImplementedError()
 
+    def get_cache_config(self) -> Dict[str, Any]:
+        # The settings that affect the results (e.g. API key, region), so that differently configured providers never
+        # share cached results. Defaults to the provider's plain (str, number, bool and None) attributes; override it
+        # to leave out attributes that are not settings.
+        return {
+            name: value
+            for name, value in vars(self).items()
+            if value is None or isinstance(value, (str, int, float, bool))
+        }
+
 
 class GoogleSerperSearchResultsProvider(SearchResultsProvider):
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, session: Optional[requests.Session] = None):
         if api_key is None:
             api_key = os.environ["SERPER_API_KEY"]
 
         self.api_key = api_key
+        self.session = session
+
+    def get_cache_config(self) -> Dict[str, Any]:
+        return {"api_key": self.api_key}
 
     @retry(
         retry=retry_if_exception_type(TransientHTTPError),
@@ -55,7 +75,7 @@ class GoogleSerperSearchResultsProvider(SearchResultsProvider):
         )
         headers = {"X-API-KEY": self.api_key, "Content-Type": "application/json"}
 
-        r = requests.request("POST", url, headers=headers, data=payload)
+        r = (self.session or get_default_session()).request("POST", url, headers=headers, data=payload)
         if r.status_code >= 300:
             if r.status_code >= 500:
                 raise TransientHTTPError(r.status_code, r.text)
@@ -74,3 +94,68 @@ class GoogleSerperSearchResultsProvider(SearchResultsProvider):
                     for organic_result in results["organic"][:n_results]
                 ],
             )
+
+
+def normalize_search_query(query: str) -> str:
+    # Case, unicode form and whitespace variants of a query get the same results from search engines.
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+class CachingSearchResultsProvider(SearchResultsProvider):
+    # Caches the full search results (including the answer snippet and knowledge graph) of another provider by
+    # normalized query. Back it with a DiskCache to persist results across sessions. Results cached for more results
+    # than requested are reused by slicing them.
+
+    def __init__(
+        self,
+        provider: SearchResultsProvider,
+        cache: Optional[Cache] = None,
+        ttl: Optional[float] = 24 * 60 * 60,
+        normalize_query: Callable[[str], str] = normalize_search_query,
+        single_flight: Optional[SingleFlight] = None,
+    ):
+        self.provider = provider
+        self.cache = cache if cache is not None else InMemoryCache()
+        self.ttl = ttl
+        self.normalize_query = normalize_query
+        self.single_flight = single_flight
+
+        # Taken once, so state that changes while searching does not affect the keys. The configuration is hashed, so
+        # secrets like API keys are not stored in the cache.
+        provider_config = json.dumps(
+            [type(provider).__qualname__, provider.get_cache_config()], sort_keys=True, default=str
+        )
+        self.provider_hash = hashlib.sha256(provider_config.encode("utf-8")).hexdigest()[:16]
+
+        self.stats = CacheStats()
+
+    def create_key(self, query: str) -> str:
+        return f"search_results:{type(self.provider).__name__}:{self.provider_hash}:{self.normalize_query(query)}"
+
+    def search(self, query: str, n_results: int = 3) -> SearchResults:
+        key = self.create_key(query)
+
+        # Loaded without the cache's own stats, which would count results cached for fewer results as hits. The lookup
+        # is recorded once, below.
+        cached = self.cache.load(key)
+        if cached is not None and cached["n_results"] >= n_results:
+            self.stats.record(hit=True)
+
+            results = SearchResults.model_validate(cached["results"])
+            results.organic_results = results.organic_results[:n_results]
+
+            return results
+
+        self.stats.record(hit=False)
+
+        def search() -> SearchResults:
+            results = self.provider.search(query=query, n_results=n_results)
+            self.cache.set(key, {"n_results": n_results, "results": results.model_dump()}, ttl=self.ttl)
+
+            return results
+
+        # Concurrent searches for the same query (e.g. from parallel research steps) share one request.
+        if self.single_flight is not None:
+            return self.single_flight.do(f"{key}:{n_results}", search)
+
+        return search()
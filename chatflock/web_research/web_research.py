@@ -1,4 +1,4 @@
-from typing import Any, List, Optional, Tuple, Type
+from typing import Any, List, Optional, Sequence, Tuple, Type
 
 import re
 
@@ -7,11 +7,12 @@ from langchain.callbacks.manager import CallbackManagerForToolRun
 from langchain.chat_models.base import BaseChatModel
 from langchain.tools import BaseTool, Tool
 from pydantic.v1 import BaseModel, Field
-from tenacity import RetryError
 
 from chatflock.backing_stores import InMemoryChatDataBackingStore
 from chatflock.base import Chat
+from chatflock.caches import skip_result_caching
 from chatflock.conductors import RoundRobinChatConductor
+from chatflock.execution import DEFAULT_EXECUTION_OPTIONS, ExecutionOptions
 from chatflock.participants.langchain import LangChainBasedAIChatParticipant
 from chatflock.participants.user import UserChatParticipant
 from chatflock.renderers import NoChatRenderer
@@ -56,11 +57,18 @@ class WebSearch:
         search_results_provider: SearchResultsProvider,
         page_query_analyzer: PageQueryAnalyzer,
         skip_results_if_answer_snippet_found: bool = True,
+        execution_options: ExecutionOptions = DEFAULT_EXECUTION_OPTIONS,
+        max_concurrent_pages: int = 4,
     ):
+        if max_concurrent_pages <= 0:
+            raise ValueError("Max concurrent pages must be greater than 0.")
+
         self.chat_model = chat_model
         self.search_results_provider = search_results_provider
         self.page_query_analyzer = page_query_analyzer
         self.skip_results_if_answer_snippet_found = skip_results_if_answer_snippet_found
+        self.execution_options = execution_options
+        self.max_concurrent_pages = max_concurrent_pages
 
     def get_answer(
         self, query: str, n_results: int = 3, urls: Optional[List[str]] = None, spinner: Optional[Halo] = None
@@ -90,60 +98,20 @@ class WebSearch:
                 qna.append({"answer": search_results.answer_snippet, "source": "Answer Snippet"})
 
             if not self.skip_results_if_answer_snippet_found or search_results.answer_snippet is None:
-                for result in search_results.organic_results:
-                    if url_unsupported(result.link):
-                        continue
-
-                    if spinner is not None:
-                        spinner.start(f'Reading & analyzing #{result.position} result "{result.title}"')
-
-                    try:
-                        page_result = self.page_query_analyzer.analyze(
-                            url=result.link, title=result.title, query=query, spinner=spinner
-                        )
-                        answer = page_result.answer
-
-                        if spinner is not None:
-                            spinner.succeed(f'Read & analyzed #{result.position} result "{result.title}".')
-                    except Exception as e:
-                        if type(e) in (RetryError, TransientHTTPError, NonTransientHTTPError):
-                            if spinner is not None:
-                                spinner.warn(
-                                    f'Failed to read & analyze #{result.position} result "{result.title}", moving on.'
-                                )
-
-                            answer = "Unable to answer query because the page could not be read."
-                        else:
-                            raise
-
-                    qna.append({"answer": answer, "source": result.link})
+                pages = [
+                    (result.link, result.title, f'#{result.position} result "{result.title}"')
+                    for result in search_results.organic_results
+                    if not url_unsupported(result.link)
+                ]
+                answers = self.analyze_pages(pages=pages, query=query, spinner=spinner)
+
+                qna += [{"answer": answer, "source": url} for (url, _, _), answer in zip(pages, answers)]
         else:
             # Urls were provided, search in those urls instead of searching using a search engine
-            for url in urls:
-                if url_unsupported(url):
-                    continue
-
-                if spinner is not None:
-                    spinner.start(f'Reading & analyzing URL "{url}"')
+            pages = [(url, "Unknown", f'URL "{url}"') for url in urls if not url_unsupported(url)]
+            answers = self.analyze_pages(pages=pages, query=query, spinner=spinner)
 
-                try:
-                    page_result = self.page_query_analyzer.analyze(
-                        url=url, title="Unknown", query=query, spinner=spinner
-                    )
-                    answer = page_result.answer
-
-                    if spinner is not None:
-                        spinner.succeed(f'Read & analyzed URL "{url}".')
-                except Exception as e:
-                    if type(e) in (RetryError, TransientHTTPError, NonTransientHTTPError):
-                        if spinner is not None:
-                            spinner.warn(f'Failed to read & analyze URL "{url}", moving on.')
-
-                        answer = "Unable to answer query because the page could not be read."
-                    else:
-                        raise
-
-                qna.append({"answer": answer, "source": url})
+            qna += [{"answer": answer, "source": url} for (url, _, _), answer in zip(pages, answers)]
 
         if spinner is not None:
             spinner.start(f"Processing results...")
@@ -160,6 +128,8 @@ class WebSearch:
                     role="Query Answer Aggregator",
                     personal_mission="Analyze query answers, discard unlikely ones, and provide an aggregated final response.",
                     chat_model=self.chat_model,
+                    include_current_time_in_prompt=self.execution_options.response_cache is None,
+                    execution_options=self.execution_options,
                     other_prompt_sections=[
                         Section(
                             name="Aggregating Query Answers",
@@ -218,6 +188,31 @@ class WebSearch:
 
         return True, final_answer
 
+    def analyze_pages(
+        self, pages: Sequence[Tuple[str, str, str]], query: str, spinner: Optional[Halo] = None
+    ) -> List[str]:
+        # Analyzes (url, title, description) pages together, up to `max_concurrent_pages` at a time if the page query
+        # analyzer is thread safe (e.g. not with a browser based page retriever). Answers are returned in the same order
+        # as the pages.
+        if len(pages) == 0:
+            return []
+
+        description = pages[0][2] if len(pages) == 1 else f"{len(pages)} pages"
+        if spinner is not None:
+            spinner.start(f"Reading & analyzing {description}")
+
+        results = self.page_query_analyzer.analyze_many(
+            pages=[(url, title) for url, title, _ in pages],
+            query=query,
+            spinner=spinner,
+            max_concurrency=self.max_concurrent_pages,
+        )
+
+        if spinner is not None:
+            spinner.succeed(f"Read & analyzed {description}.")
+
+        return [result.answer for result in results]
+
 
 class WebSearchToolArgs(BaseModel):
     query: str = Field(
@@ -236,6 +231,8 @@ class WebResearchTool(BaseTool):
     description: str = "Research the web. Use that to get an answer for a query you don't know or unsure of the answer to, for recent events, or if the user asks you to. This will evaluate answer snippets, knowledge graphs, and the top N results from google and aggregate a result."
     args_schema: Type[BaseModel] = WebSearchToolArgs
     progress_text: str = "Searching the web..."
+    cacheable: bool = True
+    cache_ttl: Optional[float] = 60 * 60
 
     def _run(
         self,
@@ -244,4 +241,12 @@ class WebResearchTool(BaseTool):
         run_manager: Optional[CallbackManagerForToolRun] = None,
         **kwargs: Any,
     ) -> Any:
-        return self.web_search.get_answer(query=query, n_results=self.n_results, urls=urls, spinner=self.spinner)[1]
+        success, answer = self.web_search.get_answer(
+            query=query, n_results=self.n_results, urls=urls, spinner=self.spinner
+        )
+
+        # E.g. the search engine could not be reached; the next call should try again.
+        if not success:
+            skip_result_caching()
+
+        return answer
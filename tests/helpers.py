@@ -0,0 +1,44 @@
+from typing import Any, List, Set
+
+import threading
+
+from chatflock.backing_stores import InMemoryChatDataBackingStore
+from chatflock.base import ActiveChatParticipant, Chat
+from chatflock.renderers import NoChatRenderer
+from chatflock.web_research.page_retrievers import PageRetriever
+
+
+class StaticParticipant(ActiveChatParticipant):
+    def respond_to_chat(self, chat: Chat) -> str:
+        return "Hello."
+
+
+def create_chat() -> Chat:
+    return Chat(
+        backing_store=InMemoryChatDataBackingStore(),
+        renderer=NoChatRenderer(),
+        initial_participants=[StaticParticipant("Alice"), StaticParticipant("Bob")],
+    )
+
+
+class StaticPageRetriever(PageRetriever):
+    # Every page is `page_size` characters long, with different content per url.
+    def __init__(self, thread_safe: bool = False, page_size: int = 1000):
+        self.is_thread_safe = thread_safe
+        self.page_size = page_size
+        self.retrieved_urls: List[str] = []
+        self.thread_ids: Set[int] = set()
+        self.n_closes = 0
+
+    @property
+    def thread_safe(self) -> bool:
+        return self.is_thread_safe
+
+    def retrieve_html(self, url: str, **kwargs: Any) -> str:
+        self.retrieved_urls.append(url)
+        self.thread_ids.add(threading.get_ident())
+
+        return f"<p>The content of {url}.</p>".ljust(self.page_size, "x")
+
+    def close(self) -> None:
+        self.n_closes += 1
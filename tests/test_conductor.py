@@ -0,0 +1,105 @@
+from typing import Any, List
+
+import pytest
+from helpers import create_chat
+from langchain.chat_models.base import BaseChatModel
+from langchain.chat_models.fake import FakeListChatModel
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+
+from chatflock.caches import InMemoryCache
+from chatflock.conductors import ChatHistoryCompactor, LangChainBasedAIChatConductor
+from chatflock.execution import ExecutionOptions
+
+
+class NoFunctionCallingChatModel(BaseChatModel):
+    # Like an endpoint without function calling support: rejects requests with functions, answers in free text.
+    answer: str = "Bob"
+    n_rejected_calls: int = 0
+    n_calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "no-function-calling"
+
+    def _generate(self, messages: List[Any], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if "functions" in kwargs:
+            self.n_rejected_calls += 1
+            raise ValueError("Unrecognized request argument supplied: functions")
+
+        self.n_calls += 1
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+
+class FlakyFunctionCallingChatModel(BaseChatModel):
+    # Supports function calling, but the first request times out.
+    n_timeouts: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky-function-calling"
+
+    def _generate(self, messages: List[Any], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.n_timeouts == 0:
+            self.n_timeouts += 1
+            raise TimeoutError("Request timed out.")
+
+        message = AIMessage(
+            content="",
+            additional_kwargs={
+                "function_call": {"name": kwargs["functions"][0]["name"], "arguments": '{"name": "Bob"}'}
+            },
+        )
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_selection_falls_back_to_free_text_without_function_calling():
+    chat_model = NoFunctionCallingChatModel()
+    conductor = LangChainBasedAIChatConductor(chat_model=chat_model)
+
+    assert conductor.select_next_speaker_name_with_ai(chat=create_chat()) == "Bob"
+    assert conductor.select_next_speaker_name_with_ai(chat=create_chat()) == "Bob"
+
+    # The rejected request is not repeated for every selection.
+    assert chat_model.n_rejected_calls == 1
+    assert chat_model.n_calls == 2
+
+
+def test_transient_errors_do_not_disable_function_calling():
+    conductor = LangChainBasedAIChatConductor(chat_model=FlakyFunctionCallingChatModel())
+
+    with pytest.raises(TimeoutError):
+        conductor.select_next_speaker_name_with_ai(chat=create_chat())
+
+    assert conductor.function_calling_supported
+    assert conductor.select_next_speaker_name_with_ai(chat=create_chat()) == "Bob"
+
+
+def test_planning_falls_back_to_free_text_without_function_calling():
+    chat_model = NoFunctionCallingChatModel(answer="Bob, Alice, Bob")
+    conductor = LangChainBasedAIChatConductor(chat_model=chat_model, lookahead_turns=3)
+
+    assert conductor.plan_next_speaker_names_with_ai(chat=create_chat()) == ["Bob", "Alice", "Bob"]
+    assert chat_model.n_rejected_calls == 1
+
+
+def test_history_summaries_use_the_conductor_execution_options():
+    response_cache = InMemoryCache()
+    summary_chat_model = FakeListChatModel(responses=["Alice and Bob said hello."])
+    conductor = LangChainBasedAIChatConductor(
+        chat_model=NoFunctionCallingChatModel(),
+        history_compactor=ChatHistoryCompactor(
+            n_recent_messages=2, chat_model=summary_chat_model, summary_chunk_size=2
+        ),
+        execution_options=ExecutionOptions(response_cache=response_cache),
+    )
+
+    chat = create_chat()
+    for i in range(4):
+        chat.add_message(sender_name="Alice" if i % 2 == 0 else "Bob", content=f"Hello {i}.")
+
+    conductor.create_next_speaker_first_human_prompt(chat=chat, goal="Say hello.")
+
+    assert response_cache.stats.misses == 1
+    assert len(response_cache) == 1
@@ -0,0 +1,50 @@
+from helpers import create_chat as create_empty_chat
+
+from chatflock.base import Chat
+from chatflock.conductors import SpeakerDecisionCache
+
+
+def create_chat() -> Chat:
+    chat = create_empty_chat()
+    chat.add_message(sender_name="Alice", content="What do you think?")
+
+    return chat
+
+
+def test_a_single_decision_is_not_served():
+    decision_cache = SpeakerDecisionCache(resample_rate=0)
+    chat = create_chat()
+
+    decision_cache.record(chat=chat, name="Bob")
+    assert decision_cache.get(chat=chat) is None
+
+    decision_cache.record(chat=chat, name="Bob")
+    assert decision_cache.get(chat=chat) == "Bob"
+
+
+def test_decisions_are_not_shared_between_goals():
+    decision_cache = SpeakerDecisionCache(resample_rate=0)
+    chat = create_chat()
+
+    for _ in range(2):
+        decision_cache.record(chat=chat, name="Bob", goal="Write a poem.")
+
+    assert decision_cache.get(chat=chat, goal="Write a poem.") == "Bob"
+    assert decision_cache.get(chat=chat, goal="Fix a bug.") is None
+
+
+def test_served_decisions_are_resampled_and_lose_agreement():
+    decision_cache = SpeakerDecisionCache(resample_rate=0.5, seed=0)
+    chat = create_chat()
+
+    for _ in range(2):
+        decision_cache.record(chat=chat, name="Bob")
+
+    decisions = [decision_cache.get(chat=chat) for _ in range(20)]
+    assert "Bob" in decisions
+    assert None in decisions
+    assert decision_cache.n_resamples == decisions.count(None)
+
+    # A resampled lookup that the LLM now answers differently stops the decision from being served.
+    decision_cache.record(chat=chat, name="Alice")
+    assert all(decision_cache.get(chat=chat) is None for _ in range(20))
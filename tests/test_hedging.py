@@ -0,0 +1,39 @@
+import time
+
+from langchain.chat_models.fake import FakeListChatModel
+
+from chatflock.concurrency.hedging import HedgingPolicy
+from chatflock.concurrency.rate_limiting import get_chat_model_name
+
+
+def test_queue_wait_does_not_count_towards_the_hedge_delay():
+    chat_model = FakeListChatModel(responses=["Hello."])
+    policy = HedgingPolicy(min_samples=1, max_hedge_rate=1, max_workers=1)
+    policy.latency_tracker.record(get_chat_model_name(chat_model), 0.05)
+
+    # Keeps the only worker busy for much longer than the hedge delay.
+    policy.executor.submit(time.sleep, 0.3)
+
+    assert policy.execute(chat_model, lambda model: "Done.") == "Done."
+    assert policy.stats.hedged_requests == 0
+
+
+def test_slow_requests_are_hedged():
+    chat_model = FakeListChatModel(responses=["Hello."])
+    policy = HedgingPolicy(min_samples=1, max_hedge_rate=1, max_workers=2)
+    policy.latency_tracker.record(get_chat_model_name(chat_model), 0.05)
+
+    calls = []
+
+    def call(model):
+        calls.append(model)
+
+        # Only the primary request is slow.
+        if len(calls) == 1:
+            time.sleep(0.3)
+            return "Primary."
+
+        return "Hedge."
+
+    assert policy.execute(chat_model, call) == "Hedge."
+    assert (policy.stats.hedged_requests, policy.stats.hedge_wins) == (1, 1)
@@ -0,0 +1,52 @@
+from typing import List, Optional
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from chatflock.web_research.http import create_session, get_default_session
+
+
+class CookieSettingHandler(BaseHTTPRequestHandler):
+    received_cookies: List[Optional[str]] = []
+
+    def do_GET(self):
+        CookieSettingHandler.received_cookies.append(self.headers.get("Cookie"))
+
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session_id=secret; Path=/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CookieSettingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    CookieSettingHandler.received_cookies = []
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_default_session_does_not_carry_cookies_between_requests(server_url):
+    session = get_default_session()
+    session.get(server_url)
+    session.get(server_url)
+
+    assert len(session.cookies) == 0
+    assert CookieSettingHandler.received_cookies == [None, None]
+
+
+def test_sessions_store_cookies_by_default(server_url):
+    session = create_session()
+    session.get(server_url)
+    session.get(server_url)
+
+    assert CookieSettingHandler.received_cookies == [None, "session_id=secret"]
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from chatflock.json_repair import TolerantJSONParser, loads_tolerant, repair_complete_json, repair_json
+from chatflock.utils import fix_invalid_json
+
+
+def test_valid_json_is_returned_untouched():
+    assert repair_json('{"answer": "yes", "items": [1, 2]}') == '{"answer": "yes", "items": [1, 2]}'
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"answer": "yes"}\n\nHope this helps!',
+        'Sure, here it is:\n{"answer": "yes"}\nLet me know if you need anything else.',
+        '```json\n{"answer": "yes"}\n```',
+    ],
+)
+def test_trailing_prose_is_ignored(text):
+    assert json.loads(fix_invalid_json(text)) == {"answer": "yes"}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"answer": "yes"}\n\nNote: set {x} to 2.',
+        '{"answer": "yes"} and {"answer": "no"}',
+        '{answer: "yes"}\n\nNote: set {x} to 2.',
+        "{'answer': 'yes'}\n\nNote: set {x} to 2.",
+    ],
+)
+def test_braces_inside_trailing_prose_are_not_absorbed(text):
+    assert json.loads(fix_invalid_json(text)) == {"answer": "yes"}
+
+
+def test_quotes_and_braces_inside_strings_are_kept():
+    text = '{"code": "x = {"a": 1}\nprint(x)"}\n\nThis prints {\'a\': 1}.'
+
+    assert json.loads(fix_invalid_json(text)) == {"code": 'x = {"a": 1}\nprint(x)'}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"answer": "ye', {"answer": "ye"}),
+        ('{"items": [1, 2', {"items": [1, 2]}),
+        ('{"items": [{"name": "x"}, {"na', {"items": [{"name": "x"}, {"na": None}]}),
+        ('{"answer":', {"answer": None}),
+    ],
+)
+def test_truncated_input_is_closed(text, expected):
+    assert loads_tolerant(text) == expected
+
+
+def test_common_llm_mistakes_are_repaired():
+    text = "{answer: 'yes', count: 2, valid: True, items: [1, 2,], note: \"line one\nline two\",}"
+
+    assert loads_tolerant(text) == {
+        "answer": "yes",
+        "count": 2,
+        "valid": True,
+        "items": [1, 2],
+        "note": "line one\nline two",
+    }
+
+
+def test_streamed_chunks_match_a_single_feed():
+    text = '{"answer": "yes", "items": [1, {"name": "x y"}], "note": "a "quoted" word"}\n\nThat is all {x}.'
+
+    parser = TolerantJSONParser()
+    for i in range(0, len(text), 3):
+        parser.feed(text[i : i + 3])
+
+        # Every snapshot along the way is valid JSON.
+        json.loads(parser.snapshot())
+
+    assert json.loads(parser.finish()) == {"answer": "yes", "items": [1, {"name": "x y"}], "note": 'a "quoted" word'}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"answer": "yes"}', '{"answer": "yes"}'),
+        ('Sure:\n{"answer": "yes"}\n', '{"answer": "yes"}'),
+        ("{answer: 'yes',}", '{"answer":"yes"}'),
+        ('{"answer": "yes"}\n\nNote: set {x} to 2.', None),
+        ('{answer: "yes"}\n\nNote: set {x} to 2.', None),
+        ('{"answer": "ye', None),
+        ("No JSON here.", None),
+    ],
+)
+def test_complete_json_is_only_repaired_without_trailing_text(text, expected):
+    assert repair_complete_json(text) == expected
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+
+import hashlib
+import json
+
+import pytest
+import requests
+from helpers import StaticPageRetriever
+from tenacity import retry, stop_after_attempt
+
+from chatflock.web_research.errors import TransientHTTPError
+from chatflock.web_research.page_retrievers import CachingPageRetriever, RetrievedPage
+
+
+class ETagPageRetriever(StaticPageRetriever):
+    # Like a server with ETags and no caching headers: unchanged pages are answered with a 304 when revalidated, and
+    # every request fails with `error` when set.
+    def __init__(self):
+        super().__init__()
+        self.error: Optional[Exception] = None
+        self.request_headers: List[Optional[Dict[str, str]]] = []
+
+    def retrieve_page(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> RetrievedPage:
+        self.request_headers.append(headers)
+        if self.error is not None:
+            raise self.error
+
+        html = self.retrieve_html(url)
+        etag = f'"{hashlib.sha256(html.encode("utf-8")).hexdigest()}"'
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if headers is not None and headers.get("If-None-Match") == etag:
+            return RetrievedPage(html="", status_code=304, headers=response_headers)
+
+        return RetrievedPage(html=html, headers=response_headers)
+
+
+def create_retry_error() -> Exception:
+    # What the retrievers raise once their retries of a transient error are exhausted.
+    @retry(stop=stop_after_attempt(1))
+    def retrieve() -> None:
+        raise TransientHTTPError(503, "Service unavailable.")
+
+    try:
+        retrieve()
+    except Exception as e:
+        return e
+
+    raise AssertionError("Expected the retries to give up.")
+
+
+def test_stale_pages_are_revalidated_with_their_etag(tmp_path):
+    retriever = ETagPageRetriever()
+    cache = CachingPageRetriever(retriever, directory=str(tmp_path))
+
+    html = cache.retrieve_html("https://a")
+
+    assert cache.retrieve_html("https://a") == html
+    assert retriever.request_headers[0] is None
+    assert retriever.request_headers[1] == {"If-None-Match": cache.index["https://a"]["etag"]}
+    assert cache.n_revalidations == 1
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        create_retry_error(),
+        TransientHTTPError(503, "Service unavailable."),
+        requests.ConnectionError("Connection refused."),
+        requests.Timeout("Read timed out."),
+    ],
+)
+def test_stale_pages_are_served_when_retrieval_fails(tmp_path, error):
+    retriever = ETagPageRetriever()
+    cache = CachingPageRetriever(retriever, directory=str(tmp_path))
+
+    html = cache.retrieve_html("https://a")
+    retriever.error = error
+
+    assert cache.retrieve_html("https://a") == html
+
+    # Without a cached copy, there is nothing to fall back on.
+    with pytest.raises(type(error)):
+        cache.retrieve_html("https://b")
+
+
+def test_least_recently_used_order_survives_restarts(tmp_path):
+    retriever = StaticPageRetriever()
+
+    cache = CachingPageRetriever(retriever, directory=str(tmp_path), max_size_bytes=3500)
+    for url in ["https://a", "https://b", "https://c"]:
+        cache.retrieve_html(url)
+
+    # A hit makes "a" the most recently used page.
+    cache.retrieve_html("https://a")
+    cache.close()
+
+    cache = CachingPageRetriever(retriever, directory=str(tmp_path), max_size_bytes=3500)
+    cache.retrieve_html("https://d")
+
+    assert sorted(cache.index.keys()) == ["https://a", "https://c", "https://d"]
+    assert cache.size_bytes == 3000
+    assert sorted(path.stem for path in cache.bodies_directory.glob("*.html")) == sorted(cache.body_sizes.keys())
+
+
+def test_index_saves_are_debounced(tmp_path):
+    cache = CachingPageRetriever(StaticPageRetriever(), directory=str(tmp_path), save_interval=60)
+    for url in ["https://a", "https://b", "https://c"]:
+        cache.retrieve_html(url)
+
+    with open(cache.index_path, encoding="utf-8") as f:
+        assert list(json.load(f).keys()) == ["https://a"]
+
+    cache.flush()
+
+    with open(cache.index_path, encoding="utf-8") as f:
+        assert list(json.load(f).keys()) == ["https://a", "https://b", "https://c"]
@@ -0,0 +1,41 @@
+import pytest
+from pydantic import BaseModel
+
+from chatflock.base import ChatMessage
+from chatflock.parsing_utils import local_chat_messages_to_pydantic
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def parse_locally(content):
+    return local_chat_messages_to_pydantic(
+        chat_messages=[ChatMessage(id=1, sender_name="Assistant", content=content)], output_schema=Answer
+    )
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{"answer": "yes"}',
+        '```json\n{"answer": "yes"}\n```',
+        "Here you go:\n{answer: 'yes',}",
+    ],
+)
+def test_outputs_ending_with_json_are_parsed_locally(content):
+    assert parse_locally(content) == Answer(answer="yes")
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        # Would still fit the schema if the prose were swallowed into the answer.
+        '{"answer": "yes"}\n\nNote: set {x} to 2.',
+        '{answer: "yes"}\n\nNote: set {x} to 2.',
+        '{"answer": "ye',
+        "yes",
+    ],
+)
+def test_ambiguous_outputs_are_left_to_the_model(content):
+    assert parse_locally(content) is None
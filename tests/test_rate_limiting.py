@@ -0,0 +1,38 @@
+import random
+
+from chatflock.concurrency.rate_limiting import ModelRateLimiter, ModelRateLimits
+
+
+def test_mixed_completion_lengths_do_not_reduce_concurrency():
+    limiter = ModelRateLimiter(limits=ModelRateLimits(max_concurrency=16))
+    rng = random.Random(0)
+
+    # A third of the requests are short completions, the rest long ones.
+    for _ in range(100):
+        limiter.acquire(tokens=1)
+        limiter.release(latency=0.4 if rng.random() < 1 / 3 else 6.0)
+
+    assert limiter.concurrency_limit == 16
+
+
+def test_rate_limits_halve_concurrency():
+    limiter = ModelRateLimiter(limits=ModelRateLimits(max_concurrency=16, rate_limited_cooldown_seconds=0))
+
+    limiter.acquire(tokens=1)
+    limiter.release(rate_limited=True)
+
+    assert limiter.concurrency_limit == 8
+    assert limiter.stats.rate_limited_requests == 1
+
+
+def test_latency_spikes_back_off():
+    limiter = ModelRateLimiter(limits=ModelRateLimits(max_concurrency=16))
+
+    for _ in range(20):
+        limiter.acquire(tokens=1)
+        limiter.release(latency=1.0)
+
+    limiter.acquire(tokens=1)
+    limiter.release(latency=30.0)
+
+    assert limiter.concurrency_limit < 16
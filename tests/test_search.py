@@ -0,0 +1,56 @@
+from chatflock.caches import InMemoryCache
+from chatflock.web_research.search import (
+    CachingSearchResultsProvider,
+    OrganicSearchResult,
+    SearchResults,
+    SearchResultsProvider,
+)
+
+
+class StaticSearchResultsProvider(SearchResultsProvider):
+    def __init__(self, api_key: str, region: str = "us"):
+        self.api_key = api_key
+        self.region = region
+        self.n_searches = 0
+
+    def search(self, query: str, n_results: int = 3) -> SearchResults:
+        self.n_searches += 1
+
+        return SearchResults(
+            answer_snippet=None,
+            knowledge_graph_description=None,
+            organic_results=[
+                OrganicSearchResult(position=i + 1, title=f"{self.region} result {i}", link=f"https://{i}")
+                for i in range(n_results)
+            ],
+        )
+
+
+def test_lookups_are_recorded_once():
+    cache = InMemoryCache()
+    provider = CachingSearchResultsProvider(StaticSearchResultsProvider(api_key="key"), cache=cache)
+
+    provider.search("What is the weather?", n_results=3)
+    provider.search("what is  the weather?", n_results=2)
+
+    # Cached for fewer results than requested.
+    provider.search("What is the weather?", n_results=5)
+
+    assert (provider.stats.hits, provider.stats.misses) == (1, 2)
+    assert cache.stats.lookups == 0
+
+
+def test_differently_configured_providers_do_not_share_results():
+    cache = InMemoryCache()
+    us_provider = CachingSearchResultsProvider(StaticSearchResultsProvider(api_key="key"), cache=cache)
+    uk_provider = CachingSearchResultsProvider(StaticSearchResultsProvider(api_key="key", region="uk"), cache=cache)
+    other_key_provider = CachingSearchResultsProvider(StaticSearchResultsProvider(api_key="other"), cache=cache)
+
+    assert us_provider.search("weather").organic_results[0].title == "us result 0"
+    assert uk_provider.search("weather").organic_results[0].title == "uk result 0"
+
+    other_key_provider.search("weather")
+    assert other_key_provider.provider.n_searches == 1  # type: ignore
+
+    # API keys are not stored in the cache keys.
+    assert not any("other" in key for key in cache.entries)
@@ -0,0 +1,57 @@
+from helpers import create_chat
+from langchain.chat_models.fake import FakeListChatModel
+
+from chatflock.conductors import InteractionGraph, InteractionPhase, StateMachineChatConductor
+from chatflock.conductors.pre_selection import TERMINATE
+
+
+def create_writing_graph() -> InteractionGraph:
+    return InteractionGraph(
+        initial_phase="write",
+        phases=[
+            InteractionPhase(name="write", speaker="Alice", description="Write a draft.", next_phases=["review"]),
+            InteractionPhase(
+                name="review",
+                speaker="Bob",
+                description="Review the draft.",
+                next_phases=["write"],
+                exit_condition="Bob approved the draft.",
+            ),
+        ],
+    )
+
+
+def test_graph_transitions_only_ask_the_llm_for_judgement():
+    chat_model = FakeListChatModel(responses=["write", TERMINATE])
+    conductor = StateMachineChatConductor(chat_model=chat_model, interaction_graph=create_writing_graph())
+    chat = create_chat()
+
+    # Unconditional transitions follow the graph.
+    assert conductor.select_next_speaker_name(chat=chat) == "Alice"
+    chat.add_message(sender_name="Alice", content="Here is a draft.")
+    assert conductor.select_next_speaker_name(chat=chat) == "Bob"
+    assert conductor.selection_stats.llm_selections == 0
+
+    # Leaving the review phase requires judgement.
+    chat.add_message(sender_name="Bob", content="The intro needs work.")
+    assert conductor.select_next_speaker_name(chat=chat) == "Alice"
+    assert conductor.selection_stats.llm_selections == 1
+
+    chat.add_message(sender_name="Alice", content="Here is a better draft.")
+    assert conductor.select_next_speaker_name(chat=chat) == "Bob"
+
+    chat.add_message(sender_name="Bob", content="Approved.")
+    assert conductor.select_next_speaker_name(chat=chat) == TERMINATE
+    assert conductor.selection_stats.llm_selections == 2
+    assert conductor.selection_stats.pre_selections["InteractionGraph"] == 3
+
+
+def test_phases_with_unknown_speakers_fall_back_to_llm_selection():
+    graph = InteractionGraph(
+        initial_phase="edit",
+        phases=[InteractionPhase(name="edit", speaker="Carol", description="Edit the draft.")],
+    )
+    conductor = StateMachineChatConductor(chat_model=FakeListChatModel(responses=["Bob"]), interaction_graph=graph)
+
+    assert conductor.select_next_speaker_name(chat=create_chat()) == "Bob"
+    assert conductor.selection_stats.llm_selections == 1
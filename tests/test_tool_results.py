@@ -0,0 +1,50 @@
+from typing import Any
+
+from langchain.tools import BaseTool
+from langchain.tools.base import ToolException
+
+from chatflock.ai_utils import execute_tool
+from chatflock.caches import ToolResultCache, skip_result_caching
+
+
+class FlakyTool(BaseTool):
+    # Fails on the first call; reports the failure the way the tool is configured to.
+    name: str = "flaky"
+    description: str = "Fails on the first call."
+    cacheable: bool = True
+    raise_tool_exception: bool = True
+    n_calls: int = 0
+
+    def _run(self, query: str, **kwargs: Any) -> str:
+        self.n_calls += 1
+        if self.n_calls > 1:
+            return f"The answer to {query}."
+
+        if self.raise_tool_exception:
+            raise ToolException("The service is unavailable.")
+
+        skip_result_caching()
+
+        return "Could not reach the service."
+
+
+def test_errors_handled_by_the_tool_are_not_cached():
+    tool = FlakyTool(handle_tool_error=True)
+    tool_result_cache = ToolResultCache()
+
+    assert execute_tool(tool, '{"query": "x"}', tool_result_cache=tool_result_cache) == "The service is unavailable."
+    assert execute_tool(tool, '{"query": "x"}', tool_result_cache=tool_result_cache) == "The answer to x."
+    assert execute_tool(tool, '{"query": "x"}', tool_result_cache=tool_result_cache) == "The answer to x."
+
+    assert tool.n_calls == 2
+    assert tool_result_cache.stats.hits == 1
+
+
+def test_tools_can_opt_out_of_caching_a_result():
+    tool = FlakyTool(raise_tool_exception=False)
+    tool_result_cache = ToolResultCache()
+
+    assert execute_tool(tool, '{"query": "x"}', tool_result_cache=tool_result_cache) == "Could not reach the service."
+    assert execute_tool(tool, '{"query": "x"}', tool_result_cache=tool_result_cache) == "The answer to x."
+
+    assert tool.n_calls == 2
@@ -0,0 +1,91 @@
+from typing import Any, List, Tuple
+
+import json
+import threading
+
+from helpers import StaticPageRetriever
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+from langchain.text_splitter import CharacterTextSplitter
+
+from chatflock.web_research import OpenAIChatPageQueryAnalyzer, WebSearch
+from chatflock.web_research.page_retrievers import PageRetriever
+from chatflock.web_research.search import SearchResults, SearchResultsProvider
+
+
+class PageAnswersChatModel(BaseChatModel):
+    # Answers page queries in free text and extracts every text of a batch in a single function call.
+    n_function_calls: int = 0
+    n_calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "page-answers"
+
+    def _generate(self, messages: List[Any], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if "functions" not in kwargs:
+            self.n_calls += 1
+
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="The page answers the query."))])
+
+        self.n_function_calls += 1
+
+        items = [{"index": i, "output": {"answer": f"Answer {i}"}} for i in range(10)]
+        message = AIMessage(
+            content="",
+            additional_kwargs={"function_call": {"name": "outputs", "arguments": json.dumps({"items": items})}},
+        )
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class NoSearchResultsProvider(SearchResultsProvider):
+    def search(self, query: str, n_results: int = 3) -> SearchResults:
+        raise NotImplementedError()
+
+
+def create_web_search(chat_model: BaseChatModel, page_retriever: PageRetriever) -> WebSearch:
+    return WebSearch(
+        chat_model=chat_model,
+        search_results_provider=NoSearchResultsProvider(),
+        page_query_analyzer=OpenAIChatPageQueryAnalyzer(
+            chat_model=chat_model,
+            page_retriever=page_retriever,
+            text_splitter=CharacterTextSplitter(),
+        ),
+        max_concurrent_pages=4,
+    )
+
+
+def create_pages(n_pages: int) -> List[Tuple[str, str, str]]:
+    return [(f"https://example.com/{i}", f"Page {i}", f"page #{i}") for i in range(n_pages)]
+
+
+def test_pages_are_parsed_in_a_single_batched_request():
+    chat_model = PageAnswersChatModel()
+    page_retriever = StaticPageRetriever(thread_safe=True)
+    web_search = create_web_search(chat_model=chat_model, page_retriever=page_retriever)
+
+    pages = create_pages(4)
+    answers = web_search.analyze_pages(pages=pages, query="What is on the page?")
+
+    assert answers == ["Answer 0", "Answer 1", "Answer 2", "Answer 3"]
+    assert sorted(page_retriever.retrieved_urls) == [url for url, _, _ in pages]
+
+    # One free-text answer per page, but a single request to parse all of them.
+    assert chat_model.n_calls == 4
+    assert chat_model.n_function_calls == 1
+
+
+def test_pages_are_retrieved_from_one_thread_unless_the_retriever_is_thread_safe():
+    page_retriever = StaticPageRetriever(thread_safe=False)
+    web_search = create_web_search(chat_model=PageAnswersChatModel(), page_retriever=page_retriever)
+
+    pages = create_pages(4)
+    web_search.analyze_pages(pages=pages, query="What is on the page?")
+
+    assert page_retriever.retrieved_urls == [url for url, _, _ in pages]
+    assert page_retriever.thread_ids == {threading.get_ident()}
+
+    # The retriever stays open between pages, for its owner to close.
+    assert page_retriever.n_closes == 0